@@ -0,0 +1,72 @@
+"""
+Benchmark: session mới cho mỗi lần quét vs HTTP client dùng chung (connection pool).
+
+Mỗi "lần quét" gửi --requests request tới FUTURES_BASE. Với session mới,
+mỗi lần quét phải DNS lookup + TLS handshake lại; với session dùng chung thì tái sử dụng connection.
+
+Chạy:
+    python benchmarks/bench_http_session.py --scans 5 --requests 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from statistics import mean, median
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from mexc_futures_bot import FUTURES_BASE, create_http_session  # noqa: E402
+
+PING_URL = f"{FUTURES_BASE}/api/v1/contract/ping"
+
+
+async def one_scan(session, n):
+    """Gửi n request tuần tự, trả về thời gian (giây) của cả lần quét"""
+    start = time.perf_counter()
+    for _ in range(n):
+        async with session.get(PING_URL, timeout=10) as r:
+            await r.read()
+    return time.perf_counter() - start
+
+
+async def bench_fresh(scans, n):
+    timings = []
+    for _ in range(scans):
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            await one_scan(session, n)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def bench_shared(scans, n):
+    session = create_http_session()
+    try:
+        await one_scan(session, 1)  # warm-up: mở connection 1 lần
+        return [await one_scan(session, n) for _ in range(scans)]
+    finally:
+        await session.close()
+
+
+def report(name, timings):
+    print(f"{name:<16} mean {mean(timings) * 1000:8.1f} ms   p50 {median(timings) * 1000:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scans", type=int, default=5, help="số lần quét")
+    parser.add_argument("--requests", type=int, default=20, help="số request mỗi lần quét")
+    args = parser.parse_args()
+
+    print(f"🌐 {PING_URL} - {args.scans} lần quét × {args.requests} request")
+    fresh = await bench_fresh(args.scans, args.requests)
+    shared = await bench_shared(args.scans, args.requests)
+    report("session mới", fresh)
+    report("session chung", shared)
+    print(f"⏱️ Tiết kiệm mỗi lần quét: {(mean(fresh) - mean(shared)) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark: decode frame WebSocket - json chuẩn + dict (cách cũ) vs decode_ws_frame (orjson/msgspec + slot struct).
+
+Dữ liệu: file frame đã ghi bởi TICK_RECORD_PATH (hoặc mỗi dòng 1 frame JSON, hỗ trợ .gz) qua --input,
+không có thì sinh frame giả theo đúng format MEXC (push.ticker / push.tickers / push.kline).
+
+Chạy:
+    python benchmarks/bench_json_decode.py --frames 20000
+    python benchmarks/bench_json_decode.py --input ticks.jsonl.gz
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mexc_futures_bot as bot  # noqa: E402
+
+
+def synthetic_frames(n, symbols=800, seed=1):
+    """Frame giả: ~70% push.ticker, ~28% push.kline, ~2% push.tickers (cả market)"""
+    rnd = random.Random(seed)
+    names = [f"COIN{i}_USDT" for i in range(symbols)]
+    ts = int(time.time() * 1000)
+
+    def ticker(sym):
+        return {
+            "symbol": sym, "lastPrice": round(rnd.uniform(0.01, 100), 4), "riseFallRate": 0.0123,
+            "fairPrice": 1.0, "indexPrice": 1.0, "volume24": rnd.randint(10_000, 10_000_000),
+            "amount24": 123456.7, "maxBidPrice": 1.1, "minAskPrice": 0.9, "bid1": 1.0, "ask1": 1.0,
+            "holdVol": 1000, "timestamp": ts,
+        }
+
+    frames = []
+    for i in range(n):
+        r = rnd.random()
+        sym = rnd.choice(names)
+        if r < 0.70:
+            frame = {"channel": "push.ticker", "data": ticker(sym), "symbol": sym, "ts": ts + i}
+        elif r < 0.98:
+            frame = {"channel": "push.kline", "data": {
+                "symbol": sym, "interval": rnd.choice(bot.EMA_TIMEFRAMES), "t": ts // 1000,
+                "o": 1.0, "c": rnd.uniform(0.01, 100), "h": 1.2, "l": 0.8, "a": 1000.0, "q": 10,
+            }, "symbol": sym, "ts": ts + i}
+        else:
+            frame = {"channel": "push.tickers", "data": [ticker(s) for s in names], "ts": ts + i}
+        frames.append(json.dumps(frame))
+    return frames
+
+
+def load_frames(path):
+    return [frame for _, frame in bot.read_tick_recording(path)]
+
+
+def decode_stdlib(message):
+    """Cách cũ: json.loads + check "channel" in data + float() từng field"""
+    data = json.loads(message)
+    if "ping" in data:
+        return
+    if "channel" in data and data.get("channel") == "push.tickers":
+        for t in data["data"]:
+            float(t.get("lastPrice", 0)), float(t.get("volume24", 0))
+    elif "channel" in data and data.get("channel") == "push.ticker":
+        t = data["data"]
+        float(t.get("lastPrice", 0)), float(t.get("volume24", 0))
+    elif "channel" in data and data.get("channel") == "push.kline":
+        k = data["data"]
+        k.get("symbol"), k.get("interval"), float(k.get("c")), k.get("t")
+
+
+def run(decode, frames, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in frames:
+            decode(message)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="File frame đã ghi (.jsonl / .jsonl.gz)")
+    parser.add_argument("--frames", type=int, default=20000, help="Số frame giả nếu không có --input")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_frames(args.input) if args.input else synthetic_frames(args.frames)
+    print(f"📦 {len(frames)} frame ({'file ' + args.input if args.input else 'giả lập'})")
+
+    backends = [("json", json.loads)]
+    try:
+        import orjson
+        backends.append(("orjson", orjson.loads))
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        backends.append(("msgspec", msgspec.json.decode))
+    except ImportError:
+        pass
+
+    baseline = run(decode_stdlib, frames, args.repeat)
+    print(f"{'json + dict (cũ)':<28} {baseline:>12,.0f} frame/s")
+    for name, loads in backends:
+        bot.json_loads = loads
+        fps = run(bot.decode_ws_frame, frames, args.repeat)
+        print(f"{'decode_ws_frame/' + name:<28} {fps:>12,.0f} frame/s  (x{fps / baseline:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Benchmark suite cho các hot path của bot, dữ liệu giả lập cho nhiều quy mô universe.
+
+Case: calculate_ema, update_candle_buffer, tick_pipeline (1 tick qua TickQueue → detection → delivery),
+scan_ema_proximity_batch (EMA 200 cả universe), fmt_alert, detect_ticker_batch (1 frame cả market),
+fanout (1 alert pump/dump → N subscriber, tới lúc xếp hàng TELEGRAM_SCHEDULER).
+Mỗi case × mỗi size: ops/s, p50/p99 latency (µs), peak memory (tracemalloc, KB).
+Kết quả ghi ra JSON để so sánh giữa các version (--compare).
+
+Chạy:
+    python benchmarks/bench_suite.py --sizes 1000,5000,20000 --output bench_results.json
+    python benchmarks/bench_suite.py --output new.json --compare bench_results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import copy
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mexc_futures_bot as bot  # noqa: E402
+
+HISTORY = 500  # Số candle lịch sử mỗi (symbol, timeframe) khi seed
+REGRESSION_THRESHOLD = 0.10  # --compare: chậm hơn >10% → báo regression
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+class FakeContext:
+    def __init__(self):
+        self.bot = FakeBot()
+
+
+_TEMPLATES = {}  # n_symbols → (CandleStore đã seed, symbols, prices) - seed 1 lần mỗi size
+
+
+def build_template(n_symbols):
+    """CandleStore seed đủ EMA_TIMEFRAMES (HISTORY candle random walk) cho n_symbols coin"""
+    if n_symbols in _TEMPLATES:
+        return _TEMPLATES[n_symbols]
+    rng = np.random.default_rng(n_symbols)
+    symbols = [f"COIN{i}_USDT" for i in range(n_symbols)]
+    bases = 10 ** rng.uniform(-3, 3, n_symbols)
+    prices = dict(zip(symbols, bases.tolist()))
+    store = bot.CandleStore(bot.EMA_TIMEFRAMES)
+    now = int(time.time())
+    for tf in bot.EMA_TIMEFRAMES:
+        step = bot.EMA_TIMEFRAME_SECONDS[tf]
+        start = now // step * step - (HISTORY - 1) * step
+        times = list(range(start, start + HISTORY * step, step))
+        walks = bases[:, None] * (1 + np.cumsum(rng.normal(0, 0.002, (n_symbols, HISTORY)), axis=1))
+        for sym, closes in zip(symbols, walks.tolist()):
+            store.seed(sym, tf, times, closes)
+    _TEMPLATES[n_symbols] = store, symbols, prices
+    return _TEMPLATES[n_symbols]
+
+
+def reset_state(n_symbols, seed_store=True):
+    """State sạch cho 1 size: bản copy CandleStore đã seed (hoặc store rỗng), không subscriber"""
+    if seed_store:
+        store, symbols, prices = build_template(n_symbols)
+        bot.CANDLE_STORE = copy.deepcopy(store)
+    else:
+        bot.CANDLE_STORE = bot.CandleStore(bot.EMA_TIMEFRAMES)
+        symbols, prices = [], {}
+    bot.SYMBOL_STATES.clear()
+    # Scheduler mới mỗi case - fan-out đo tới lúc xếp hàng, tin gửi dần cho FakeBot
+    bot.TELEGRAM_SCHEDULER = bot.TelegramScheduler(bot.TELEGRAM_LIMITER, 10 ** 7)
+    bot.SUBSCRIBERS.clear()
+    bot.ALERT_MODE.clear()
+    bot.CHANNEL_ID = None
+    bot.ALERT_ROUTER.rebuild()
+    return symbols, prices
+
+
+# ---------------- Case: mỗi case trả về (op, async?, số op) ----------------
+
+def case_calculate_ema(n, samples):
+    rnd = np.random.default_rng(n)
+    series = [(100 + np.cumsum(rnd.normal(0, 0.2, HISTORY))).tolist() for _ in range(min(n, 2000))]
+
+    def op(i):
+        bot.calculate_ema(series[i % len(series)], bot.EMA_PERIOD)
+    return op, False, samples
+
+
+def case_update_candle_buffer(n, samples):
+    symbols, prices = reset_state(n)
+    tf = "Min1"
+    step = bot.EMA_TIMEFRAME_SECONDS[tf]
+    t0 = int(time.time()) // step * step
+
+    def op(i):
+        sym = symbols[i % n]
+        # Mỗi symbol: 20 update trong candle rồi sang candle mới (commit)
+        candle = t0 + (i // n // 20 + 1) * step
+        bot.update_candle_buffer(sym, tf, prices[sym] * (1 + (i % 7 - 3) * 1e-4), candle)
+    return op, False, samples
+
+
+def case_tick_pipeline(n, samples):
+    """1 tick đi qua pipeline production: TickQueue → detect_ticker_batch (detection stage) → gửi alert (delivery)"""
+    symbols, prices = reset_state(n)
+    bot.SUBSCRIBERS.add(1)
+    bot.ALERT_ROUTER.update_chat(1)
+    context = FakeContext()
+    queue = bot.TickQueue(bot.TICK_QUEUE_MAX)
+    rnd = random.Random(1)
+    tickers = [
+        bot.Ticker(symbols[i % n], prices[symbols[i % n]] * (1 + rnd.gauss(0, 0.01)), bot.MIN_VOL_THRESHOLD * 10)
+        for i in range(min(samples, 50000))
+    ]
+
+    async def op(i):
+        queue.put(tickers[i % len(tickers)])
+        for send_fn, args in bot.detect_ticker_batch(await queue.drain()):
+            await send_fn(*args, context)
+    return op, True, samples
+
+
+def case_scan_ema_proximity_batch(n, samples):
+    """1 lượt check EMA 200 vectorized cho cả universe: mọi coin có giá mới, 1/10 coin sát EMA"""
+    symbols, prices = reset_state(n)
+    store = bot.CANDLE_STORE
+    tf = bot.EMA_TIMEFRAMES[0]
+    live = np.array([bot.get_live_ema(sym, tf) or prices[sym] for sym in symbols])
+    ticks = live * np.where(np.arange(n) % 10 == 0, 1.001, 1.05)
+    rows = np.ones(n, dtype=bool)
+    store.set_prices(symbols, ticks, rows, rows)
+
+    def op(i):
+        store.price_dirty[:n] = True
+        # Mỗi lượt cách nhau quá cooldown → coin sát EMA lại ra alert
+        bot.scan_ema_proximity_batch((i + 1) * (bot.EMA_ALERT_COOLDOWN + 1))
+    return op, False, max(5, samples // n)
+
+
+def case_fmt_alert(n, samples):
+    symbols = [f"COIN{i}_USDT" for i in range(n)]
+
+    def op(i):
+        change = (i % 30) - 15 + 0.37
+        bot.fmt_alert(symbols[i % n], 1.2345, 1.2345 * (1 + change / 100), change)
+    return op, False, samples
+
+
+def case_detect_ticker_batch(n, samples):
+    symbols, prices = reset_state(n)
+    rnd = random.Random(2)
+    frames = [
+        [bot.Ticker(sym, prices[sym] * (1 + rnd.gauss(0, 0.005)), bot.MIN_VOL_THRESHOLD * 10) for sym in symbols]
+        for _ in range(4)
+    ]
+
+    def op(i):
+        bot.detect_ticker_batch(frames[i % len(frames)])
+    return op, False, max(5, samples // n)
+
+
+def case_fanout(n, samples):
+    """1 alert pump/dump gửi tới n subscriber (filter mode/mute/toggle từng chat)"""
+    reset_state(0, seed_store=False)
+    bot.SUBSCRIBERS.update(range(1, n + 1))
+    for chat in range(1, n + 1, 7):
+        bot.ALERT_MODE[chat] = 3
+    bot.ALERT_ROUTER.rebuild()
+    context = FakeContext()
+
+    async def op(i):
+        await bot.send_pump_dump_alert("COIN1_USDT", 1.0, 1.05, 5.0, 0.0, context)
+    return op, True, max(5, samples // n)
+
+
+CASES = {
+    "calculate_ema": case_calculate_ema,
+    "update_candle_buffer": case_update_candle_buffer,
+    "tick_pipeline": case_tick_pipeline,
+    "scan_ema_proximity_batch": case_scan_ema_proximity_batch,
+    "fmt_alert": case_fmt_alert,
+    "detect_ticker_batch": case_detect_ticker_batch,
+    "fanout": case_fanout,
+}
+
+
+async def time_ops(op, is_async, count):
+    """Chạy count op, trả về list latency (ns) từng op"""
+    timings = []
+    clock = time.perf_counter_ns
+    for i in range(count):
+        start = clock()
+        if is_async:
+            await op(i)
+        else:
+            op(i)
+        timings.append(clock() - start)
+    return timings
+
+
+def run_case(name, n, samples):
+    if name not in ("calculate_ema", "fmt_alert", "fanout"):
+        build_template(n)  # Seed trước, không tính vào setup_mem
+    gc.collect()
+    tracemalloc.start()
+    op, is_async, count = CASES[name](n, samples)
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    asyncio.run(time_ops(op, is_async, min(count, 1000)))
+    peak = tracemalloc.get_traced_memory()[1]
+    setup_mem = base
+    tracemalloc.stop()
+
+    # Đo thời gian không bật tracemalloc (tracemalloc làm chậm mọi allocation)
+    op, is_async, count = CASES[name](n, samples)
+    gc.collect()
+    timings = np.array(asyncio.run(time_ops(op, is_async, count)), dtype=np.float64)
+    total = timings.sum() / 1e9
+    return {
+        "case": name,
+        "symbols": n,
+        "ops": int(count),
+        "ops_per_sec": count / total if total else None,
+        "p50_us": float(np.percentile(timings, 50)) / 1000,
+        "p99_us": float(np.percentile(timings, 99)) / 1000,
+        "setup_mem_kb": setup_mem / 1024,
+        "peak_mem_kb": peak / 1024,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """In so sánh ops/s với file kết quả cũ, trả về số case bị regression"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["case"], r["symbols"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\n📈 So với {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["case"], r["symbols"]))
+        if not old or not old.get("ops_per_sec") or not r["ops_per_sec"]:
+            continue
+        ratio = r["ops_per_sec"] / old["ops_per_sec"]
+        flag = "❌" if ratio < 1 - REGRESSION_THRESHOLD else ("✅" if ratio > 1 + REGRESSION_THRESHOLD else "  ")
+        regressions += flag == "❌"
+        print(f"{flag} {r['case']:<30} {r['symbols']:>6}  x{ratio:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,5000,20000", help="Số symbol, cách nhau bởi dấu phẩy")
+    parser.add_argument("--samples", type=int, default=20000, help="Số op mỗi case (case theo batch tự giảm)")
+    parser.add_argument("--cases", default=",".join(CASES), help="Chỉ chạy các case này")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="File kết quả cũ để so sánh (exit code 1 nếu có regression)")
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.sizes.split(",") if x]
+    cases = [c for c in args.cases.split(",") if c]
+    results = []
+    print(f"{'case':<30} {'symbols':>7} {'ops/s':>14} {'p50 µs':>10} {'p99 µs':>10} {'peak KB':>10}")
+    for n in sizes:
+        for name in cases:
+            # Bỏ log print của bot (alert pump/dump) khỏi output benchmark
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = run_case(name, n, args.samples)
+            results.append(r)
+            print(f"{name:<30} {n:>7} {r['ops_per_sec']:>14,.0f} {r['p50_us']:>10.2f} "
+                  f"{r['p99_us']:>10.2f} {r['peak_mem_kb']:>10,.0f}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "json_backend": bot.JSON_BACKEND,
+            "machine": platform.machine(),
+            "samples": args.samples,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"\n💾 Đã ghi {args.output}")
+
+    if args.compare and compare(results, args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
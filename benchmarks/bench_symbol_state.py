@@ -0,0 +1,121 @@
+"""
+Benchmark: state pump/dump dạng 5 dict global (cách cũ) vs SymbolState (__slots__, monotonic time).
+
+Sinh chuỗi tick random-walk cho --symbols coin (có pump/dump ngẫu nhiên), chạy qua
+legacy_detect (bản sao logic cũ) và detect_pump_dump của bot, in ticks/s và kiểm tra 2 bên ra cùng alert.
+
+Chạy:
+    python benchmarks/bench_symbol_state.py --symbols 800 --ticks 500000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mexc_futures_bot as bot  # noqa: E402
+
+LAST_PRICES, BASE_PRICES, ALERTED_SYMBOLS, MAX_CHANGES, LAST_SIGNIFICANT_CHANGE = {}, {}, {}, {}, {}
+
+
+def legacy_detect(symbol, current_price, now):
+    """Logic pump/dump cũ (5 dict global, datetime)"""
+    LAST_PRICES[symbol] = {"price": current_price, "time": now}
+    if symbol not in BASE_PRICES:
+        BASE_PRICES[symbol] = current_price
+        return None
+    base_price = BASE_PRICES[symbol]
+    price_change = (current_price - base_price) / base_price * 100
+    abs_change = abs(price_change)
+    if symbol not in MAX_CHANGES:
+        MAX_CHANGES[symbol] = {"max_pct": 0, "time": now}
+    if abs_change > abs(MAX_CHANGES[symbol]["max_pct"]):
+        MAX_CHANGES[symbol] = {"max_pct": price_change, "time": now}
+        LAST_SIGNIFICANT_CHANGE[symbol] = now
+    should_reset_base = False
+    if abs_change < 1.5:
+        should_reset_base = True
+    elif symbol in LAST_SIGNIFICANT_CHANGE:
+        if (now - LAST_SIGNIFICANT_CHANGE[symbol]).total_seconds() > 50:
+            should_reset_base = True
+    if should_reset_base and symbol in MAX_CHANGES:
+        BASE_PRICES[symbol] = current_price
+        MAX_CHANGES[symbol] = {"max_pct": 0, "time": now}
+    should_alert = False
+    if price_change >= bot.PUMP_THRESHOLD or price_change <= bot.DUMP_THRESHOLD:
+        last_alert = ALERTED_SYMBOLS.get(symbol)
+        last_max = MAX_CHANGES[symbol].get("last_alerted_pct")
+        if last_alert is None:
+            should_alert = True
+        else:
+            if last_max is None:
+                last_max = 0.0
+            if abs_change >= abs(last_max) + 1.5:
+                should_alert = True
+        if should_alert:
+            ALERTED_SYMBOLS[symbol] = now
+            MAX_CHANGES[symbol]["last_alerted_pct"] = price_change
+    return (base_price, price_change) if should_alert else None
+
+
+def make_ticks(n_symbols, n_ticks, seed=7):
+    """[(symbol, price, t_seconds)] - random walk, thỉnh thoảng pump/dump 3-15%"""
+    rnd = random.Random(seed)
+    symbols = [f"COIN{i}_USDT" for i in range(n_symbols)]
+    prices = [rnd.uniform(0.01, 100) for _ in symbols]
+    ticks, t = [], 0.0
+    for _ in range(n_ticks):
+        i = rnd.randrange(n_symbols)
+        step = rnd.gauss(0, 0.002)
+        if rnd.random() < 0.001:
+            step += rnd.choice((-1, 1)) * rnd.uniform(0.03, 0.15)
+        prices[i] *= 1 + step
+        t += 0.0005
+        ticks.append((symbols[i], prices[i], t))
+    return ticks
+
+
+def run_legacy(ticks):
+    for d in (LAST_PRICES, BASE_PRICES, ALERTED_SYMBOLS, MAX_CHANGES, LAST_SIGNIFICANT_CHANGE):
+        d.clear()
+    start_dt = datetime(2024, 1, 1)
+    # datetime được tạo trước để chỉ đo phần cập nhật state
+    stamped = [(sym, price, start_dt + timedelta(seconds=t)) for sym, price, t in ticks]
+    alerts = []
+    start = time.perf_counter()
+    for sym, price, now in stamped:
+        if legacy_detect(sym, price, now):
+            alerts.append(sym)
+    return time.perf_counter() - start, alerts
+
+
+def run_slots(ticks):
+    bot.SYMBOL_STATES.clear()
+    alerts = []
+    start = time.perf_counter()
+    for sym, price, t in ticks:
+        if bot.detect_pump_dump(sym, price, t):
+            alerts.append(sym)
+    return time.perf_counter() - start, alerts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=800)
+    parser.add_argument("--ticks", type=int, default=500000)
+    args = parser.parse_args()
+
+    ticks = make_ticks(args.symbols, args.ticks)
+    legacy_time, legacy_alerts = run_legacy(ticks)
+    slots_time, slots_alerts = run_slots(ticks)
+
+    print(f"📦 {len(ticks)} tick, {args.symbols} coin, {len(slots_alerts)} alert")
+    print(f"{'5 dict + datetime (cũ)':<26} {len(ticks) / legacy_time:>12,.0f} tick/s")
+    print(f"{'SymbolState (__slots__)':<26} {len(ticks) / slots_time:>12,.0f} tick/s  (x{legacy_time / slots_time:.2f})")
+    print(f"Alert giống nhau: {'✅' if legacy_alerts == slots_alerts else '❌'}")
+
+
+if __name__ == "__main__":
+    main()
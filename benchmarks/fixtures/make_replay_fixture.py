@@ -0,0 +1,114 @@
+"""
+Sinh fixture nhỏ, deterministic cho benchmarks/replay.py (15 phút dữ liệu ảo, 6 coin):
+
+- replay_ticks.jsonl.gz: frame push.tickers mỗi giây + push.kline Min1 (có h/l/q) mỗi 5 giây
+- candle_cache/*.npz: EMA 200 ≈ giá gốc của từng coin cho mọi timeframe
+- Kịch bản: coin về gần EMA (alert EMA), pump 3-5% / 5-10% / ≥10%, dump thường + dump cực mạnh
+  (mỗi bước nhảy ≥1.5%/giây - chậm hơn thì detect_pump_dump reset base theo từng tick)
+
+Chạy lại khi đổi kịch bản, rồi ghi golden (cùng ALERT_COALESCE_WINDOW / EMA_CHECK_MODE với test):
+    python benchmarks/fixtures/make_replay_fixture.py
+    ALERT_COALESCE_WINDOW=2 EMA_CHECK_MODE=realtime python benchmarks/replay.py \\
+        benchmarks/fixtures/replay_ticks.jsonl.gz --candle-cache benchmarks/fixtures/candle_cache \\
+        --golden benchmarks/fixtures/replay_golden.json --update-golden
+"""
+import gzip
+import json
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+import mexc_futures_bot as bot  # noqa: E402
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+START = 1_700_000_000 // 14400 * 14400 + 30  # Epoch giây của frame đầu (giữa candle Min1)
+DURATION = 900  # Giây
+KLINE_EVERY = 5  # Giây giữa 2 frame kline của 1 coin
+SEED = 16
+
+# symbol → (giá gốc = EMA 200, [(giây, hệ số giá so với gốc)]) - nội suy tuyến tính giữa các mốc
+SCENARIOS = {
+    "NEAREMA_USDT": (1.25, [(0, 1.04), (90, 1.04), (150, 1.008), (900, 1.005)]),
+    "PUMP_USDT": (25.0, [(0, 1.03), (180, 1.03), (182, 1.07), (240, 1.072), (243, 1.13), (900, 1.125)]),
+    "EXTREME_USDT": (0.052, [(0, 0.96), (300, 0.96), (304, 1.08), (900, 1.085)]),
+    "DUMP_USDT": (310.0, [(0, 1.05), (400, 1.05), (402, 1.0), (480, 1.045), (900, 1.05)]),
+    "QUIET_USDT": (3.2, [(0, 1.03), (900, 1.032)]),
+    "CRASH_USDT": (0.81, [(0, 1.06), (600, 1.06), (606, 0.94), (900, 0.935)]),
+}
+
+
+def level(keyframes, t):
+    for (t0, m0), (t1, m1) in zip(keyframes, keyframes[1:]):
+        if t0 <= t <= t1:
+            return m0 + (m1 - m0) * (t - t0) / (t1 - t0)
+    return keyframes[-1][1]
+
+
+def price_paths(rng):
+    """{symbol: [giá mỗi giây]} - kịch bản + nhiễu ±0.05%"""
+    return {
+        symbol: [round(base * level(keys, t) * (1 + rng.uniform(-5e-4, 5e-4)), 6) for t in range(DURATION)]
+        for symbol, (base, keys) in SCENARIOS.items()
+    }
+
+
+def write_candle_cache(rng):
+    store = bot.CandleStore(bot.EMA_TIMEFRAMES, capacity=len(SCENARIOS))
+    for symbol, (base, _) in SCENARIOS.items():
+        for tf in bot.EMA_TIMEFRAMES:
+            step = bot.EMA_TIMEFRAME_SECONDS[tf]
+            live_time = START // step * step
+            n = bot.EMA_PERIOD + 1
+            times = [live_time - (n - 1 - i) * step for i in range(n)]
+            closes = [round(base * (1 + 0.01 * math.sin(i / 7) + rng.uniform(-2e-3, 2e-3)), 6) for i in range(n)]
+            store.seed(symbol, tf, times, closes)
+    bot.CANDLE_CACHE_DIR = os.path.join(HERE, "candle_cache")
+    bot._write_candle_cache({tf: store.export_timeframe(tf) for tf in bot.EMA_TIMEFRAMES})
+
+
+def frames(paths, rng):
+    """yield (epoch_ms, frame JSON) theo thứ tự thời gian"""
+    step = bot.EMA_TIMEFRAME_SECONDS["Min1"]
+    bars = {}  # symbol → [candle_time, open, high, low, volume]
+    for t in range(DURATION):
+        ms = (START + t) * 1000
+        tickers = [
+            {"symbol": symbol, "lastPrice": path[t], "volume24": 5_000_000, "timestamp": ms}
+            for symbol, path in paths.items()
+        ]
+        yield ms, json.dumps({"channel": "push.tickers", "data": tickers, "ts": ms})
+        candle_time = (START + t) // step * step
+        for i, (symbol, path) in enumerate(paths.items()):
+            price = path[t]
+            bar = bars.get(symbol)
+            if bar is None or bar[0] != candle_time:
+                bar = bars[symbol] = [candle_time, price, price, price, 0.0]
+            bar[2], bar[3] = max(bar[2], price), min(bar[3], price)
+            bar[4] = round(bar[4] + rng.uniform(10, 1000), 2)
+            if (t + i) % KLINE_EVERY:
+                continue
+            data = {
+                "symbol": symbol, "interval": "Min1", "t": candle_time,
+                "o": bar[1], "c": price, "h": bar[2], "l": bar[3], "q": bar[4],
+            }
+            yield ms + 1 + i, json.dumps({"channel": "push.kline", "data": data, "symbol": symbol, "ts": ms + 1 + i})
+
+
+def main():
+    rng = random.Random(SEED)
+    write_candle_cache(rng)
+    paths = price_paths(rng)
+    path = os.path.join(HERE, "replay_ticks.jsonl.gz")
+    count = 0
+    # mtime=0 → file gzip giống hệt nhau giữa các lần sinh
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+        for ms, frame in frames(paths, rng):
+            gz.write(f"{ms}\t{frame}\n".encode("utf-8"))
+            count += 1
+    print(f"✅ {count} frame → {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Server giả lập MEXC Futures (REST + WebSocket /edge) để load test bot mà không gọi sàn thật.
+
+REST:
+    /api/v1/contract/ping
+    /api/v1/contract/detail
+    /api/v1/contract/ticker[?symbol=]
+    /api/v1/contract/kline/{symbol}?interval=&start=&end=
+WebSocket /edge: sub/unsub .ticker / .tickers / .kline, ping → pong, push.ticker / push.tickers / push.kline
+
+Tuỳ chọn: số symbol, tick rate, độ trễ REST, giới hạn rate (429 + Retry-After), tỉ lệ 429 ngẫu nhiên,
+ngắt WebSocket định kỳ.
+
+Chạy:
+    python benchmarks/mock_mexc.py --symbols 800 --tick-rate 2 --latency 30 --rate-limit 20 --disconnect-every 120
+    FUTURES_BASE=http://127.0.0.1:8900 WEBSOCKET_URL=ws://127.0.0.1:8900/edge python mexc_futures_bot.py
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import zlib
+
+from aiohttp import WSMsgType, web
+
+INTERVAL_SECONDS = {
+    "Min1": 60, "Min5": 300, "Min15": 900, "Min30": 1800, "Min60": 3600,
+    "Hour4": 14400, "Hour8": 28800, "Day1": 86400, "Week1": 604800, "Month1": 2592000,
+}
+KLINE_LIMIT = 2000  # MEXC trả tối đa 2000 candle mỗi request
+
+
+class Market:
+    """Giá giả lập: random walk quanh giá gốc của từng symbol, thỉnh thoảng pump/dump"""
+
+    def __init__(self, n_symbols, seed):
+        self.rnd = random.Random(seed)
+        self.symbols = [f"MOCK{i}_USDT" for i in range(n_symbols)]
+        self.base = {s: 10 ** self.rnd.uniform(-3, 3) for s in self.symbols}
+        self.price = dict(self.base)
+        self.volume = {s: self.rnd.choice((50_000, 500_000, 5_000_000, 50_000_000)) for s in self.symbols}
+
+    def step(self, pump_rate):
+        for s in self.symbols:
+            move = self.rnd.gauss(0, 0.001)
+            if self.rnd.random() < pump_rate:
+                move += self.rnd.choice((-1, 1)) * self.rnd.uniform(0.03, 0.12)
+            # Kéo dần về giá gốc để không trôi quá xa
+            move += (self.base[s] / self.price[s] - 1) * 0.01
+            self.price[s] *= 1 + move
+
+    def ticker(self, s):
+        return {
+            "symbol": s, "lastPrice": round(self.price[s], 8), "volume24": self.volume[s],
+            "amount24": self.volume[s] * self.price[s], "riseFallRate": round(self.price[s] / self.base[s] - 1, 4),
+            "fairPrice": self.price[s], "indexPrice": self.price[s], "timestamp": int(time.time() * 1000),
+        }
+
+    def candle_close(self, s, interval, t):
+        """Close deterministic cho candle bắt đầu tại t (giây) - sóng sin + nhiễu theo hash"""
+        k = t // INTERVAL_SECONDS[interval]
+        noise = (zlib.crc32(f"{s}:{interval}:{k}".encode()) % 1000 - 500) / 50000
+        phase = zlib.crc32(s.encode()) % 628 / 100
+        return self.base[s] * (1 + 0.03 * math.sin(k / 37 + phase) + noise)
+
+    def klines(self, s, interval, start, end):
+        step = INTERVAL_SECONDS[interval]
+        now = int(time.time())
+        end = min(end or now, now) // step * step
+        start = max(start or end - (KLINE_LIMIT - 1) * step, end - (KLINE_LIMIT - 1) * step) // step * step
+        times = list(range(start, end + 1, step))
+        closes = [self.candle_close(s, interval, t) for t in times]
+        if times:
+            closes[-1] = self.price[s]  # Candle đang chạy dùng giá hiện tại
+        return {
+            "time": times,
+            "open": closes, "close": closes,
+            "high": [c * 1.002 for c in closes], "low": [c * 0.998 for c in closes],
+            "vol": [1000.0] * len(times), "amount": [1000.0 * c for c in closes],
+        }
+
+
+class MockExchange:
+    def __init__(self, args):
+        self.args = args
+        self.market = Market(args.symbols, args.seed)
+        self.tokens = float(args.rate_limit or 0)
+        self.token_time = time.monotonic()
+        self.stats = {"rest": 0, "throttled": 0, "ws_conn": 0, "ws_frames": 0, "disconnects": 0}
+        self.connections = {}  # id → {"ws", "tickers", "ticker", "kline"}
+
+    # ---------------- REST ----------------
+    def _throttled(self):
+        """True nếu request này phải trả 429 (token bucket --rate-limit và/hoặc --error-429 ngẫu nhiên)"""
+        if self.args.error_429 and random.random() < self.args.error_429:
+            return True
+        if not self.args.rate_limit:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.args.rate_limit, self.tokens + (now - self.token_time) * self.args.rate_limit)
+        self.token_time = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        if request.path == "/edge":
+            return await handler(request)
+        self.stats["rest"] += 1
+        if self.args.latency:
+            await asyncio.sleep(self.args.latency / 1000 * random.uniform(0.5, 1.5))
+        if self._throttled():
+            self.stats["throttled"] += 1
+            return web.json_response({"success": False, "code": 510, "message": "Requests are too frequent"},
+                                     status=429, headers={"Retry-After": "1"})
+        response = await handler(request)
+        if self.args.rate_limit:
+            response.headers["X-RateLimit-Remaining"] = str(int(self.tokens))
+        return response
+
+    @staticmethod
+    def ok(data):
+        return web.json_response({"success": True, "code": 0, "data": data})
+
+    async def ping(self, request):
+        return self.ok(int(time.time() * 1000))
+
+    async def detail(self, request):
+        return self.ok([
+            {"symbol": s, "displayNameEn": s.replace("_", " "), "baseCoin": s.split("_")[0],
+             "quoteCoin": "USDT", "settleCoin": "USDT", "state": 0, "openingTime": 0}
+            for s in self.market.symbols
+        ])
+
+    async def ticker(self, request):
+        symbol = request.query.get("symbol")
+        if symbol:
+            if symbol not in self.market.price:
+                return web.json_response({"success": False, "code": 1001, "message": "contract not exists"})
+            return self.ok(self.market.ticker(symbol))
+        return self.ok([self.market.ticker(s) for s in self.market.symbols])
+
+    async def kline(self, request):
+        symbol = request.match_info["symbol"]
+        interval = request.query.get("interval", "Min1")
+        if symbol not in self.market.price:
+            raise web.HTTPNotFound()
+        if interval not in INTERVAL_SECONDS:
+            return web.json_response({"success": False, "code": 600, "message": "invalid interval"})
+        start = int(request.query.get("start", 0)) or None
+        end = int(request.query.get("end", 0)) or None
+        return self.ok(self.market.klines(symbol, interval, start, end))
+
+    # ---------------- WebSocket ----------------
+    async def edge(self, request):
+        ws = web.WebSocketResponse(heartbeat=None)
+        await ws.prepare(request)
+        self.stats["ws_conn"] += 1
+        conn = {"ws": ws, "tickers": False, "ticker": set(), "kline": set()}
+        self.connections[id(conn)] = conn
+
+        closer = None
+        if self.args.disconnect_every:
+            closer = asyncio.create_task(self._disconnect_later(ws))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(msg.data)
+                except ValueError:
+                    continue
+                await self._handle(conn, data)
+        finally:
+            if closer:
+                closer.cancel()
+            self.connections.pop(id(conn), None)
+        return ws
+
+    async def _disconnect_later(self, ws):
+        await asyncio.sleep(self.args.disconnect_every * random.uniform(0.5, 1.5))
+        self.stats["disconnects"] += 1
+        await ws.close()
+
+    async def _handle(self, conn, data):
+        method = data.get("method", "")
+        param = data.get("param") or {}
+        if method == "ping":
+            await conn["ws"].send_str(json.dumps({"channel": "pong", "data": int(time.time() * 1000)}))
+            return
+        action, _, channel = method.partition(".")
+        if action not in ("sub", "unsub"):
+            return
+        add = action == "sub"
+        if channel == "tickers":
+            conn["tickers"] = add
+        elif channel == "ticker":
+            (conn["ticker"].add if add else conn["ticker"].discard)(param.get("symbol"))
+        elif channel == "kline":
+            (conn["kline"].add if add else conn["kline"].discard)((param.get("symbol"), param.get("interval")))
+        else:
+            return
+        await conn["ws"].send_str(json.dumps({"channel": f"rs.{method}", "data": "success"}))
+
+    async def push_loop(self):
+        """Mỗi tick: cập nhật giá rồi push cho mọi connection theo subscription của nó"""
+        interval = 1 / self.args.tick_rate
+        while True:
+            await asyncio.sleep(interval)
+            market = self.market
+            market.step(self.args.pump_rate)
+            ts = int(time.time() * 1000)
+            now = ts // 1000
+            for conn in list(self.connections.values()):
+                ws = conn["ws"]
+                if ws.closed:
+                    continue
+                frames = []
+                if conn["tickers"]:
+                    frames.append({"channel": "push.tickers", "data": [market.ticker(s) for s in market.symbols], "ts": ts})
+                for s in conn["ticker"]:
+                    if s in market.price:
+                        frames.append({"channel": "push.ticker", "data": market.ticker(s), "symbol": s, "ts": ts})
+                for s, iv in conn["kline"]:
+                    if s in market.price and iv in INTERVAL_SECONDS:
+                        step = INTERVAL_SECONDS[iv]
+                        p = market.price[s]
+                        frames.append({"channel": "push.kline", "data": {
+                            "symbol": s, "interval": iv, "t": now // step * step,
+                            "o": p, "c": p, "h": p, "l": p, "a": 0.0, "q": 0,
+                        }, "symbol": s, "ts": ts})
+                try:
+                    for frame in frames:
+                        await ws.send_str(json.dumps(frame))
+                    self.stats["ws_frames"] += len(frames)
+                except (ConnectionError, RuntimeError):
+                    continue
+
+    async def report_loop(self):
+        last = dict(self.stats)
+        while True:
+            await asyncio.sleep(10)
+            st = self.stats
+            print(
+                f"📊 REST {(st['rest'] - last['rest']) / 10:.1f} req/s (429: {st['throttled']}), "
+                f"WS {len(self.connections)} conn, {(st['ws_frames'] - last['ws_frames']) / 10:.0f} frame/s, "
+                f"ngắt {st['disconnects']}"
+            )
+            last = dict(st)
+
+
+def build_app(args):
+    exchange = MockExchange(args)
+    app = web.Application(middlewares=[exchange.middleware])
+    app.router.add_get("/api/v1/contract/ping", exchange.ping)
+    app.router.add_get("/api/v1/contract/detail", exchange.detail)
+    app.router.add_get("/api/v1/contract/ticker", exchange.ticker)
+    app.router.add_get("/api/v1/contract/kline/{symbol}", exchange.kline)
+    app.router.add_get("/edge", exchange.edge)
+
+    async def start_background(app):
+        app["tasks"] = [asyncio.create_task(exchange.push_loop()), asyncio.create_task(exchange.report_loop())]
+
+    async def stop_background(app):
+        for task in app["tasks"]:
+            task.cancel()
+
+    app.on_startup.append(start_background)
+    app.on_cleanup.append(stop_background)
+    app["exchange"] = exchange
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--symbols", type=int, default=800, help="Số contract USDT")
+    parser.add_argument("--tick-rate", type=float, default=1.0, help="Số lần push giá mỗi giây")
+    parser.add_argument("--pump-rate", type=float, default=0.0005, help="Xác suất pump/dump mỗi tick mỗi symbol")
+    parser.add_argument("--latency", type=float, default=0, help="Độ trễ REST trung bình (ms)")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Giới hạn REST req/s (vượt → 429), 0 = không giới hạn")
+    parser.add_argument("--error-429", type=float, default=0, help="Xác suất trả 429 ngẫu nhiên (0-1)")
+    parser.add_argument("--disconnect-every", type=float, default=0, help="Ngắt mỗi WebSocket sau ~N giây, 0 = không ngắt")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"🧪 Mock MEXC: http://{args.host}:{args.port} (ws://{args.host}:{args.port}/edge), {args.symbols} symbol")
+    web.run_app(build_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Replay file frame WebSocket (ghi bởi TICK_RECORD_PATH) qua detection engine của bot - không cần market thật.
+
+- Frame kline → update_candle_buffer, ticker → detect_ticker_batch (EMA 200 + pump/dump), alert gửi vào FakeBot
+- Đồng hồ ảo: time.monotonic()/time.time() của bot chạy theo timestamp trong file → kết quả deterministic
+- --speed 0: chạy nhanh nhất có thể (benchmark throughput), 1: tốc độ thật, 10: nhanh gấp 10...
+- --candle-cache: nạp candle cache (.npz) để có EMA 200 ngay từ đầu (không có thì chỉ có alert pump/dump)
+- --golden: so alert với file golden (exit code 1 nếu khác), --update-golden: ghi lại golden
+
+Chạy:
+    TICK_RECORD_PATH=ticks.jsonl.gz python mexc_futures_bot.py     # ghi
+    python benchmarks/replay.py ticks.jsonl.gz --candle-cache candle_cache
+    python benchmarks/replay.py ticks.jsonl.gz --golden golden.json --update-golden
+
+Fixture có sẵn (sinh bởi benchmarks/fixtures/make_replay_fixture.py, kiểm tra bởi tests/test_replay.py):
+    ALERT_COALESCE_WINDOW=2 EMA_CHECK_MODE=realtime python benchmarks/replay.py \\
+        benchmarks/fixtures/replay_ticks.jsonl.gz --candle-cache benchmarks/fixtures/candle_cache \\
+        --golden benchmarks/fixtures/replay_golden.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import mexc_futures_bot as bot  # noqa: E402
+
+FAKE_CHAT = 1
+
+
+class ReplayClock:
+    """Thay module time trong bot: monotonic()/time() theo timestamp frame, còn lại dùng time thật"""
+
+    def __init__(self):
+        self.now = 0.0  # Giây kể từ frame đầu
+        self.epoch = 0.0  # Epoch (giây) của frame đầu
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+class FakeBot:
+    """Thay context.bot - chỉ ghi lại alert"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append({"t": round(self.clock.now, 3), "chat": chat_id, "text": text})
+
+
+class ImmediateDelivery:
+    """Thay TELEGRAM_SCHEDULER: ghi alert ngay lúc xếp hàng (không rate limit) để kết quả deterministic"""
+
+    def __init__(self, fake):
+        self.fake = fake
+
+    def submit(self, bot_, chat_id, text, priority=None, **kwargs):
+        self.fake.sent.append({"t": round(self.fake.clock.now, 3), "chat": chat_id, "text": text})
+
+
+class FakeContext:
+    def __init__(self, bot_):
+        self.bot = bot_
+
+
+async def replay(path, speed, context, clock):
+    """Chạy toàn bộ file, trả về (số frame, số ticker, thời gian chạy)"""
+    frames = tickers = 0
+    first_ts = None
+    next_ema_scan = bot.EMA_BATCH_WINDOW
+    next_flush = None  # Thời điểm ảo flush cửa sổ gom alert
+    start = time.perf_counter()
+
+    for ts, message in bot.read_tick_recording(path):
+        if ts is not None:
+            if first_ts is None:
+                first_ts, clock.epoch = ts, ts / 1000
+            clock.now = (ts - first_ts) / 1000
+        if speed > 0:
+            delay = clock.now / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        try:
+            channel, _, payload = bot.decode_ws_frame(message)
+        except bot.JSON_DECODE_ERRORS:
+            continue
+        frames += 1
+
+        if channel == "push.kline":
+            if payload is not None:
+                bot.update_candle_buffer(payload.symbol, payload.interval, payload.close, payload.time)
+            continue
+        if channel == "push.ticker":
+            payload = [payload]
+        elif channel != "push.tickers":
+            continue
+
+        tickers += len(payload)
+        for send_fn, args in bot.detect_ticker_batch(payload):
+            await send_fn(*args, context)
+
+        # EMA_CHECK_MODE=batch: quét EMA theo cửa sổ thời gian ảo
+        if bot.EMA_CHECK_MODE == "batch" and clock.now >= next_ema_scan:
+            next_ema_scan = clock.now + bot.EMA_BATCH_WINDOW
+            for symbol, alerts in bot.scan_ema_proximity_batch(clock.now).items():
+                await bot.send_ema_alerts(symbol, alerts, context)
+
+        # Cửa sổ gom alert theo đồng hồ ảo
+        coalescer = bot.ALERT_COALESCER
+        if coalescer.pumps or coalescer.emas:
+            if next_flush is None:
+                next_flush = clock.now + coalescer.window
+            elif clock.now >= next_flush:
+                coalescer.flush()
+                next_flush = None
+
+    bot.ALERT_COALESCER.flush()
+    return frames, tickers, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="File ghi bởi TICK_RECORD_PATH (.gz hoặc text)")
+    parser.add_argument("--speed", type=float, default=0, help="0 = nhanh nhất, 1 = tốc độ thật")
+    parser.add_argument("--candle-cache", help="Thư mục candle cache (.npz) để seed EMA 200")
+    parser.add_argument("--golden", help="File golden alert (JSON)")
+    parser.add_argument("--update-golden", action="store_true", help="Ghi alert hiện tại vào --golden")
+    parser.add_argument("--show", type=int, default=0, help="In N alert đầu tiên")
+    parser.add_argument("--verbose", action="store_true", help="Giữ log print của bot khi replay")
+    args = parser.parse_args()
+
+    clock = ReplayClock()
+    bot.time = clock
+    bot.SUBSCRIBERS.clear()
+    bot.SUBSCRIBERS.add(FAKE_CHAT)
+    bot.CHANNEL_ID = None
+    bot.ALERT_ROUTER.rebuild()
+    bot.SYMBOL_STATES.clear()
+    if args.candle_cache:
+        bot.CANDLE_CACHE_DIR = args.candle_cache
+        loaded = sum(bot.CANDLE_STORE.import_timeframe(tf, data) for tf, data in bot._read_candle_cache().items())
+        print(f"💾 Candle cache: {loaded} buffers")
+
+    fake = FakeBot(clock)
+    bot.TELEGRAM_SCHEDULER = ImmediateDelivery(fake)
+    bot.ALERT_COALESCER = bot.AlertCoalescer(bot.ALERT_COALESCE_WINDOW, auto_flush=False)
+    log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log:
+        frames, tickers, elapsed = asyncio.run(replay(args.recording, args.speed, FakeContext(fake), clock))
+
+    print(f"📦 {frames} frame, {tickers} ticker, {clock.now:.1f}s dữ liệu, chạy {elapsed:.2f}s")
+    print(f"⚡ {frames / elapsed:,.0f} frame/s, {tickers / elapsed:,.0f} ticker/s")
+    print(f"🔔 {len(fake.sent)} alert")
+    for alert in fake.sent[:args.show]:
+        print(f"--- t={alert['t']}s\n{alert['text']}")
+
+    if args.golden:
+        if args.update_golden:
+            with open(args.golden, "w", encoding="utf-8") as f:
+                json.dump(fake.sent, f, ensure_ascii=False, indent=1)
+            print(f"✅ Đã ghi golden: {args.golden}")
+            return
+        with open(args.golden, encoding="utf-8") as f:
+            golden = json.load(f)
+        if golden == fake.sent:
+            print("✅ Khớp golden")
+            return
+        mismatch = next(
+            (i for i, (a, b) in enumerate(zip(golden, fake.sent)) if a != b),
+            min(len(golden), len(fake.sent)),
+        )
+        print(f"❌ Khác golden tại alert #{mismatch} (golden {len(golden)}, hiện tại {len(fake.sent)})")
+        if mismatch < len(golden):
+            print(f"golden : {golden[mismatch]}")
+        if mismatch < len(fake.sent):
+            print(f"hiện tại: {fake.sent[mismatch]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
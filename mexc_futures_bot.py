@@ -1,10 +1,20 @@
 import os
+import time
 import aiohttp
+from aiohttp import web
 import asyncio
 import json
+import gzip
+import zlib
+import heapq
+import bisect
+import signal
+import tracemalloc
 import websockets
+import numpy as np
 from statistics import mean
 from telegram import Update
+from telegram.error import BadRequest, NetworkError, RetryAfter
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -15,8 +25,26 @@ from datetime import datetime, timedelta
 import pytz
 from collections import defaultdict, deque
 import pickle
+import sqlite3
 import os.path
 
+# JSON decoder nhanh cho WebSocket (optional): orjson > msgspec > json chuẩn
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_BACKEND = "orjson"
+    JSON_DECODE_ERRORS = (orjson.JSONDecodeError,)
+except ImportError:
+    try:
+        import msgspec
+        json_loads = msgspec.json.decode
+        JSON_BACKEND = "msgspec"
+        JSON_DECODE_ERRORS = (msgspec.DecodeError,)
+    except ImportError:
+        json_loads = json.loads
+        JSON_BACKEND = "json"
+        JSON_DECODE_ERRORS = (json.JSONDecodeError,)
+
 # Load biến môi trường từ file .env
 load_dotenv()
 
@@ -25,8 +53,35 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHANNEL_ID = os.getenv("CHANNEL_ID")  # ID của channel (ví dụ: -1001234567890 hoặc @channel_name)
 ADMIN_IDS = set(map(int, os.getenv("ADMIN_IDS", "").split(","))) if os.getenv("ADMIN_IDS") else set()  # Admin user IDs
 
-FUTURES_BASE = "https://contract.mexc.co"
-WEBSOCKET_URL = "wss://contract.mexc.co/edge"  # MEXC Futures WebSocket endpoint
+# Override để chạy với server giả lập (benchmarks/mock_mexc.py) khi load test
+FUTURES_BASE = os.getenv("FUTURES_BASE", "https://contract.mexc.co")
+WEBSOCKET_URL = os.getenv("WEBSOCKET_URL", "wss://contract.mexc.co/edge")  # MEXC Futures WebSocket endpoint
+
+# WebSocket ingest chia shard: mỗi shard 1 kết nối, phụ trách 1 phần symbols
+WS_SHARDS = int(os.getenv("WS_SHARDS", "4"))
+WS_SUB_BURST = 50  # Số message subscribe gửi liền 1 lần
+WS_SUB_BURST_DELAY = 0.05  # Nghỉ giữa các burst (giây)
+WS_WATCHDOG_INTERVAL = 5  # Chu kỳ tính message rate (giây)
+WS_STALE_TIMEOUT = 30  # Shard không nhận message quá N giây → reconnect
+WS_TICKERS_STALE_TIMEOUT = 15  # push.tickers im lặng quá N giây → chuyển sub.tickers sang shard khác
+# Pipeline receive → detection → delivery
+TICK_QUEUE_MAX = 5000  # Số coin tối đa đang chờ detect (tick cùng coin được gom, chỉ giữ tick mới nhất)
+ALERT_QUEUE_MAX = 1000  # Số alert tối đa đang chờ gửi (đầy → bỏ alert ưu tiên thấp nhất)
+DELIVERY_WORKERS = 4  # Số task gửi alert Telegram song song
+# Ghi frame WebSocket thô ra file gzip (append) để replay offline - để trống = tắt
+TICK_RECORD_PATH = os.getenv("TICK_RECORD_PATH", "")
+TICK_RECORD_FLUSH_INTERVAL = 5  # Giây giữa 2 lần ghi buffer xuống file
+# symbol: sub.ticker từng coin | all: 1 stream sub.tickers cả market (push.tickers, xử lý theo batch)
+WS_TICKER_MODE = os.getenv("WS_TICKER_MODE", "all").lower()
+# Endpoint metrics dạng Prometheus (GET /metrics) - METRICS_PORT=0 để tắt
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+LOOP_LAG_INTERVAL = 0.5  # Chu kỳ đo độ trễ event loop (giây)
+# Profiling theo yêu cầu (/profile, /memsnap) - file dump để phân tích offline
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = 0.005  # Lấy mẫu stack mỗi 5ms
+PROFILE_MAX_SECONDS = 300
+TRACEMALLOC_FRAMES = 10  # Số frame traceback lưu cho mỗi allocation
 
 # Ngưỡng để báo động (%)
 PUMP_THRESHOLD = 3.0      # Tăng >= 3%
@@ -37,9 +92,47 @@ EXTREME_THRESHOLD = 10.0  # Ngưỡng cực mạnh >= 10%
 # Volume tối thiểu để tránh coin ít thanh khoản
 MIN_VOL_THRESHOLD = 100000
 
+# REST rate limiter dùng chung (request/giây, tự điều chỉnh theo 429)
+REST_RATE_INITIAL = 20.0
+REST_RATE_MIN = 2.0
+REST_RATE_MAX = 50.0
+REST_MAX_CONCURRENCY = 20  # Số request đồng thời tối đa
+REST_RETRY_BACKOFF = 0.5  # Giây chờ trước khi thử lại lỗi mạng / 5xx (x2 mỗi lần thử)
+
+# Telegram delivery: giới hạn gửi tin (Telegram: ~30 tin/giây toàn bot, 1 tin/giây mỗi chat, ~20 tin/phút mỗi group)
+TELEGRAM_GLOBAL_RATE = 25.0  # Tin/giây toàn bot (giảm tạm thời khi bị RetryAfter)
+TELEGRAM_RATE_MIN = 5.0
+TELEGRAM_MAX_CONCURRENCY = 16  # Số request send_message đồng thời
+TELEGRAM_CHAT_INTERVAL = 1.0  # Giây giữa 2 tin cùng 1 chat riêng
+TELEGRAM_GROUP_INTERVAL = 3.0  # Giây giữa 2 tin cùng 1 group/channel
+TELEGRAM_MAX_RETRIES = 3  # Số lần gửi lại khi RetryAfter / lỗi mạng
+TELEGRAM_QUEUE_MAX = 50000  # Số tin tối đa đang chờ gửi (đầy → bỏ tin mới)
+TELEGRAM_MESSAGE_LIMIT = 4096  # Độ dài tối đa 1 tin nhắn Telegram
+# Gom alert pump/dump + EMA trong N giây thành 1 tin/chat (0 = gửi từng alert ngay)
+ALERT_COALESCE_WINDOW = float(os.getenv("ALERT_COALESCE_WINDOW", "2"))
+# Độ ưu tiên (số nhỏ gửi trước)
+ALERT_PRIORITY_EXTREME = 0  # Pump/dump ≥ EXTREME_THRESHOLD
+ALERT_PRIORITY_PUMP = 1  # Pump/dump thường
+ALERT_PRIORITY_EMA = 2  # EMA 200
+ALERT_PRIORITY_INFO = 3  # Coin mới list, thông báo khác
+
+# HTTP client dùng chung (tạo trong post_init, đóng khi shutdown)
+HTTP_POOL_LIMIT = 100  # Tổng connection tối đa
+HTTP_POOL_LIMIT_PER_HOST = REST_MAX_CONCURRENCY
+HTTP_KEEPALIVE_TIMEOUT = 60  # Giữ connection idle (giây) để tái sử dụng TLS
+HTTP_DNS_TTL = 300  # Cache DNS (giây)
+
+# Snapshot ticker toàn thị trường (1 request cho tất cả coin) - cache trong N giây
+TICKER_SNAPSHOT_TTL = 2.0
+TICKER_SNAPSHOT_ERROR_BACKOFF = 5.0  # Fetch lỗi → mọi caller nhận lỗi đã cache trong N giây rồi mới thử lại
+
 # EMA 200 Detection
 EMA_PERIOD = 200
 EMA_PROXIMITY_THRESHOLD = 1.5  # ±1.5% từ EMA 200
+EMA_ALERT_COOLDOWN = 1800  # 30 phút giữa 2 alert cùng coin + timeframe
+# "realtime": check mỗi batch ticker vừa nhận | "batch": gom giá trong EMA_BATCH_WINDOW rồi check cả universe 1 lần
+EMA_CHECK_MODE = os.getenv("EMA_CHECK_MODE", "realtime")
+EMA_BATCH_WINDOW = float(os.getenv("EMA_BATCH_WINDOW", "1.0"))  # giây
 EMA_TIMEFRAMES = ["Min1", "Min5", "Min15", "Min30", "Min60", "Hour4"]
 EMA_TIMEFRAME_LABELS = {
     "Min1": "M1",
@@ -49,6 +142,15 @@ EMA_TIMEFRAME_LABELS = {
     "Min60": "H1",
     "Hour4": "H4"
 }
+EMA_TIMEFRAME_SECONDS = {
+    "Min1": 60,
+    "Min5": 300,
+    "Min15": 900,
+    "Min30": 1800,
+    "Min60": 3600,
+    "Hour4": 14400
+}
+EMA_PRICE_MAX_AGE = 60  # Giá ticker cũ hơn 60s coi như stale → fallback REST
 
 
 SUBSCRIBERS = set()  # User IDs (cho private chat)
@@ -58,22 +160,29 @@ KNOWN_SYMBOLS = set()  # Danh sách coin đã biết
 ALL_SYMBOLS = []  # Cache danh sách coin
 
 # WebSocket price tracking
-LAST_PRICES = {}  # {symbol: {"price": float, "time": datetime}}
-BASE_PRICES = {}  # {symbol: base_price} - Dynamic reset: chỉ reset sau khi alert
-ALERTED_SYMBOLS = {}  # {symbol: timestamp} - tránh spam alert
-MAX_CHANGES = {}  # {symbol: {"max_pct": float, "time": datetime}} - Track max % change trong đợt pump/dump
-LAST_SIGNIFICANT_CHANGE = {}  # {symbol: timestamp} - Lần cuối có biến động mạnh
+WS_SHARD_LIST = []  # [WsShard] - các kết nối WebSocket đang chạy
+SYMBOL_STATES = {}  # {symbol: SymbolState} - state pump/dump của từng coin (giá, base, max change, alert)
+
+# Scheduled universe refresh tracking (coin mới list)
+SCHEDULED_REFRESHES = set()  # Set of timestamps đã schedule cập nhật universe
 
-# Scheduled restart tracking
-SCHEDULED_RESTARTS = set()  # Set of timestamps đã schedule restart
+# Candle cache trên đĩa - restart chỉ cần lấy phần candle còn thiếu
+CANDLE_CACHE_DIR = os.getenv("CANDLE_CACHE_DIR", "candle_cache")
+CANDLE_CACHE_INTERVAL = 300  # Lưu cache mỗi 5 phút (và khi shutdown)
+CANDLE_CACHE_MAX_GAP = 1000  # Thiếu nhiều hơn N candle thì lấy lại toàn bộ lịch sử
 
-# EMA 200 alert tracking
-EMA200_ALERTED = {}  # {symbol: {timeframe: timestamp}} - tránh spam alert EMA 200
+# Warm-up EMA (load lịch sử kline khi khởi động)
+WARMUP_WORKERS = 16  # Số worker song song (tốc độ thực tế do REST_LIMITER quyết định)
+WARMUP_RETRY = 2  # Số lần thử lại khi lỗi mạng
+WARMUP_REPORT_INTERVAL = 30  # In tiến độ mỗi 30s
+WARMUP = {"total": 0, "done": 0, "failed": 0, "started": None, "running": 0}  # running = số lượt đang chạy
+WARMUP_DONE = set()  # {(symbol, timeframe)} đã seed - chạy lại sẽ bỏ qua
 
-# WebSocket-based EMA - candle buffers (NEW)
-CANDLE_BUFFERS = {}  # {symbol: {timeframe: deque([close_prices])}}
-EMA_VALUES = {}  # {symbol: {timeframe: float}} - cached EMA 200
-LAST_CANDLE_TIME = {}  # {symbol: {timeframe: int}} - track candle timestamp
+# EMA 200 alert tracking: cooldown nằm trong CANDLE_STORE.ema_alerted (monotonic time)
+
+# WebSocket-based EMA - candle store numpy (khởi tạo ở phần WEBSOCKET EMA FUNCTIONS)
+EMA_K = 2 / (EMA_PERIOD + 1)  # Hệ số làm mượt EMA
+CANDLE_STORE_CAPACITY = 1024  # Số symbol cấp phát sẵn (tự x2 khi đầy)
 
 # Alert preferences - bật/tắt từng loại alert
 PUMPDUMP_ALERTS_ENABLED = {}  # {chat_id: bool} - True = bật pump/dump alerts
@@ -82,77 +191,676 @@ EMA_ALERTS_ENABLED = {}  # {chat_id: bool} - True = bật EMA 200 alerts
 
 
 
-# File để lưu dữ liệu persist
-DATA_FILE = "bot_data.pkl"
+# Dữ liệu persist: SQLite (WAL), file pickle cũ chỉ dùng để migrate lần đầu
+DATA_DB = os.getenv("DATA_DB", "bot_data.db")
+DATA_FILE = os.getenv("DATA_FILE", "bot_data.pkl")  # Legacy pickle
+DATA_FLUSH_INTERVAL = 1.0  # Gom thay đổi setting, commit 1 transaction mỗi 1s
 
 
 # ================== PERSISTENT DATA ==================
-def save_data():
-    """Lưu dữ liệu quan trọng vào file"""
-    data = {
-        "subscribers": SUBSCRIBERS,
-        "alert_mode": ALERT_MODE,
-        "muted_coins": MUTED_COINS,
-        "known_symbols": KNOWN_SYMBOLS,
-        "pumpdump_alerts_enabled": PUMPDUMP_ALERTS_ENABLED,
-        "ema_alerts_enabled": EMA_ALERTS_ENABLED
-    }
-    try:
-        with open(DATA_FILE, "wb") as f:
-            pickle.dump(data, f)
-        print(f"✅ Đã lưu dữ liệu: {len(SUBSCRIBERS)} subscribers")
-    except Exception as e:
-        print(f"⚠️ Lỗi lưu dữ liệu: {e}")
+class DataStore:
+    """
+    Lưu subscriber / setting từng chat / coin mute / coin đã biết vào SQLite (WAL).
+    Mỗi lệnh chỉ ghi nhận thay đổi của chat đó (upsert nhỏ), task nền commit theo batch ngoài event loop
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id INTEGER PRIMARY KEY,
+            subscribed INTEGER NOT NULL DEFAULT 0,
+            alert_mode INTEGER,
+            pumpdump_enabled INTEGER,
+            ema_enabled INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS muted_coins (
+            chat_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            PRIMARY KEY (chat_id, symbol)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS known_symbols (
+            symbol TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.chats = {}  # chat_id → row mới nhất chờ ghi
+        self.mutes = {}  # (chat_id, symbol) → True (mute) / False (unmute)
+        self.symbols = set()  # Coin mới chờ ghi
+        self.commits = 0
+        self.rows = 0  # Số thay đổi đã commit
+        self._task = None
+        self._lock = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def load(self):
+        """Đọc toàn bộ dữ liệu → (subscribers, alert_mode, muted_coins, known_symbols, pumpdump, ema)"""
+        subscribers, alert_mode, pumpdump, ema = set(), {}, {}, {}
+        rows = self.conn.execute(
+            "SELECT chat_id, subscribed, alert_mode, pumpdump_enabled, ema_enabled FROM chats"
+        )
+        for chat, subscribed, mode, pumpdump_enabled, ema_enabled in rows:
+            if subscribed:
+                subscribers.add(chat)
+            if mode is not None:
+                alert_mode[chat] = mode
+            if pumpdump_enabled is not None:
+                pumpdump[chat] = bool(pumpdump_enabled)
+            if ema_enabled is not None:
+                ema[chat] = bool(ema_enabled)
+        muted = {}
+        for chat, symbol in self.conn.execute("SELECT chat_id, symbol FROM muted_coins"):
+            muted.setdefault(chat, set()).add(symbol)
+        known = {symbol for (symbol,) in self.conn.execute("SELECT symbol FROM known_symbols")}
+        return subscribers, alert_mode, muted, known, pumpdump, ema
+
+    def is_empty(self):
+        return not any(
+            self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone()
+            for table in ("chats", "muted_coins", "known_symbols")
+        )
+
+    def migrate_pickle(self, path):
+        """Chuyển file pickle cũ sang SQLite (chỉ khi DB còn trống), đổi tên file cũ thành .migrated"""
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        subscribers = data.get("subscribers", set())
+        alert_mode = data.get("alert_mode", {})
+        pumpdump = data.get("pumpdump_alerts_enabled", {})
+        ema = data.get("ema_alerts_enabled", {})
+        chats = set(subscribers) | set(alert_mode) | set(pumpdump) | set(ema)
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chats VALUES (?, ?, ?, ?, ?)",
+                [self._chat_row(chat, subscribers, alert_mode, pumpdump, ema) for chat in chats],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO muted_coins VALUES (?, ?)",
+                [(chat, symbol) for chat, symbols in data.get("muted_coins", {}).items() for symbol in symbols],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO known_symbols VALUES (?)",
+                [(symbol,) for symbol in data.get("known_symbols", set())],
+            )
+        try:
+            os.replace(path, path + ".migrated")
+        except OSError as e:
+            print(f"⚠️ Không đổi tên được {path}: {e}")
+        print(f"📦 Đã migrate {path} → {self.path}: {len(chats)} chat, {len(subscribers)} subscribers")
+
+    @staticmethod
+    def _chat_row(chat, subscribers, alert_mode, pumpdump, ema):
+        pumpdump_enabled = pumpdump.get(chat)
+        ema_enabled = ema.get(chat)
+        return (
+            chat,
+            int(chat in subscribers),
+            alert_mode.get(chat),
+            None if pumpdump_enabled is None else int(pumpdump_enabled),
+            None if ema_enabled is None else int(ema_enabled),
+        )
+
+    # --- Ghi nhận thay đổi (gọi trên event loop, O(1)) ---
+    def save_chat(self, chat):
+        """Snapshot setting hiện tại của 1 chat (subscribe, mode, toggle)"""
+        self.chats[chat] = self._chat_row(chat, SUBSCRIBERS, ALERT_MODE, PUMPDUMP_ALERTS_ENABLED, EMA_ALERTS_ENABLED)
+        self._schedule()
+
+    def save_mute(self, chat, symbol, muted):
+        self.mutes[(chat, symbol)] = muted
+        self._schedule()
+
+    def save_symbols(self, symbols):
+        self.symbols.update(symbols)
+        self._schedule()
+
+    def _schedule(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_sync()  # Không có event loop (script / shutdown) → ghi luôn
+            return
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Lặp đến khi hết thay đổi: save_* gọi trong lúc đang commit (task chưa done) không tạo task mới,
+        # commit lỗi thì batch được trả lại hàng chờ → thử lại ở lượt sau
+        while True:
+            await asyncio.sleep(DATA_FLUSH_INTERVAL)
+            await self.flush()
+            if self.conn is None or not self.pending():
+                return
+
+    # --- Commit ---
+    def _take(self):
+        batch = (list(self.chats.values()), list(self.mutes.items()), list(self.symbols))
+        self.chats, self.mutes, self.symbols = {}, {}, set()
+        return batch
+
+    def _restore(self, batch):
+        """Commit lỗi → trả batch về hàng chờ (thay đổi mới hơn ghi nhận trong lúc commit được giữ nguyên)"""
+        chats, mutes, symbols = batch
+        for row in chats:
+            self.chats.setdefault(row[0], row)
+        for key, muted in mutes:
+            self.mutes.setdefault(key, muted)
+        self.symbols.update(symbols)
+
+    def _commit(self, batch):
+        chats, mutes, symbols = batch
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO chats VALUES (?, ?, ?, ?, ?) ON CONFLICT(chat_id) DO UPDATE SET "
+                "subscribed = excluded.subscribed, alert_mode = excluded.alert_mode, "
+                "pumpdump_enabled = excluded.pumpdump_enabled, ema_enabled = excluded.ema_enabled",
+                chats,
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO muted_coins VALUES (?, ?)",
+                [key for key, muted in mutes if muted],
+            )
+            self.conn.executemany(
+                "DELETE FROM muted_coins WHERE chat_id = ? AND symbol = ?",
+                [key for key, muted in mutes if not muted],
+            )
+            self.conn.executemany("INSERT OR IGNORE INTO known_symbols VALUES (?)", [(s,) for s in symbols])
+        self.commits += 1
+        self.rows += len(chats) + len(mutes) + len(symbols)
+
+    def pending(self):
+        return len(self.chats) + len(self.mutes) + len(self.symbols)
+
+    async def flush(self):
+        if self.conn is None or not self.pending():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:  # 1 commit tại 1 thời điểm (connection dùng chung giữa các thread)
+            batch = self._take()
+            try:
+                await asyncio.to_thread(self._commit, batch)
+            except Exception as e:
+                self._restore(batch)
+                print(f"⚠️ Lỗi lưu dữ liệu (thử lại sau): {e}")
+
+    def flush_sync(self):
+        if self.conn is None or not self.pending():
+            return
+        batch = self._take()
+        try:
+            self._commit(batch)
+        except Exception as e:
+            self._restore(batch)
+            print(f"⚠️ Lỗi lưu dữ liệu: {e}")
+
+    def close(self):
+        if self.conn is not None:
+            self.flush_sync()
+            self.conn.close()
+            self.conn = None
+
+    def stats(self):
+        return {"pending": self.pending(), "commits": self.commits, "rows": self.rows}
+
+
+DATA_STORE = DataStore(DATA_DB)
 
 
 def load_data():
-    """Tải dữ liệu từ file"""
+    """Mở SQLite store (migrate pickle cũ nếu có) và tải dữ liệu"""
     global SUBSCRIBERS, ALERT_MODE, MUTED_COINS, KNOWN_SYMBOLS, PUMPDUMP_ALERTS_ENABLED, EMA_ALERTS_ENABLED
-    
-    if not os.path.exists(DATA_FILE):
-        print("ℹ️ Chưa có dữ liệu lưu trữ")
-        return
-    
+
     try:
-        with open(DATA_FILE, "rb") as f:
-            data = pickle.load(f)
-        
-        SUBSCRIBERS = data.get("subscribers", set())
-        ALERT_MODE = data.get("alert_mode", {})
-        MUTED_COINS = data.get("muted_coins", {})
-        KNOWN_SYMBOLS = data.get("known_symbols", set())
-        PUMPDUMP_ALERTS_ENABLED = data.get("pumpdump_alerts_enabled", {})
-        EMA_ALERTS_ENABLED = data.get("ema_alerts_enabled", {})
-        
+        DATA_STORE.open()
+        if os.path.isfile(DATA_FILE) and DATA_STORE.is_empty():
+            DATA_STORE.migrate_pickle(DATA_FILE)
+        (
+            SUBSCRIBERS, ALERT_MODE, MUTED_COINS, KNOWN_SYMBOLS, PUMPDUMP_ALERTS_ENABLED, EMA_ALERTS_ENABLED
+        ) = DATA_STORE.load()
         print(f"✅ Đã tải dữ liệu: {len(SUBSCRIBERS)} subscribers, {len(KNOWN_SYMBOLS)} coins")
     except Exception as e:
         print(f"⚠️ Lỗi tải dữ liệu: {e}")
+    ALERT_ROUTER.rebuild()
+
+
+# ================== ALERT ROUTING ==================
+# Band theo |%| biến động: moderate (≤ MODERATE_MAX), strong (giữa), extreme (≥ EXTREME_THRESHOLD)
+SEVERITY_BANDS = ("moderate", "strong", "extreme")
+MODE_BANDS = {
+    1: SEVERITY_BANDS,  # Mode 1: Báo tất cả
+    2: ("moderate",),  # Mode 2: Chỉ 3-5%
+    3: ("extreme",),  # Mode 3: Chỉ ≥10%
+}
+
+
+def severity_band(abs_change):
+    """Band của 1 alert pump/dump theo |%| biến động"""
+    if abs_change >= EXTREME_THRESHOLD:
+        return "extreme"
+    if abs_change > MODERATE_MAX:
+        return "strong"
+    return "moderate"
+
+
+class AlertRouter:
+    """
+    Index chat nhận alert: (loại alert, band) → set chat, mute = set chat loại trừ theo từng symbol.
+    Cập nhật từng chat khi /subscribe, /mode*, /mute, /pumpdump_*, /ema_* đổi setting
+    → fan-out chỉ duyệt các chat khớp thay vì toàn bộ SUBSCRIBERS
+    """
+
+    def __init__(self):
+        self.routes = {}  # ("pump", band) / ("ema", None) → set(chat_id)
+        self.muted = {}  # symbol → set(chat_id) đã mute coin đó
+        self.chat_routes = {}  # chat_id → [key] chat đang nằm trong (để gỡ khi đổi setting)
+
+    def update_chat(self, chat):
+        """Tính lại route của 1 chat từ SUBSCRIBERS / ALERT_MODE / toggle"""
+        for key in self.chat_routes.pop(chat, ()):
+            self.routes[key].discard(chat)
+        if chat not in SUBSCRIBERS:
+            return
+        keys = []
+        if PUMPDUMP_ALERTS_ENABLED.get(chat, True):  # Mặc định: bật
+            bands = MODE_BANDS.get(ALERT_MODE.get(chat, 1), SEVERITY_BANDS)
+            keys += [("pump", band) for band in bands]
+        if EMA_ALERTS_ENABLED.get(chat, True):  # Mặc định: bật
+            keys.append(("ema", None))
+        for key in keys:
+            self.routes.setdefault(key, set()).add(chat)
+        self.chat_routes[chat] = keys
+
+    def mute(self, chat, symbol):
+        self.muted.setdefault(symbol, set()).add(chat)
+
+    def unmute(self, chat, symbol):
+        chats = self.muted.get(symbol)
+        if chats is not None:
+            chats.discard(chat)
+            if not chats:
+                del self.muted[symbol]
+
+    def rebuild(self):
+        """Dựng lại toàn bộ index (sau load_data)"""
+        self.routes, self.muted, self.chat_routes = {}, {}, {}
+        for chat in SUBSCRIBERS:
+            self.update_chat(chat)
+        for chat, symbols in MUTED_COINS.items():
+            for symbol in symbols:
+                self.mute(chat, symbol)
+
+    def recipients(self, kind, band=None, symbol=None):
+        """Channel + subscriber khớp (kind, band), trừ chat đã mute symbol"""
+        recipients = [CHANNEL_ID] if CHANNEL_ID else []
+        chats = self.routes.get((kind, band))
+        if not chats:
+            return recipients
+        excluded = self.muted.get(symbol) if symbol else None
+        if excluded:
+            recipients += [chat for chat in chats if chat not in excluded]
+        else:
+            recipients += chats
+        return recipients
+
+    def stats(self):
+        return {
+            "pump": {band: len(self.routes.get(("pump", band), ())) for band in SEVERITY_BANDS},
+            "ema": len(self.routes.get(("ema", None), ())),
+            "muted_symbols": len(self.muted),
+        }
+
+
+ALERT_ROUTER = AlertRouter()
+
+
+# ================== METRICS ==================
+# Counter / histogram nhẹ trong process (chỉ cộng dict, không lock) - render dạng Prometheus text khi scrape
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS = []  # Thứ tự render
+
+
+def _metric_labels(names, values, extra=None):
+    parts = [
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricCounter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}  # tuple label → giá trị
+        METRICS.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in self.values.items():
+            yield f"{self.name}{_metric_labels(self.labels, label_values)} {value}"
+
+
+class MetricHistogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # tuple label → [count theo bucket (không cộng dồn)..., +Inf, sum]
+        METRICS.append(self)
+
+    def observe(self, value, *label_values):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in self.values.items():
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                total += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_metric_labels(self.labels, label_values, le)} {total}"
+            labels = _metric_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-1]:.6f}"
+            yield f"{self.name}_count{labels} {total}"
+
+
+class MetricGauge:
+    """Gauge tính lúc scrape: fn() → số, hoặc [(tuple label, số)] - None = chưa có dữ liệu (NaN)"""
+
+    def __init__(self, name, help_text, fn, labels=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labels = labels
+        METRICS.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        value = self.fn()
+        if not self.labels:
+            value = [((), value)]
+        for label_values, v in value:
+            yield f"{self.name}{_metric_labels(self.labels, label_values)} {'NaN' if v is None else v}"
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"⚠️ Lỗi render metric {metric.name}: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def rest_endpoint(url):
+    """Label endpoint cho REST metric: bỏ host, symbol trong path → {symbol}"""
+    path = url.split("://", 1)[-1].partition("/")[2]
+    head, _, last = path.rpartition("/")
+    if last.endswith("_USDT"):
+        path = f"{head}/{{symbol}}"
+    return "/" + path
+
+
+WS_FRAMES = MetricCounter("mexc_ws_frames_total", "Frame WebSocket đã nhận theo channel", ("channel",))
+WS_BAD_TICKERS = MetricCounter("mexc_ws_bad_tickers_total", "Item push.tickers bị bỏ do dữ liệu lỗi")
+DETECT_LATENCY = MetricHistogram("mexc_detect_batch_seconds", "Thời gian detect 1 batch ticker (pump/dump + EMA)")
+DETECT_TICKERS = MetricCounter("mexc_detect_tickers_total", "Số ticker đã qua detection")
+REST_LATENCY = MetricHistogram("mexc_rest_request_seconds", "Latency REST theo endpoint", ("endpoint",))
+REST_THROTTLED = MetricCounter("mexc_rest_throttled_total", "Số response 429 theo endpoint", ("endpoint",))
+REST_ERRORS = MetricCounter("mexc_rest_errors_total", "Số request REST lỗi theo endpoint", ("endpoint",))
+TELEGRAM_SEND_LATENCY = MetricHistogram("mexc_telegram_send_seconds", "Thời gian gọi send_message")
+TELEGRAM_QUEUE_LATENCY = MetricHistogram(
+    "mexc_telegram_delivery_seconds", "Thời gian từ lúc xếp hàng đến lúc gửi xong",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+TELEGRAM_FAILURES = MetricCounter("mexc_telegram_failures_total", "Lỗi gửi Telegram theo loại", ("reason",))
+LOOP_LAG = MetricHistogram("mexc_event_loop_lag_seconds", "Độ trễ event loop (sleep thực tế - dự kiến)")
+LOOP_LAG_LAST = [0.0]  # Giá trị đo gần nhất (cho gauge)
+MetricGauge("mexc_event_loop_lag_last_seconds", "Độ trễ event loop đo gần nhất", lambda: LOOP_LAG_LAST[0])
+MetricGauge(
+    "mexc_ema_coverage_ratio", "Tỷ lệ symbol đã có EMA 200 theo timeframe",
+    lambda: [((tf,), CANDLE_STORE.ema_coverage(tf)) for tf in EMA_TIMEFRAMES], ("timeframe",),
+)
+MetricGauge(
+    "mexc_ws_shard_up", "Shard WebSocket đang kết nối (1/0)",
+    lambda: [((shard.index,), int(shard.ws is not None)) for shard in WS_SHARD_LIST], ("shard",),
+)
+MetricGauge(
+    "mexc_ws_tickers_age_seconds", "Số giây từ frame push.tickers gần nhất (WS_TICKER_MODE=all)",
+    lambda: TICKER_STREAM.age(time.monotonic()),
+)
+MetricGauge("mexc_tick_queue_depth", "Số coin đang chờ detect", lambda: TICK_QUEUE.stats()["depth"])
+MetricGauge("mexc_alert_queue_depth", "Số alert đang chờ gửi", lambda: ALERT_QUEUE.stats()["depth"])
+MetricGauge("mexc_telegram_queue_depth", "Số tin Telegram đang chờ gửi", lambda: TELEGRAM_SCHEDULER.size)
+MetricGauge("mexc_rest_rate", "Rate hiện tại của REST_LIMITER (req/s)", lambda: REST_LIMITER.rate)
+METRICS_RUNNER = None  # aiohttp AppRunner của endpoint /metrics
+
+
+async def monitor_event_loop():
+    """Đo độ trễ event loop: sleep LOOP_LAG_INTERVAL rồi so với thời gian thực tế"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - start - LOOP_LAG_INTERVAL)
+        LOOP_LAG_LAST[0] = lag
+        LOOP_LAG.observe(lag)
+
+
+async def handle_metrics(request):
+    # Content type của Prometheus text exposition format
+    return web.Response(text=render_metrics(), content_type="text/plain; version=0.0.4", charset="utf-8")
+
+
+async def start_metrics_server():
+    global METRICS_RUNNER
+    if not METRICS_PORT:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    METRICS_RUNNER = web.AppRunner(app, access_log=None)
+    await METRICS_RUNNER.setup()
+    try:
+        await web.TCPSite(METRICS_RUNNER, METRICS_HOST, METRICS_PORT).start()
+    except OSError as e:
+        print(f"⚠️ Không mở được metrics endpoint {METRICS_HOST}:{METRICS_PORT}: {e}")
+        await METRICS_RUNNER.cleanup()
+        METRICS_RUNNER = None
+        return
+    asyncio.create_task(monitor_event_loop())
+    print(f"📈 Metrics: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+
+async def stop_metrics_server():
+    global METRICS_RUNNER
+    if METRICS_RUNNER is not None:
+        await METRICS_RUNNER.cleanup()
+        METRICS_RUNNER = None
 
 
 # ================== UTIL ==================
+HTTP_SESSION = None  # aiohttp.ClientSession dùng chung cho toàn app
+
+
+def create_http_session():
+    """Tạo ClientSession với connection pool + keep-alive + DNS cache"""
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_TTL,
+        enable_cleanup_closed=True,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def get_http_session():
+    """Session dùng chung - tự tạo lại nếu chưa có hoặc đã đóng"""
+    global HTTP_SESSION
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = create_http_session()
+    return HTTP_SESSION
+
+
+async def close_http_session():
+    global HTTP_SESSION
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+    HTTP_SESSION = None
+
+
+class RateLimiter:
+    """
+    Token bucket + AIMD dùng chung cho MỌI REST call (kline, ticker, contract, calendar).
+    - Thành công: tăng rate thêm `increase` req/s (additive increase)
+    - 429 / header báo hết quota: rate × `decrease` và chặn theo Retry-After (multiplicative decrease)
+    - Giới hạn thêm số request đồng thời (max_concurrency)
+    """
+
+    def __init__(self, rate, min_rate, max_rate, max_concurrency, increase=0.2, decrease=0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # monotonic time - không gửi request trước thời điểm này
+        self.waiting = 0  # số request đang xếp hàng chờ token
+        self.in_flight = 0
+        self.throttled = 0  # tổng số lần bị 429
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self):
+        # Semaphore gắn với event loop - tạo lại nếu bot restart với loop mới
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+
+                # Nạp lại token theo rate hiện tại (burst tối đa = 1 giây)
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+            await self._get_semaphore().acquire()
+            self.in_flight += 1
+        finally:
+            self.waiting -= 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def on_success(self, headers=None):
+        """Request OK → tăng rate dần; nếu header báo sắp hết quota thì giảm trước"""
+        remaining = headers.get("X-RateLimit-Remaining") if headers else None
+        if remaining is not None and remaining.isdigit() and int(remaining) == 0:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            return
+        self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after=None):
+        """Bị 429 → giảm rate một nửa và dừng gửi theo Retry-After"""
+        self.throttled += 1
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+        try:
+            wait = float(retry_after) if retry_after else 1.0 / self.rate
+        except ValueError:
+            wait = 1.0 / self.rate
+        self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+        return wait
+
+    def stats(self):
+        return {
+            "rate": self.rate,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "throttled": self.throttled,
+        }
+
+
+REST_LIMITER = RateLimiter(REST_RATE_INITIAL, REST_RATE_MIN, REST_RATE_MAX, REST_MAX_CONCURRENCY)
+
+
 async def fetch_json(session, url, params=None, retry=3):
-    """Fetch JSON với retry logic cho 429 errors"""
-    import random
-    
+    """
+    Fetch JSON qua REST_LIMITER - tự điều chỉnh rate theo 429/headers.
+    Thử lại: 429 (chờ theo Retry-After qua limiter), lỗi mạng / 5xx (chờ REST_RETRY_BACKOFF x2 mỗi lần).
+    4xx khác (404 coin delist, 400 sai params...) → raise ngay, thử lại cũng vô ích
+    """
+    endpoint = rest_endpoint(url)
     for attempt in range(retry):
         try:
-            async with session.get(url, params=params, timeout=10) as r:
-                if r.status == 429:
-                    # Rate limit - đợi exponential backoff
-                    wait = (2 ** attempt) + random.uniform(0, 1)
-                    print(f"⚠️ Rate limit {url}, retry sau {wait:.1f}s...")
-                    await asyncio.sleep(wait)
-                    continue
-                
-                r.raise_for_status()
-                data = await r.json()
-                return data.get("data", data)
+            async with REST_LIMITER:
+                start = time.perf_counter()
+                async with session.get(url, params=params, timeout=10) as r:
+                    if r.status == 429:
+                        REST_THROTTLED.inc(endpoint)
+                        wait = REST_LIMITER.on_throttle(r.headers.get("Retry-After"))
+                        print(f"⚠️ Rate limit {url}, giảm còn {REST_LIMITER.rate:.1f} req/s, chờ {wait:.1f}s...")
+                        if attempt < retry - 1:
+                            continue
+                    
+                    r.raise_for_status()  # 429 ở lần thử cuối → lỗi (đếm vào REST_ERRORS bên dưới)
+                    REST_LIMITER.on_success(r.headers)
+                    data = await r.json()
+                REST_LATENCY.observe(time.perf_counter() - start, endpoint)
+            return data.get("data", data)
         except Exception as e:
-            if attempt == retry - 1:  # Lần thử cuối
+            REST_ERRORS.inc(endpoint)
+            status = getattr(e, "status", None) if isinstance(e, aiohttp.ClientResponseError) else None
+            client_error = status is not None and 400 <= status < 500 and status != 429
+            if client_error or attempt == retry - 1:  # 4xx hoặc lần thử cuối
                 print(f"❌ Error calling {url}: {e}")
                 raise
-            # Thử lại với delay
-            await asyncio.sleep(random.uniform(0.5, 1.5))
+            await asyncio.sleep(REST_RETRY_BACKOFF * 2 ** attempt)
     
     raise Exception(f"Failed after {retry} retries")
 
@@ -178,21 +886,103 @@ async def get_kline(session, symbol, interval="Min5", limit=10):
         return None, None, None, None
 
 
+async def get_kline_closes(session, symbol, interval="Min5", start=None):
+    """
+    Lấy lịch sử close kèm timestamp (giây) - dùng để seed EMA.
+    start: chỉ lấy candle từ timestamp này (dùng để lấp khoảng trống sau khi load cache)
+    """
+    url = f"{FUTURES_BASE}/api/v1/contract/kline/{symbol}"
+    params = {"interval": interval}
+    if start:
+        params["start"] = int(start)
+    try:
+        data = await fetch_json(session, url, params)
+        if not data or "close" not in data or "time" not in data:
+            return None, None
+
+        times = [int(t) for t in data["time"]]
+        closes = [float(x) for x in data["close"]]
+        return times, closes
+    except Exception as e:
+        if "404" not in str(e):
+            print(f"⚠️ Error getting kline history for {symbol}: {e}")
+        return None, None
+
+
+class TickerSnapshot:
+    """
+    Snapshot ticker của TẤT CẢ contract từ 1 request /contract/ticker.
+    Cache trong `ttl` giây; các caller đồng thời dùng chung 1 request đang chạy.
+    Fetch lỗi → log 1 lần, cache lỗi trong `error_backoff` giây (không caller nào gọi lại API trong lúc đó)
+    """
+
+    def __init__(self, ttl, error_backoff=TICKER_SNAPSHOT_ERROR_BACKOFF):
+        self.ttl = ttl
+        self.error_backoff = error_backoff
+        self.tickers = {}  # {symbol: ticker dict}
+        self.fetched_at = float("-inf")  # monotonic time lần fetch thành công gần nhất
+        self.error = None  # Lỗi của lần fetch gần nhất (None = thành công)
+        self.failed_at = float("-inf")  # monotonic time lần fetch lỗi gần nhất
+        self._inflight = None  # asyncio.Task đang fetch
+
+    async def _refresh(self, session):
+        try:
+            data = await fetch_json(session, f"{FUTURES_BASE}/api/v1/contract/ticker")
+            if isinstance(data, dict):
+                data = [data]
+            self.tickers = {t["symbol"]: t for t in data if t.get("symbol")}
+            self.fetched_at = time.monotonic()
+            self.error = None
+            return self.tickers
+        except Exception as e:
+            self.error = e
+            self.failed_at = time.monotonic()
+            print(f"⚠️ Error getting ticker snapshot: {e} (thử lại sau {self.error_backoff:.0f}s)")
+            raise
+        finally:
+            self._inflight = None
+
+    async def get(self, session):
+        """Trả về {symbol: ticker}, fetch lại nếu cache đã quá ttl (raise lỗi đã cache nếu còn trong backoff)"""
+        now = time.monotonic()
+        if now - self.fetched_at <= self.ttl:
+            return self.tickers
+        if self.error is not None and now - self.failed_at <= self.error_backoff:
+            raise self.error
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh(session))
+        # shield: 1 caller bị cancel không làm hỏng request của các caller khác
+        return await asyncio.shield(self._inflight)
+
+
+TICKER_SNAPSHOT = TickerSnapshot(TICKER_SNAPSHOT_TTL)
+
+
+async def get_all_tickers(session):
+    """Lấy ticker của tất cả contract (qua snapshot dùng chung) - lỗi đã được TickerSnapshot log → {}"""
+    try:
+        return await TICKER_SNAPSHOT.get(session)
+    except Exception:
+        return {}
 
 
 async def get_ticker(session, symbol):
-    """Lấy giá ticker hiện tại (realtime)"""
-    url = f"{FUTURES_BASE}/api/v1/contract/ticker/{symbol}"
+    """Lấy giá ticker hiện tại (realtime) - đọc từ snapshot dùng chung"""
+    tickers = await get_all_tickers(session)
+    data = tickers.get(symbol)
     try:
-        data = await fetch_json(session, url)
         return float(data["lastPrice"]) if data and "lastPrice" in data else None
-    except Exception as e:
-        # Bỏ qua lỗi 404 (coin đã delist) - không in ra để tránh spam log
-        if "404" not in str(e):
-            print(f"⚠️ Error getting ticker for {symbol}: {e}")
+    except (TypeError, ValueError):
         return None
 
 
+async def get_new_coin_calendar(session):
+    """Lịch coin list từ API calendar của MEXC - trả về list newCoins"""
+    timestamp = int(datetime.now().timestamp() * 1000)
+    url = "https://www.mexc.co/api/operation/new_coin_calendar"
+    data = await fetch_json(session, url, {"timestamp": timestamp})
+    return data.get("newCoins", []) if isinstance(data, dict) else []
+
 
 async def get_all_contracts(session):
     url = f"{FUTURES_BASE}/api/v1/contract/detail"
@@ -242,29 +1032,25 @@ def calculate_ema(prices, period=200):
 
 async def get_ema200_data(session, symbol, timeframe="Min5"):
     """
-    Lấy dữ liệu EMA 200 cho 1 symbol và 1 timeframe
+    Lấy dữ liệu EMA 200 cho 1 symbol và 1 timeframe qua REST (fallback khi cache thiếu/stale).
+    Lịch sử kline được seed luôn vào CANDLE_STORE để lần sau đọc từ cache.
     Returns: dict với ema200, current_price, distance_pct hoặc None nếu lỗi
     """
     try:
-        # Lấy 250 candles để đảm bảo đủ data tính EMA 200
-        closes, _, _, _ = await get_kline(session, symbol, timeframe, limit=250)
-        
-        # Kiểm tra nếu get_kline trả về None (coin đã delist)
-        if closes is None or len(closes) < EMA_PERIOD:
-            return None
-
+        times, closes = await get_kline_closes(session, symbol, timeframe)
         
-        # Tính EMA 200
-        ema200 = calculate_ema(closes, EMA_PERIOD)
-        if ema200 is None:
+        # Kiểm tra nếu không có data (coin đã delist) hoặc không đủ candle
+        if seed_ema(symbol, timeframe, times, closes) is None:
             return None
         
         # Lấy giá hiện tại (realtime)
         current_price = await get_ticker(session, symbol)
         if not current_price:
             return None
+        CANDLE_STORE.set_price(symbol, current_price)
         
-        # Tính khoảng cách % từ giá hiện tại đến EMA 200
+        # EMA 200 tạm tính (gồm candle đang chạy) + khoảng cách % từ giá hiện tại
+        ema200 = get_live_ema(symbol, timeframe, current_price)
         distance_pct = ((current_price - ema200) / ema200) * 100
         
         return {
@@ -277,49 +1063,74 @@ async def get_ema200_data(session, symbol, timeframe="Min5"):
         return None
 
 
+def ema200_proximity_from_cache(symbols, threshold=EMA_PROXIMITY_THRESHOLD):
+    """
+    Đọc EMA 200 proximity từ CANDLE_STORE (được WebSocket cập nhật liên tục) - vectorized.
+    Returns: (results, missing)
+      results = {timeframe: [(symbol, ema200, current_price, distance_pct), ...]}
+      missing = {timeframe: [symbol, ...]} - buffer chưa có hoặc stale → cần REST
+    """
+    store = CANDLE_STORE
+    results = {tf: [] for tf in EMA_TIMEFRAMES}
+    missing = {tf: [] for tf in EMA_TIMEFRAMES}
+
+    rows = np.array([store.index.get(sym, -1) for sym in symbols], dtype=np.int64)
+    known = rows >= 0
+    safe_rows = np.where(known, rows, 0)
+
+    now_ts, now_mono = time.time(), time.monotonic()
+    prices = store.price[safe_rows]
+    price_ok = known & ((now_mono - store.price_time[safe_rows]) <= EMA_PRICE_MAX_AGE)
+
+    for tf in EMA_TIMEFRAMES:
+        ema = store.ema[tf][safe_rows]
+        # Candle đang chạy phải thuộc chu kỳ hiện tại hoặc ngay trước đó
+        candle_ok = store.candle_time[tf][safe_rows] >= now_ts - 2 * EMA_TIMEFRAME_SECONDS[tf]
+        fresh = price_ok & candle_ok & ~np.isnan(ema)
+
+        live_ema = prices * EMA_K + ema * (1 - EMA_K)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            distance = (prices - live_ema) / live_ema * 100
+            near = fresh & (np.abs(distance) <= threshold)
+
+        for i in np.flatnonzero(near):
+            results[tf].append((symbols[i], float(live_ema[i]), float(prices[i]), float(distance[i])))
+        missing[tf] = [symbols[i] for i in np.flatnonzero(~fresh)]
+
+    return results, missing
+
 
 async def detect_ema200_proximity(session, symbols, threshold=EMA_PROXIMITY_THRESHOLD):
     """
-    Phát hiện coins gần chạm EMA 200 trên đa khung thời gian
+    Phát hiện coins gần chạm EMA 200 trên đa khung thời gian.
+    Ưu tiên đọc từ cache (WebSocket), chỉ gọi REST cho symbol chưa có buffer hoặc stale.
     Returns: dict {timeframe: [(symbol, ema200, current_price, distance_pct), ...]}
     """
-    import random
+    results, missing = ema200_proximity_from_cache(symbols, threshold)
     
-    results = {tf: [] for tf in EMA_TIMEFRAMES}
-    
-    # Scan từng timeframe
+    # Fallback REST cho từng timeframe (REST_LIMITER tự điều tiết tốc độ)
     for timeframe in EMA_TIMEFRAMES:
-        print(f"🔍 Scanning EMA 200 for {timeframe}...")
-        
-        # Chia nhỏ thành batch để tránh rate limit
-        BATCH_SIZE = 30
+        fallback = missing[timeframe]
+        print(f"🔍 EMA 200 {timeframe}: {len(symbols) - len(fallback)} từ cache, {len(fallback)} qua REST")
+        if not fallback:
+            continue
         
-        for i in range(0, len(symbols), BATCH_SIZE):
-            batch = symbols[i:i+BATCH_SIZE]
-            tasks = [get_ema200_data(session, sym, timeframe) for sym in batch]
-            batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Lọc kết quả và kiểm tra proximity
-            for j, result in enumerate(batch_results):
-                if result and not isinstance(result, Exception):
-                    distance = result["distance_pct"]
-                    
-                    # Kiểm tra nếu trong vùng proximity threshold
-                    if abs(distance) <= threshold:
-                        symbol = batch[j]
-                        results[timeframe].append((
-                            symbol,
-                            result["ema200"],
-                            result["current_price"],
-                            distance
-                        ))
-            
-            # Delay giữa các batch
-            if i + BATCH_SIZE < len(symbols):
-                await asyncio.sleep(random.uniform(0.3, 0.6))
+        tasks = [get_ema200_data(session, sym, timeframe) for sym in fallback]
+        fallback_results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        # Delay giữa các timeframe
-        await asyncio.sleep(random.uniform(0.5, 1.0))
+        # Lọc kết quả và kiểm tra proximity
+        for symbol, result in zip(fallback, fallback_results):
+            if result and not isinstance(result, Exception):
+                distance = result["distance_pct"]
+                
+                # Kiểm tra nếu trong vùng proximity threshold
+                if abs(distance) <= threshold:
+                    results[timeframe].append((
+                        symbol,
+                        result["ema200"],
+                        result["current_price"],
+                        distance
+                    ))
     
     # Sort mỗi timeframe theo khoảng cách gần nhất
     for tf in results:
@@ -328,99 +1139,677 @@ async def detect_ema200_proximity(session, symbols, threshold=EMA_PROXIMITY_THRE
     return results
 
 
+# ==================== WS FRAME DECODING ====================
+class Ticker:
+    """1 ticker từ push.ticker / push.tickers (giá + volume đã là float)"""
+    __slots__ = ("symbol", "price", "volume")
+
+    def __init__(self, symbol, price, volume):
+        self.symbol = symbol
+        self.price = price
+        self.volume = volume
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("symbol"), float(d.get("lastPrice") or 0), float(d.get("volume24") or 0))
+
+    @classmethod
+    def from_list(cls, items):
+        """Parse push.tickers: item lỗi (giá/volume không phải số) bị bỏ qua, không làm hỏng cả frame"""
+        tickers = []
+        for d in items:
+            try:
+                tickers.append(cls.from_dict(d))
+            except (TypeError, ValueError, AttributeError):
+                WS_BAD_TICKERS.inc()
+        return tickers
+
+
+class Kline:
+    """1 nến từ push.kline (chỉ các field dùng cho EMA)"""
+    __slots__ = ("symbol", "interval", "close", "time")
+
+    def __init__(self, symbol, interval, close, time):
+        self.symbol = symbol
+        self.interval = interval
+        self.close = close
+        self.time = time
+
+    @classmethod
+    def from_dict(cls, d):
+        symbol, interval, close, timestamp = d.get("symbol"), d.get("interval"), d.get("c"), d.get("t")
+        if not (symbol and interval and close and timestamp):
+            return None
+        return cls(symbol, interval, float(close), int(timestamp))
+
+
+def decode_ws_frame(message):
+    """
+    Decode 1 frame WebSocket (1 lần parse JSON) thành (channel, ts, payload):
+    push.ticker → Ticker, push.tickers → [Ticker], push.kline → Kline | None, khác → dict gốc
+    """
+    data = json_loads(message)
+    channel = data.get("channel")
+    if channel == "push.tickers":
+        payload = Ticker.from_list(data.get("data") or ())
+    elif channel == "push.ticker":
+        payload = Ticker.from_dict(data.get("data") or {})
+    elif channel == "push.kline":
+        payload = Kline.from_dict(data.get("data") or {})
+    else:
+        payload = data
+    return channel, data.get("ts"), payload
+
+
 # ==================== WEBSOCKET EMA FUNCTIONS ====================
 
+class CandleStore:
+    """
+    Ring buffer numpy cho candle close - thay cho dict lồng nhau {symbol: {timeframe: deque}}.
+    Mỗi timeframe có 1 mảng float64 liên tục (symbols × period), symbol → row qua self.index.
+    Các mảng ema/live/candle_time cùng row nên tính toán được cho cả universe 1 lần.
+    """
+
+    def __init__(self, timeframes, period=EMA_PERIOD, capacity=CANDLE_STORE_CAPACITY):
+        self.timeframes = list(timeframes)
+        self.period = period
+        self.capacity = 0
+        self.index = {}  # {symbol: row}
+        self.symbols = []  # row → symbol
+        self.closes = {}  # {timeframe: ndarray (capacity, period)} - chỉ candle ĐÃ ĐÓNG
+        self.count = {}  # {timeframe: ndarray (capacity,)} - tổng số candle đã commit
+        self.ema = {}  # {timeframe: ndarray} - EMA tính đến candle đã đóng gần nhất (NaN = chưa có)
+        self.live = {}  # {timeframe: ndarray} - close của candle đang hình thành
+        self.candle_time = {}  # {timeframe: ndarray} - timestamp candle đang hình thành
+        self.ema_alerted = {}  # {timeframe: ndarray} - monotonic time alert EMA gần nhất (-inf = chưa)
+        self.price = np.full(0, np.nan)  # giá ticker mới nhất theo row
+        self.price_dirty = np.zeros(0, dtype=bool)  # row có giá mới trong tick window hiện tại
+        self.price_time = np.full(0, -np.inf)  # monotonic time của giá mới nhất
+        self.cache_time = {tf: {} for tf in self.timeframes}  # {timeframe: {symbol: candle_time lúc load cache}}
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Cấp phát lại với capacity mới, giữ nguyên dữ liệu cũ"""
+        old = self.capacity
+        for tf in self.timeframes:
+            closes = np.full((capacity, self.period), np.nan)
+            count = np.zeros(capacity, dtype=np.int64)
+            ema = np.full(capacity, np.nan)
+            live = np.full(capacity, np.nan)
+            candle_time = np.zeros(capacity, dtype=np.int64)
+            ema_alerted = np.full(capacity, -np.inf)
+            if old:
+                closes[:old] = self.closes[tf]
+                count[:old] = self.count[tf]
+                ema[:old] = self.ema[tf]
+                live[:old] = self.live[tf]
+                candle_time[:old] = self.candle_time[tf]
+                ema_alerted[:old] = self.ema_alerted[tf]
+            self.closes[tf] = closes
+            self.count[tf] = count
+            self.ema[tf] = ema
+            self.live[tf] = live
+            self.candle_time[tf] = candle_time
+            self.ema_alerted[tf] = ema_alerted
+
+        price = np.full(capacity, np.nan)
+        price_dirty = np.zeros(capacity, dtype=bool)
+        price_time = np.full(capacity, -np.inf)
+        price[:old] = self.price
+        price_dirty[:old] = self.price_dirty
+        price_time[:old] = self.price_time
+        self.price = price
+        self.price_dirty = price_dirty
+        self.price_time = price_time
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def ema_coverage(self, timeframe):
+        """Tỷ lệ symbol đã có EMA 200 ở timeframe (0..1)"""
+        n = len(self.symbols)
+        return float(np.count_nonzero(~np.isnan(self.ema[timeframe][:n]))) / n if n else 0.0
+
+    def row(self, symbol):
+        """Lấy row của symbol, tạo mới nếu chưa có"""
+        row = self.index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.index[symbol] = row
+            self.symbols.append(symbol)
+        return row
+
+    def seed(self, symbol, timeframe, times, closes):
+        """
+        Seed EMA từ lịch sử REST.
+        closes[:-1] là các candle đã đóng, closes[-1] là candle đang hình thành (chưa commit).
+        """
+        if not closes or len(closes) <= self.period:
+            return None
+
+        committed, live, live_time = closes[:-1], closes[-1], times[-1]
+        row = self.index.get(symbol)
+        if row is not None and self.candle_time[timeframe][row] > live_time:
+            # Kline stream đã sang candle mới hơn → candle cuối của REST đã đóng
+            if not np.isnan(self.live[timeframe][row]):
+                committed, live, live_time = closes, self.live[timeframe][row], self.candle_time[timeframe][row]
+
+        ema = calculate_ema(committed, self.period)
+        if ema is None:
+            return None
+
+        row = self.row(symbol)
+        tail = np.asarray(committed[-self.period:], dtype=np.float64)
+        # Đặt tail vào ring sao cho candle mới nhất nằm ở vị trí (count - 1) % period
+        self.closes[timeframe][row] = np.roll(tail, len(committed) % self.period)
+        self.count[timeframe][row] = len(committed)
+        self.ema[timeframe][row] = ema
+        self.live[timeframe][row] = live
+        self.candle_time[timeframe][row] = live_time
+        return ema
+
+    def commit(self, row, timeframe, close):
+        """Commit 1 candle đã đóng vào ring buffer + EMA - O(1): chỉ 1 phép nhân-cộng"""
+        count = self.count[timeframe][row]
+        self.closes[timeframe][row, count % self.period] = close
+        self.count[timeframe][row] = count + 1
+
+        ema = self.ema[timeframe][row]
+        if np.isnan(ema):
+            # Chưa seed từ REST: đủ period candle thì khởi tạo bằng SMA (giống calculate_ema)
+            if count + 1 >= self.period:
+                self.ema[timeframe][row] = self.closes[timeframe][row].mean()
+            return
+
+        self.ema[timeframe][row] = close * EMA_K + ema * (1 - EMA_K)
+
+    def update(self, symbol, timeframe, close, candle_time):
+        """
+        Update candle đang hình thành từ kline stream.
+        Khi xuất hiện candle mới (timestamp lớn hơn) → candle trước đã đóng → commit vào EMA.
+        """
+        row = self.row(symbol)
+        last_time = self.candle_time[timeframe][row]
+
+        if candle_time > last_time:
+            live = self.live[timeframe][row]
+            if last_time and not np.isnan(live):
+                self.commit(row, timeframe, live)
+            self.candle_time[timeframe][row] = candle_time
+            self.live[timeframe][row] = close
+        elif candle_time == last_time:
+            self.live[timeframe][row] = close
+
+    def remove(self, symbol):
+        """Xoá symbol (delist): dời row cuối vào chỗ trống để mảng luôn liên tục"""
+        row = self.index.pop(symbol, None)
+        if row is None:
+            return False
+        last = len(self.symbols) - 1
+
+        per_tf = (
+            (self.closes, np.nan), (self.count, 0), (self.ema, np.nan),
+            (self.live, np.nan), (self.candle_time, 0), (self.ema_alerted, -np.inf),
+        )
+        shared = ((self.price, np.nan), (self.price_dirty, False), (self.price_time, -np.inf))
+        arrays = [(arrs[tf], fill) for arrs, fill in per_tf for tf in self.timeframes] + list(shared)
+
+        for arr, fill in arrays:
+            if row != last:
+                arr[row] = arr[last]
+            arr[last] = fill
+
+        for cached in self.cache_time.values():
+            cached.pop(symbol, None)
+        moved = self.symbols.pop()
+        if row != last:
+            self.symbols[row] = moved
+            self.index[moved] = row
+        return True
+
+    def extend(self, symbol, timeframe, times, closes):
+        """Nối thêm các candle (theo thứ tự thời gian) - dùng để lấp khoảng trống sau khi load cache"""
+        if not closes:
+            return False
+        for candle_time, close in zip(times, closes):
+            self.update(symbol, timeframe, float(close), int(candle_time))
+        return True
+
+    def fill_gap(self, symbol, timeframe, cached_time, times, closes):
+        """
+        Lấp khoảng trống sau khi load cache bằng các candle REST từ cached_time.
+        False nếu kline stream đã sang candle mới hơn cached_time: close (chưa chốt) của cache
+        đã bị commit vào EMA và các candle ở giữa bị bỏ qua → phải seed lại toàn bộ
+        """
+        row = self.index.get(symbol)
+        if row is None or self.candle_time[timeframe][row] != cached_time:
+            return False
+        return self.extend(symbol, timeframe, times, closes)
+
+    def export_timeframe(self, timeframe):
+        """Copy dữ liệu 1 timeframe (để ghi cache ngoài event loop)"""
+        n = len(self.symbols)
+        return {
+            "period": np.int64(self.period),
+            "symbols": np.array(self.symbols, dtype=str),
+            "closes": self.closes[timeframe][:n].copy(),
+            "count": self.count[timeframe][:n].copy(),
+            "ema": self.ema[timeframe][:n].copy(),
+            "live": self.live[timeframe][:n].copy(),
+            "candle_time": self.candle_time[timeframe][:n].copy(),
+        }
+
+    def import_timeframe(self, timeframe, data, symbols=None):
+        """
+        Nạp dữ liệu cache 1 timeframe, chỉ ghi đè row chưa có EMA từ nguồn mới hơn.
+        symbols: chỉ nạp coin thuộc tập này (universe hiện tại) - None = nạp tất cả
+        """
+        if int(data["period"]) != self.period:
+            return 0
+        loaded = 0
+        for i, symbol in enumerate(data["symbols"].tolist()):
+            if symbols is not None and symbol not in symbols:
+                continue
+            if np.isnan(data["ema"][i]):
+                continue
+            row = self.row(symbol)
+            if self.candle_time[timeframe][row] >= data["candle_time"][i]:
+                continue
+            self.closes[timeframe][row] = data["closes"][i]
+            self.count[timeframe][row] = data["count"][i]
+            self.ema[timeframe][row] = data["ema"][i]
+            self.live[timeframe][row] = data["live"][i]
+            self.candle_time[timeframe][row] = data["candle_time"][i]
+            self.cache_time[timeframe][symbol] = int(data["candle_time"][i])
+            loaded += 1
+        return loaded
+
+    def get_ema(self, symbol, timeframe):
+        """EMA đã commit của 1 symbol, None nếu chưa có"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        ema = self.ema[timeframe][row]
+        return None if np.isnan(ema) else float(ema)
+
+    def get_live_ema(self, symbol, timeframe, price=None):
+        """
+        EMA tạm tính có cả candle đang hình thành (không commit).
+        price: giá dùng cho candle đang chạy, mặc định là close mới nhất từ kline stream
+        """
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        ema = self.ema[timeframe][row]
+        if np.isnan(ema):
+            return None
+
+        if price is None:
+            price = self.live[timeframe][row]
+            if np.isnan(price):
+                return float(ema)
+
+        return float(price * EMA_K + ema * (1 - EMA_K))
+
+    def set_price(self, symbol, price, dirty=True):
+        """Ghi giá ticker mới nhất (chỉ cho symbol đã có trong store)"""
+        row = self.index.get(symbol)
+        if row is not None:
+            self.price[row] = price
+            self.price_dirty[row] |= dirty
+            self.price_time[row] = time.monotonic()
+
+    def set_prices(self, symbols, prices, valid, dirty):
+        """Ghi giá cho cả 1 frame ticker (mảng theo thứ tự symbols) - bỏ qua symbol chưa có trong store"""
+        index = self.index
+        pos = [i for i, sym in enumerate(symbols) if sym in index]
+        if not pos:
+            return
+        rows = np.fromiter((index[symbols[i]] for i in pos), dtype=np.intp, count=len(pos))
+        pos = np.asarray(pos, dtype=np.intp)
+        keep = valid[pos]
+        rows, pos = rows[keep], pos[keep]
+        self.price[rows] = prices[pos]
+        self.price_dirty[rows] |= dirty[pos]
+        self.price_time[rows] = time.monotonic()
+
+    def ema_cooldown_ok(self, row, timeframe, now):
+        """True nếu (row, timeframe) đã qua cooldown alert EMA"""
+        return now - self.ema_alerted[timeframe][row] > EMA_ALERT_COOLDOWN
+
+    def live_ema_all(self, timeframe, prices):
+        """EMA tạm tính cho toàn bộ universe: prices là mảng giá theo row (NaN = bỏ qua)"""
+        n = len(self.symbols)
+        return prices[:n] * EMA_K + self.ema[timeframe][:n] * (1 - EMA_K)
+
+    def closes_view(self, timeframe):
+        """View read-only (zero-copy) của ring buffer - thứ tự trong row là thứ tự ring"""
+        view = self.closes[timeframe][:len(self.symbols)]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    def window(self, symbol, timeframe):
+        """Close của các candle đã đóng theo thứ tự thời gian (tối đa period)"""
+        row = self.index.get(symbol)
+        if row is None:
+            return None
+        count = int(self.count[timeframe][row])
+        ring = self.closes[timeframe][row]
+        if count < self.period:
+            return ring[:count]
+        return np.roll(ring, -(count % self.period))
+
+    def nbytes(self):
+        """Dung lượng bộ nhớ đã cấp phát (bytes) - mọi mảng theo row"""
+        total = self.price.nbytes + self.price_dirty.nbytes + self.price_time.nbytes
+        for arrays in (self.closes, self.count, self.ema, self.live, self.candle_time, self.ema_alerted):
+            total += sum(arr.nbytes for arr in arrays.values())
+        return total
+
+
+CANDLE_STORE = CandleStore(EMA_TIMEFRAMES)
+
+
+def seed_ema(symbol, timeframe, times, closes):
+    """Seed EMA cho (symbol, timeframe) từ lịch sử REST"""
+    return CANDLE_STORE.seed(symbol, timeframe, times, closes)
+
+
+def get_live_ema(symbol, timeframe, price=None):
+    """EMA tạm tính có cả candle đang hình thành"""
+    return CANDLE_STORE.get_live_ema(symbol, timeframe, price)
+
+
 def update_candle_buffer(symbol, timeframe, candle_close, candle_time):
-    """Update candle buffer và recalculate EMA khi có candle mới"""
-    global CANDLE_BUFFERS, EMA_VALUES, LAST_CANDLE_TIME
-    
-    if symbol not in CANDLE_BUFFERS:
-        CANDLE_BUFFERS[symbol] = {}
-        EMA_VALUES[symbol] = {}
-        LAST_CANDLE_TIME[symbol] = {}
-    
-    if timeframe not in CANDLE_BUFFERS[symbol]:
-        CANDLE_BUFFERS[symbol][timeframe] = deque(maxlen=EMA_PERIOD)
-        LAST_CANDLE_TIME[symbol][timeframe] = 0
-    
-    if candle_time > LAST_CANDLE_TIME[symbol][timeframe]:
-        buffer = CANDLE_BUFFERS[symbol][timeframe]
-        buffer.append(float(candle_close))
-        LAST_CANDLE_TIME[symbol][timeframe] = candle_time
-        
-        if len(buffer) >= EMA_PERIOD:
-            ema200 = calculate_ema(list(buffer), EMA_PERIOD)
-            if ema200:
-                EMA_VALUES[symbol][timeframe] = ema200
+    """Update candle buffer từ kline stream (commit EMA khi candle đóng)"""
+    if timeframe not in CANDLE_STORE.closes:
+        return
+    CANDLE_STORE.update(symbol, timeframe, float(candle_close), int(candle_time))
+
+
+# ==================== CANDLE CACHE (DISK) ====================
+
+def _cache_path(timeframe):
+    return os.path.join(CANDLE_CACHE_DIR, f"{timeframe}.npz")
+
+
+def _write_candle_cache(snapshots):
+    """Ghi file cache (chạy trong thread) - ghi file tạm rồi rename để không hỏng file khi crash"""
+    os.makedirs(CANDLE_CACHE_DIR, exist_ok=True)
+    for timeframe, data in snapshots.items():
+        path = _cache_path(timeframe)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **data)
+        os.replace(tmp, path)
+
+
+def _read_candle_cache():
+    """Đọc tất cả file cache (chạy trong thread)"""
+    snapshots = {}
+    for timeframe in EMA_TIMEFRAMES:
+        path = _cache_path(timeframe)
+        if not os.path.exists(path):
+            continue
+        try:
+            with np.load(path) as f:
+                snapshots[timeframe] = {key: f[key] for key in f.files}
+        except Exception as e:
+            print(f"⚠️ Lỗi đọc candle cache {path}: {e}")
+    return snapshots
 
 
-async def check_ema_proximity_realtime(symbol, current_price, context):
-    """Check realtime nếu giá gần chạm EMA 200"""
-    if symbol not in EMA_VALUES:
+async def save_candle_cache():
+    """Lưu CANDLE_STORE xuống đĩa - copy trên event loop, ghi file trong thread"""
+    if not len(CANDLE_STORE):
         return
-    
-    alerts, now = [], datetime.now()
-    
-    for timeframe, ema200 in EMA_VALUES[symbol].items():
-        distance_pct = ((current_price - ema200) / ema200) * 100
-        
-        if abs(distance_pct) <= EMA_PROXIMITY_THRESHOLD:
-            if symbol not in EMA200_ALERTED:
-                EMA200_ALERTED[symbol] = {}
-            
-            last_alert = EMA200_ALERTED[symbol].get(timeframe)
-            if last_alert is None or (now - last_alert).total_seconds() > 1800:
-                alerts.append((timeframe, ema200, distance_pct))
-                EMA200_ALERTED[symbol][timeframe] = now
-    
-    if alerts and (CHANNEL_ID or SUBSCRIBERS):
-        msg_parts = ["🎯 *EMA 200 ALERT*\\n"]
-        for tf, ema, dist in alerts:
-            tf_label = EMA_TIMEFRAME_LABELS.get(tf, tf)
+    snapshots = {tf: CANDLE_STORE.export_timeframe(tf) for tf in EMA_TIMEFRAMES}
+    try:
+        await asyncio.to_thread(_write_candle_cache, snapshots)
+        print(f"💾 Đã lưu candle cache: {len(CANDLE_STORE)} coin")
+    except Exception as e:
+        print(f"⚠️ Lỗi lưu candle cache: {e}")
+
+
+async def load_candle_cache():
+    """
+    Nạp candle cache khi khởi động - warm-up chỉ cần lấy phần candle còn thiếu.
+    Coin đã delist từ lần chạy trước (không còn trong ALL_SYMBOLS) bị bỏ qua
+    """
+    snapshots = await asyncio.to_thread(_read_candle_cache)
+    universe = set(ALL_SYMBOLS)
+    loaded = sum(CANDLE_STORE.import_timeframe(tf, data, universe) for tf, data in snapshots.items())
+    cached = {symbol for data in snapshots.values() for symbol in data["symbols"].tolist()}
+    if loaded:
+        print(f"💾 Đã tải candle cache: {loaded} buffers")
+    if cached - universe:
+        print(f"💾 Bỏ qua {len(cached - universe)} coin trong candle cache không còn trong universe")
+    return loaded
+
+
+async def job_save_candle_cache(context):
+    """Job lưu candle cache định kỳ"""
+    await save_candle_cache()
+
+
+def fmt_ema_alerts(items):
+    """
+    Format alert EMA 200, nhóm theo timeframe: items = [(symbol, timeframe, distance_pct), ...].
+    Returns: list block (mỗi timeframe 1 block: dòng tiêu đề + 1 dòng mỗi coin)
+    """
+    by_tf = {}
+    for symbol, tf, dist in items:
+        by_tf.setdefault(tf, []).append((symbol, dist))
+
+    blocks = []
+    for tf in sorted(by_tf, key=lambda t: EMA_TIMEFRAMES.index(t) if t in EMA_TIMEFRAMES else len(EMA_TIMEFRAMES)):
+        lines = [f"🕐 *{EMA_TIMEFRAME_LABELS.get(tf, tf)}*"]
+        for symbol, dist in by_tf[tf]:
             coin = symbol.replace("_USDT", "")
             icon = "🎯" if abs(dist) <= 0.3 else ("🟢" if dist > 0 else "🔴")
             status = "CHẠM" if abs(dist) <= 0.3 else ("trên" if dist > 0 else "dưới")
             link = f"https://www.mexc.co/futures/{symbol}"
-            msg_parts.append(f"\\n🕐 *{tf_label}*")
-            msg_parts.append(f"{icon} [{coin}]({link}) {status} EMA200 `{dist:+.2f}%`")
-        
-        msg, tasks = "\\n".join(msg_parts), []
-        if CHANNEL_ID:
-            tasks.append(context.bot.send_message(CHANNEL_ID, msg, parse_mode="Markdown", disable_web_page_preview=True))
-        for chat in SUBSCRIBERS:
-            if EMA_ALERTS_ENABLED.get(chat, True):
-                tasks.append(context.bot.send_message(chat, msg, parse_mode="Markdown", disable_web_page_preview=True))
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+            lines.append(f"{icon} [{coin}]({link}) {status} EMA200 `{dist:+.2f}%`")
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+def ema_recipients(symbol):
+    """Chat nhận alert EMA 200 của symbol (channel + subscriber đang bật EMA, trừ chat đã mute coin)"""
+    return ALERT_ROUTER.recipients("ema", symbol=symbol)
+
+
+def ema_items_per_chat(items):
+    """
+    Chia alert EMA theo chat nhận: items = [(symbol, timeframe, distance_pct), ...].
+    Returns: {chat: [item, ...]} (giữ thứ tự items, bỏ coin chat đã mute)
+    """
+    by_symbol = {}
+    for item in items:
+        by_symbol.setdefault(item[0], []).append(item)
+    per_chat = {}
+    for symbol, symbol_items in by_symbol.items():
+        for chat in ema_recipients(symbol):
+            per_chat.setdefault(chat, []).extend(symbol_items)
+    return per_chat
+
+
+async def send_ema_alerts(symbol, alerts, context):
+    """Gửi alert EMA 200 của 1 symbol: alerts = [(timeframe, ema200, distance_pct), ...]"""
+    if not alerts or not (CHANNEL_ID or SUBSCRIBERS):
+        return
+
+    # Gom vào cửa sổ coalescing → 1 tin/chat cho nhiều coin
+    if ALERT_COALESCE_WINDOW > 0:
+        ALERT_COALESCER.add_ema(context.bot, symbol, alerts)
+        return
+
+    blocks = fmt_ema_alerts([(symbol, tf, dist) for tf, ema, dist in alerts])
+    for chat in ema_recipients(symbol):
+        for msg in split_message(blocks, header="🎯 *EMA 200 ALERT*\n\n"):
+            TELEGRAM_SCHEDULER.submit(
+                context.bot, chat, msg, ALERT_PRIORITY_EMA, parse_mode="Markdown", disable_web_page_preview=True
+            )
+
+
+def scan_ema_proximity_batch(now):
+    """
+    Check EMA 200 proximity cho TẤT CẢ symbol có giá mới trong tick window - vectorized.
+    Returns: {symbol: [(timeframe, ema200, distance_pct), ...]} chỉ gồm coin trong ngưỡng và hết cooldown
+    """
+    store = CANDLE_STORE
+    n = len(store)
+    dirty = store.price_dirty[:n].copy()
+    store.price_dirty[:n] = False
+    if not dirty.any():
+        return {}
+
+    prices = store.price[:n]
+    hits = {}
+    for timeframe in EMA_TIMEFRAMES:
+        ema200 = store.live_ema_all(timeframe, prices)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            distance = (prices - ema200) / ema200 * 100
+            mask = dirty & (np.abs(distance) <= EMA_PROXIMITY_THRESHOLD)  # NaN → False
+        mask &= (now - store.ema_alerted[timeframe][:n]) > EMA_ALERT_COOLDOWN
+
+        rows = np.flatnonzero(mask)
+        if not rows.size:
+            continue
+        store.ema_alerted[timeframe][rows] = now
+        for row in rows:
+            hits.setdefault(store.symbols[row], []).append(
+                (timeframe, float(ema200[row]), float(distance[row]))
+            )
+    return hits
+
+
+async def ema_proximity_batch_loop(context):
+    """EMA_CHECK_MODE=batch: mỗi EMA_BATCH_WINDOW giây check cả universe 1 lần"""
+    print(f"🎯 EMA check mode: batch ({EMA_BATCH_WINDOW}s window)")
+    while True:
+        await asyncio.sleep(EMA_BATCH_WINDOW)
+        try:
+            hits = scan_ema_proximity_batch(time.monotonic())
+            for symbol, alerts in hits.items():
+                ALERT_QUEUE.put((send_ema_alerts, (symbol, alerts)))
+        except Exception as e:
+            print(f"❌ Error in EMA batch check: {e}")
+
 
+def cached_candle_time(symbol, timeframe):
+    """
+    Timestamp candle đang chạy lúc lưu cache của (symbol, timeframe), 0 nếu không load từ cache
+    hoặc kline stream đã sang candle mới hơn (khi đó cache không dùng được để lấp gap)
+    """
+    cached_time = CANDLE_STORE.cache_time[timeframe].get(symbol, 0)
+    row = CANDLE_STORE.index.get(symbol)
+    if not cached_time or row is None or CANDLE_STORE.candle_time[timeframe][row] != cached_time:
+        return 0
+    return cached_time
 
-async def init_candle_buffers(session):
-    """Load initial 200 candles"""
-    print("📊 Loading EMA buffers...")
-    loaded = 0
-    for tf in EMA_TIMEFRAMES:
-        print(f"  📈 {EMA_TIMEFRAME_LABELS.get(tf, tf)}...")
-        for i in range(0, len(ALL_SYMBOLS), 50):
-            for sym in ALL_SYMBOLS[i:i+50]:
-                try:
-                    closes, _, _, _ = await get_kline(session, sym, tf, limit=EMA_PERIOD)
-                    if closes and len(closes) >= EMA_PERIOD:
-                        if sym not in CANDLE_BUFFERS:
-                            CANDLE_BUFFERS[sym] = {}
-                            EMA_VALUES[sym] = {}
-                            LAST_CANDLE_TIME[sym] = {}
-                        CANDLE_BUFFERS[sym][tf] = deque(closes, maxlen=EMA_PERIOD)
-                        LAST_CANDLE_TIME[sym][tf] = 0
-                        ema = calculate_ema(list(CANDLE_BUFFERS[sym][tf]), EMA_PERIOD)
-                        if ema:
-                            EMA_VALUES[sym][tf] = ema
-                            loaded += 1
-                except:
-                    pass
-            await asyncio.sleep(0.05)
-    print(f"✅ Loaded {loaded} EMA buffers")
+
+def warmup_progress():
+    """Tiến độ warm-up EMA: dict với done/total/failed/eta (giây)"""
+    done, total = WARMUP["done"], WARMUP["total"]
+    eta = None
+    if WARMUP["running"] and done and done < total:
+        elapsed = time.monotonic() - WARMUP["started"]
+        eta = elapsed / done * (total - done)
+    return {"done": done, "total": total, "failed": WARMUP["failed"], "running": WARMUP["running"], "eta": eta}
 
 
+async def init_candle_buffers(session, symbols=None):
+    """
+    Warm-up EMA song song: WARMUP_WORKERS worker lấy kline qua REST_LIMITER và seed CANDLE_STORE.
+    - Ưu tiên coin volume lớn + timeframe ngắn trước
+    - Mỗi (symbol, timeframe) dùng được ngay khi seed xong
+    - Resumable: chạy lại sẽ bỏ qua các cặp đã seed (WARMUP_DONE)
+    symbols: chỉ warm-up các coin này (coin mới list), mặc định toàn bộ ALL_SYMBOLS
+    """
+    if symbols is None:
+        if WARMUP["running"]:
+            return
+        symbols = ALL_SYMBOLS
+    
+    # Xếp hạng coin theo volume 24h từ ticker snapshot
+    tickers = await get_all_tickers(session)
+    def volume_of(sym):
+        try:
+            return float(tickers.get(sym, {}).get("amount24", 0))
+        except (TypeError, ValueError):
+            return 0.0
+    ranked = sorted(symbols, key=volume_of, reverse=True)
+    
+    # Top 50 coin đủ mọi timeframe trước, rồi 50 coin tiếp theo...; trong nhóm: timeframe ngắn trước
+    queue = asyncio.PriorityQueue()
+    for rank, sym in enumerate(ranked):
+        for tf_index, tf in enumerate(EMA_TIMEFRAMES):
+            if (sym, tf) in WARMUP_DONE:
+                continue
+            # Từ cache và vẫn đang trong cùng candle → không thiếu gì, kline stream tự cập nhật tiếp
+            if cached_candle_time(sym, tf) >= time.time() - EMA_TIMEFRAME_SECONDS[tf]:
+                WARMUP_DONE.add((sym, tf))
+                continue
+            queue.put_nowait(((rank // 50, tf_index, rank), sym, tf, 0))
+    
+    if not WARMUP["running"]:
+        WARMUP.update(total=0, done=0, failed=0, started=time.monotonic())
+    WARMUP["total"] += queue.qsize()
+    WARMUP["running"] += 1
+    print(f"📊 Warm-up EMA: {queue.qsize()} buffers, {WARMUP_WORKERS} workers...")
+    
+    async def worker():
+        while True:
+            try:
+                priority, sym, tf, attempt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                cached_time = cached_candle_time(sym, tf)
+                full_seed = True
+                if cached_time and (time.time() - cached_time) / EMA_TIMEFRAME_SECONDS[tf] < CANDLE_CACHE_MAX_GAP:
+                    # Có cache → chỉ lấy các candle từ candle đang chạy lúc lưu cache
+                    times, closes = await get_kline_closes(session, sym, tf, start=cached_time)
+                    # Stream có thể đã sang candle mới trong lúc chờ REST → fill_gap trả False, seed lại toàn bộ
+                    seeded = bool(closes) and CANDLE_STORE.fill_gap(sym, tf, cached_time, times, closes)
+                    full_seed = closes is not None and not seeded  # closes None = lỗi mạng → thử lại sau
+                if full_seed:
+                    times, closes = await get_kline_closes(session, sym, tf)
+                    seeded = seed_ema(sym, tf, times, closes) is not None
+                if seeded:
+                    CANDLE_STORE.cache_time[tf].pop(sym, None)
+                    WARMUP_DONE.add((sym, tf))
+                    WARMUP["done"] += 1
+                elif closes is None and attempt < WARMUP_RETRY:
+                    # Lỗi mạng/429 → thử lại sau cùng
+                    queue.put_nowait(((float("inf"),) + priority[1:], sym, tf, attempt + 1))
+                else:
+                    # Coin mới list chưa đủ candle hoặc đã delist
+                    WARMUP["failed"] += 1
+            except Exception:
+                WARMUP["failed"] += 1
+    
+    async def reporter():
+        while True:
+            await asyncio.sleep(WARMUP_REPORT_INTERVAL)
+            p = warmup_progress()
+            eta = f", ETA {p['eta']:.0f}s" if p["eta"] is not None else ""
+            print(f"  📈 Warm-up {p['done']}/{p['total']} (lỗi {p['failed']}){eta}")
+    
+    report_task = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(*[worker() for _ in range(WARMUP_WORKERS)])
+    finally:
+        report_task.cancel()
+        WARMUP["running"] -= 1
+    
+    elapsed = time.monotonic() - WARMUP["started"]
+    print(f"✅ Loaded {WARMUP['done']} EMA buffers trong {elapsed:.0f}s ({WARMUP['failed']} bỏ qua)")
 
 
 def fmt_alert(symbol, old_price, new_price, change_pct):
@@ -454,6 +1843,473 @@ def fmt_alert(symbol, old_price, new_price, change_pct):
     )
 
 
+# ================== TELEGRAM DELIVERY ==================
+class OutgoingMessage:
+    """1 tin nhắn chờ gửi"""
+    __slots__ = ("bot", "chat_id", "text", "kwargs", "priority", "seq", "enqueued", "attempts")
+
+    def __init__(self, bot, chat_id, text, kwargs, priority, seq):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+
+def chat_send_interval(chat_id):
+    """Giãn cách tối thiểu giữa 2 tin cùng chat: chat riêng 1s, group/channel (id âm hoặc @name) 3s"""
+    try:
+        return TELEGRAM_CHAT_INTERVAL if int(chat_id) > 0 else TELEGRAM_GROUP_INTERVAL
+    except (TypeError, ValueError):
+        return TELEGRAM_GROUP_INTERVAL
+
+
+class TelegramScheduler:
+    """
+    Hàng đợi gửi tin Telegram trung tâm cho mọi alert.
+    - Theo độ ưu tiên: pump/dump cực mạnh → pump/dump → EMA → thông báo khác (cùng mức: FIFO)
+    - Giới hạn global qua RateLimiter (RetryAfter → giảm rate), mỗi chat giãn cách chat_send_interval
+    - RetryAfter / lỗi mạng → xếp lại vào hàng đợi của chat, tối đa TELEGRAM_MAX_RETRIES lần
+    """
+
+    def __init__(self, limiter, max_queue):
+        self.limiter = limiter
+        self.max_queue = max_queue
+        self.pending = {}  # chat_id → heap [(priority, seq, OutgoingMessage)]
+        self.ready = []  # heap (priority, seq, chat_id) - chat gửi được ngay (entry cũ bị bỏ qua khi pop)
+        self.waiting = []  # heap (next_time, chat_id) - chat đang chờ hết giãn cách
+        self.chat_next = {}  # chat_id → monotonic time được gửi tin tiếp theo
+        self.size = 0
+        self.seq = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+        self.latency = deque(maxlen=1000)  # Giây từ lúc xếp hàng đến lúc gửi xong
+        self._wakeup = None
+        self._task = None
+        self._sending = set()  # Task _send đang chạy (giữ reference để không bị GC giữa chừng)
+
+    def submit(self, bot, chat_id, text, priority=ALERT_PRIORITY_INFO, **kwargs):
+        """Xếp 1 tin vào hàng đợi (không chờ gửi xong)"""
+        if self.size >= self.max_queue:
+            self.dropped += 1
+            return
+        self.seq += 1
+        self._push(OutgoingMessage(bot, chat_id, text, kwargs, priority, self.seq))
+        self._ensure_running()
+
+    def _push(self, msg):
+        chat_id = msg.chat_id
+        queue = self.pending.setdefault(chat_id, [])
+        entry = (msg.priority, msg.seq, msg)
+        heapq.heappush(queue, entry)
+        self.size += 1
+        if queue[0] is entry:
+            next_time = self.chat_next.get(chat_id, 0.0)
+            if next_time <= time.monotonic():
+                heapq.heappush(self.ready, (msg.priority, msg.seq, chat_id))
+            else:
+                heapq.heappush(self.waiting, (next_time, chat_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def _promote(self, now):
+        """Chuyển chat đã hết giãn cách từ waiting sang ready"""
+        while self.waiting and self.waiting[0][0] <= now:
+            _, chat_id = heapq.heappop(self.waiting)
+            queue = self.pending.get(chat_id)
+            if not queue:
+                continue
+            next_time = self.chat_next.get(chat_id, 0.0)
+            if next_time <= now:
+                priority, seq, _ = queue[0]
+                heapq.heappush(self.ready, (priority, seq, chat_id))
+            else:
+                # chat_next bị đẩy lùi sau khi entry này được xếp (RetryAfter / lỗi mạng) → chờ tiếp, không bỏ
+                heapq.heappush(self.waiting, (next_time, chat_id))
+
+    def _pop_ready(self, now):
+        """Chat có tin ưu tiên cao nhất được gửi ngay, None nếu không có"""
+        while self.ready:
+            priority, seq, chat_id = heapq.heappop(self.ready)
+            queue = self.pending.get(chat_id)
+            if queue and queue[0][1] == seq and self.chat_next.get(chat_id, 0.0) <= now:
+                return chat_id
+        return None
+
+    async def run(self):
+        """Dispatcher: lấy tin theo ưu tiên, chờ token global, gửi không chặn vòng lặp"""
+        while True:
+            now = time.monotonic()
+            self._promote(now)
+            chat_id = self._pop_ready(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = self.waiting[0][0] - now if self.waiting else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.limiter.acquire()
+            queue = self.pending[chat_id]
+            _, _, msg = heapq.heappop(queue)
+            self.size -= 1
+            next_time = time.monotonic() + chat_send_interval(chat_id)
+            self.chat_next[chat_id] = next_time
+            if queue:
+                heapq.heappush(self.waiting, (next_time, chat_id))
+            else:
+                del self.pending[chat_id]
+            task = asyncio.create_task(self._send(msg))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, msg):
+        start = time.perf_counter()
+        try:
+            await msg.bot.send_message(msg.chat_id, msg.text, **msg.kwargs)
+            TELEGRAM_SEND_LATENCY.observe(time.perf_counter() - start)
+            self.limiter.on_success()
+            self.sent += 1
+            latency = time.monotonic() - msg.enqueued
+            self.latency.append(latency)
+            TELEGRAM_QUEUE_LATENCY.observe(latency)
+        except RetryAfter as e:
+            TELEGRAM_FAILURES.inc("retry_after")
+            wait = e.retry_after
+            wait = wait.total_seconds() if isinstance(wait, timedelta) else float(wait)
+            self.limiter.on_throttle(wait)
+            print(f"⚠️ Telegram RetryAfter {wait:.0f}s (chat {msg.chat_id})")
+            self._retry(msg, wait)
+        except BadRequest as e:
+            TELEGRAM_FAILURES.inc("bad_request")
+            self.failed += 1
+            print(f"❌ Lỗi gửi tin nhắn tới {msg.chat_id}: {e}")
+        except NetworkError as e:
+            TELEGRAM_FAILURES.inc("network")
+            print(f"⚠️ Lỗi mạng khi gửi tin nhắn tới {msg.chat_id}: {e}")
+            self._retry(msg, 2 ** msg.attempts)
+        except Exception as e:
+            TELEGRAM_FAILURES.inc("other")
+            self.failed += 1
+            print(f"❌ Lỗi gửi tin nhắn tới {msg.chat_id}: {e}")
+        finally:
+            self.limiter.release()
+
+    def _retry(self, msg, delay):
+        msg.attempts += 1
+        if msg.attempts > TELEGRAM_MAX_RETRIES:
+            self.failed += 1
+            print(f"❌ Bỏ tin nhắn tới {msg.chat_id} sau {TELEGRAM_MAX_RETRIES} lần thử")
+            return
+        self.retried += 1
+        self.chat_next[msg.chat_id] = max(self.chat_next.get(msg.chat_id, 0.0), time.monotonic() + delay)
+        self._push(msg)
+
+    def stats(self):
+        latency = sorted(self.latency)
+        return {
+            "queue_depth": self.size,
+            "chats_pending": len(self.pending),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "rate": self.limiter.rate,
+            "latency_p50": latency[len(latency) // 2] if latency else None,
+            "latency_p99": latency[int(len(latency) * 0.99)] if latency else None,
+        }
+
+
+TELEGRAM_LIMITER = RateLimiter(TELEGRAM_GLOBAL_RATE, TELEGRAM_RATE_MIN, TELEGRAM_GLOBAL_RATE, TELEGRAM_MAX_CONCURRENCY)
+TELEGRAM_SCHEDULER = TelegramScheduler(TELEGRAM_LIMITER, TELEGRAM_QUEUE_MAX)
+
+
+def telegram_len(text):
+    """Độ dài theo cách Telegram đếm (UTF-16 code unit - emoji tính 2)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def telegram_truncate(text, limit):
+    """Cắt text còn ≤ limit UTF-16 code unit (không cắt đôi emoji / surrogate pair)"""
+    if telegram_len(text) <= limit:
+        return text
+    return text.encode("utf-16-le")[:max(limit, 0) * 2].decode("utf-16-le", errors="ignore")
+
+
+def split_message(blocks, header="", sep="\n\n", limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Ghép các block thành ít tin nhắn nhất, mỗi tin ≤ limit (không cắt ngang block;
+    block quá dài thì cắt theo dòng). header được lặp lại ở đầu mỗi tin
+    """
+    pieces = []
+    for block in blocks:
+        if telegram_len(header) + telegram_len(block) <= limit:
+            pieces.append(block)
+            continue
+        part = ""
+        for line in block.split("\n"):
+            candidate = f"{part}\n{line}" if part else line
+            if part and telegram_len(header) + telegram_len(candidate) > limit:
+                pieces.append(part)
+                candidate = line
+            part = telegram_truncate(candidate, limit - telegram_len(header))
+        if part:
+            pieces.append(part)
+
+    messages, current = [], ""
+    for piece in pieces:
+        candidate = f"{current}{sep}{piece}" if current else piece
+        if current and telegram_len(header) + telegram_len(candidate) > limit:
+            messages.append(header + current)
+            candidate = piece
+        current = candidate
+    if current:
+        messages.append(header + current)
+    return messages
+
+
+class AlertCoalescer:
+    """
+    Gom alert pump/dump + EMA 200 trong ALERT_COALESCE_WINDOW giây rồi gửi 1 tin gộp cho mỗi chat
+    (lọc theo ALERT_MODE / MUTED_COINS / toggle của từng chat, tự tách tin > 4096 ký tự)
+    """
+
+    def __init__(self, window, auto_flush=True):
+        self.window = window
+        self.auto_flush = auto_flush  # False: caller tự gọi flush() (replay theo đồng hồ ảo)
+        self.pumps = {}  # symbol → (base_price, current_price, price_change) - giữ alert mới nhất trong cửa sổ
+        self.emas = {}  # (symbol, timeframe) → distance_pct
+        self.bot = None
+        self.flushes = 0
+        self.alerts = 0  # Số alert đã gom
+        self.messages = 0  # Số tin đã xếp hàng gửi
+        self._task = None
+
+    def add_pump(self, bot, symbol, base_price, current_price, price_change):
+        self.pumps.pop(symbol, None)
+        self.pumps[symbol] = (base_price, current_price, price_change)
+        self._schedule(bot)
+
+    def add_ema(self, bot, symbol, alerts):
+        for tf, ema, dist in alerts:
+            self.emas[(symbol, tf)] = dist
+        self._schedule(bot)
+
+    def _schedule(self, bot):
+        self.bot = bot
+        self.alerts += 1
+        if self.auto_flush and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self.flush()
+
+    def flush(self):
+        """Render + xếp hàng tin gộp cho từng chat"""
+        pumps, emas = self.pumps, self.emas
+        self.pumps, self.emas = {}, {}
+        if not pumps and not emas:
+            return
+        self.flushes += 1
+
+        # Chat → symbol pump/dump được nhận (giữ thứ tự |%| giảm dần) + alert EMA được nhận
+        ranked = sorted(pumps.items(), key=lambda kv: -abs(kv[1][2]))
+        per_chat = {}
+        for symbol, (base_price, current_price, price_change) in ranked:
+            for chat in pump_dump_recipients(symbol, abs(price_change)):
+                per_chat.setdefault(chat, ([], []))[0].append(symbol)
+        ema_items = [(symbol, tf, dist) for (symbol, tf), dist in emas.items()]
+        for chat, items in ema_items_per_chat(ema_items).items():
+            per_chat.setdefault(chat, ([], []))[1].extend(items)
+
+        # Render 1 lần cho mỗi alert, dùng lại cho mọi chat
+        pump_text = {
+            symbol: fmt_alert(symbol, base_price, current_price, price_change)
+            for symbol, (base_price, current_price, price_change) in ranked
+        }
+        rendered = {}  # (tuple symbols, tuple alert EMA) → [tin nhắn] - chat cùng bộ alert dùng chung
+
+        for chat, (symbols, chat_emas) in per_chat.items():
+            key = (tuple(symbols), tuple(chat_emas))
+            if key not in rendered:
+                rendered[key] = self._render([pump_text[s] for s in symbols], fmt_ema_alerts(chat_emas))
+            priority = ALERT_PRIORITY_EMA
+            if symbols:
+                top = abs(pumps[symbols[0]][2])
+                priority = ALERT_PRIORITY_EXTREME if top >= EXTREME_THRESHOLD else ALERT_PRIORITY_PUMP
+            for msg in rendered[key]:
+                TELEGRAM_SCHEDULER.submit(
+                    self.bot, chat, msg, priority, parse_mode="Markdown", disable_web_page_preview=True
+                )
+                self.messages += 1
+
+    @staticmethod
+    def _render(pump_blocks, ema_blocks):
+        messages = []
+        if pump_blocks:
+            header = f"📊 *{len(pump_blocks)} COIN BIẾN ĐỘNG*\n\n" if len(pump_blocks) > 1 else ""
+            messages += split_message(pump_blocks, header=header)
+        if ema_blocks:
+            messages += split_message(ema_blocks, header="🎯 *EMA 200 ALERT*\n\n")
+        return messages
+
+    def stats(self):
+        return {
+            "pending": len(self.pumps) + len(self.emas),
+            "alerts": self.alerts,
+            "flushes": self.flushes,
+            "messages": self.messages,
+        }
+
+
+ALERT_COALESCER = AlertCoalescer(ALERT_COALESCE_WINDOW)
+
+
+# ================== PROFILING ==================
+class SamplingProfiler:
+    """
+    CPU profiler lấy mẫu bằng SIGPROF: mỗi PROFILE_INTERVAL giây CPU, handler ghi lại stack của thread chính
+    (event loop) → thấy được mọi task asyncio (websocket, detection, job, handler) mà không cần sửa code.
+    Đo theo CPU time nên lúc event loop ngồi chờ I/O không có mẫu. Chỉ chạy trên Unix, gọi từ thread chính
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}  # tuple code object (gốc → lá) → số mẫu
+        self.samples = 0
+        self._previous_handler = None
+
+    def _handler(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack.reverse()
+        key = tuple(stack)
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._handler)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+
+    @staticmethod
+    def label(code):
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    @staticmethod
+    def task_start(stack):
+        """Vị trí coroutine/callback gốc mà event loop đang chạy (frame ngay sau Handle._run)"""
+        for i, code in enumerate(stack[:-1]):
+            if code.co_name == "_run" and code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+                return i + 1
+        return 0
+
+    def summary(self, top=10):
+        """(self time, inclusive time, theo task) → [(label, số mẫu)] giảm dần"""
+        own, inclusive, tasks = defaultdict(int), defaultdict(int), defaultdict(int)
+        for stack, count in self.stacks.items():
+            task_stack = stack[self.task_start(stack):]  # Bỏ các frame của event loop / runner
+            own[stack[-1]] += count
+            for code in set(task_stack):
+                inclusive[code] += count
+            tasks[task_stack[0]] += count
+
+        def ranked(counter):
+            items = sorted(counter.items(), key=lambda kv: -kv[1])[:top]
+            return [(self.label(code), count) for code, count in items]
+        return ranked(own), ranked(inclusive), ranked(tasks)
+
+    def dump_folded(self, path):
+        """Ghi dạng folded stack ("a;b;c count") - mở bằng speedscope / flamegraph.pl"""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.items():
+                f.write(";".join(self.label(code) for code in stack) + f" {count}\n")
+
+
+PROFILER_RUNNING = None  # SamplingProfiler đang chạy (1 profile tại 1 thời điểm)
+MEMORY_SNAPSHOT = None  # Snapshot tracemalloc lần trước (để so sánh)
+
+
+def profile_path(kind, ext):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{ext}")
+
+
+async def run_profile(profiler, seconds, bot, chat_id):
+    """Profile CPU trong N giây rồi gửi tóm tắt vào chat + ghi file folded stack"""
+    global PROFILER_RUNNING
+    try:
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        path = profile_path("profile", "folded")
+        await asyncio.to_thread(profiler.dump_folded, path)
+        own, inclusive, tasks = profiler.summary()
+    except Exception as e:
+        print(f"❌ Lỗi profile: {e}")
+        msg = f"❌ Lỗi profile: {e}"
+    else:
+        samples = profiler.samples
+
+        def pct(count):
+            return 100 * count / samples if samples else 0.0
+        lines = [
+            f"⏱️ PROFILE {seconds}s: {samples} mẫu, CPU ~{100 * samples * profiler.interval / seconds:.0f}%",
+            "",
+            "Theo task:",
+            *[f"{pct(c):5.1f}%  {name}" for name, c in tasks],
+            "",
+            "Self time:",
+            *[f"{pct(c):5.1f}%  {name}" for name, c in own],
+            "",
+            "Inclusive:",
+            *[f"{pct(c):5.1f}%  {name}" for name, c in inclusive],
+        ]
+        msg = "```\n" + "\n".join(lines)[:TELEGRAM_MESSAGE_LIMIT - 80] + "\n```\n" + f"💾 `{path}`"
+        print(f"⏱️ Đã ghi profile: {path}")
+    finally:
+        PROFILER_RUNNING = None
+    try:
+        await bot.send_message(chat_id, msg, parse_mode="Markdown")
+    except Exception as e:
+        print(f"⚠️ Không gửi được kết quả profile: {e}")
+
+
+def take_memory_snapshot(top=10):
+    """Snapshot tracemalloc → (top theo dòng code, thay đổi so với lần trước, đường dẫn file dump)"""
+    global MEMORY_SNAPSHOT
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    path = profile_path("memory", "tracemalloc")
+    snapshot.dump(path)
+    stats = snapshot.statistics("lineno")[:top]
+    diff = snapshot.compare_to(MEMORY_SNAPSHOT, "lineno")[:top] if MEMORY_SNAPSHOT else []
+    MEMORY_SNAPSHOT = snapshot
+    return stats, diff, path
+
+
 # ================== ADMIN CHECK ==================
 def admin_only(func):
     """Decorator để giới hạn command chỉ cho admin"""
@@ -488,6 +2344,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     SUBSCRIBERS.add(chat_id)
     if chat_id not in ALERT_MODE:
         ALERT_MODE[chat_id] = 1  # Mặc định: tất cả
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)
 
     current_mode = ALERT_MODE.get(chat_id, 1)
     if current_mode == 1:
@@ -531,7 +2389,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def subscribe(update, context):
     SUBSCRIBERS.add(update.effective_chat.id)
-    save_data()  # Lưu ngay sau khi subscribe
+    ALERT_ROUTER.update_chat(update.effective_chat.id)
+    DATA_STORE.save_chat(update.effective_chat.id)  # Lưu ngay sau khi subscribe
     if getattr(update, "effective_message", None):
         await update.effective_message.reply_text("Đã bật báo!")
     else:
@@ -540,7 +2399,8 @@ async def subscribe(update, context):
 
 async def unsubscribe(update, context):
     SUBSCRIBERS.discard(update.effective_chat.id)
-    save_data()  # Lưu sau khi unsubscribe
+    ALERT_ROUTER.update_chat(update.effective_chat.id)
+    DATA_STORE.save_chat(update.effective_chat.id)  # Lưu sau khi unsubscribe
     if getattr(update, "effective_message", None):
         await update.effective_message.reply_text("Đã tắt báo!")
     else:
@@ -550,7 +2410,8 @@ async def unsubscribe(update, context):
 async def mode1(update, context):
     chat_id = update.effective_chat.id
     ALERT_MODE[chat_id] = 1
-    save_data()  # Lưu sau khi đổi mode
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)  # Lưu sau khi đổi mode
     text = (
         "✅ Đã chuyển sang Mode 1\n\n"
         "📊 Báo TẤT CẢ biến động:\n"
@@ -566,7 +2427,8 @@ async def mode1(update, context):
 async def mode2(update, context):
     chat_id = update.effective_chat.id
     ALERT_MODE[chat_id] = 2
-    save_data()  # Lưu sau khi đổi mode
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)  # Lưu sau khi đổi mode
     text = (
         "✅ Đã chuyển sang Mode 2\n\n"
         "📊 CHỊ báo biến động trung bình:\n"
@@ -581,7 +2443,8 @@ async def mode2(update, context):
 async def mode3(update, context):
     chat_id = update.effective_chat.id
     ALERT_MODE[chat_id] = 3
-    save_data()  # Lưu sau khi đổi mode
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)  # Lưu sau khi đổi mode
     text = (
         "✅ Đã chuyển sang Mode 3\n\n"
         "📊 CHỊ báo biến động CỰC MẠNH:\n"
@@ -613,7 +2476,8 @@ async def mute_coin(update, context):
         MUTED_COINS[chat_id] = set()
     
     MUTED_COINS[chat_id].add(symbol)
-    save_data()  # Lưu sau khi mute
+    ALERT_ROUTER.mute(chat_id, symbol)
+    DATA_STORE.save_mute(chat_id, symbol, True)  # Lưu sau khi mute
     if getattr(update, "effective_message", None):
         await update.effective_message.reply_text(f"🔇 Đã tắt thông báo cho `{coin}`", parse_mode="Markdown")
     else:
@@ -642,7 +2506,8 @@ async def unmute_coin(update, context):
     
     if chat_id in MUTED_COINS and symbol in MUTED_COINS[chat_id]:
         MUTED_COINS[chat_id].remove(symbol)
-        save_data()  # Lưu sau khi unmute
+        ALERT_ROUTER.unmute(chat_id, symbol)
+        DATA_STORE.save_mute(chat_id, symbol, False)  # Lưu sau khi unmute
         if getattr(update, "effective_message", None):
             await update.effective_message.reply_text(f"🔔 Đã bật lại thông báo cho `{coin}`", parse_mode="Markdown")
         else:
@@ -671,69 +2536,69 @@ async def ema200(update, context):
             print("⏳ EMA200 requested (no message object)")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            # Detect coins near EMA 200
-            results = await detect_ema200_proximity(session, ALL_SYMBOLS)
+        session = get_http_session()
+        # Detect coins near EMA 200
+        results = await detect_ema200_proximity(session, ALL_SYMBOLS)
+        
+        # Format message
+        msg_parts = ["📊 *COINS GẦN CHẠM EMA 200*\n"]
+        total_count = 0
+        
+        for timeframe in EMA_TIMEFRAMES:
+            coins = results[timeframe]
+            if not coins:
+                continue
             
-            # Format message
-            msg_parts = ["📊 *COINS GẦN CHẠM EMA 200*\n"]
-            total_count = 0
+            tf_label = EMA_TIMEFRAME_LABELS[timeframe]
+            msg_parts.append(f"\n🕐 *{tf_label}*")
             
-            for timeframe in EMA_TIMEFRAMES:
-                coins = results[timeframe]
-                if not coins:
-                    continue
+            # Hiển thị tối đa 10 coins gần nhất mỗi timeframe
+            for symbol, ema200, current_price, distance in coins[:10]:
+                coin_name = symbol.replace("_USDT", "")
                 
-                tf_label = EMA_TIMEFRAME_LABELS[timeframe]
-                msg_parts.append(f"\n🕐 *{tf_label}*")
-                
-                # Hiển thị tối đa 10 coins gần nhất mỗi timeframe
-                for symbol, ema200, current_price, distance in coins[:10]:
-                    coin_name = symbol.replace("_USDT", "")
-                    
-                    # Icon dựa trên vị trí
-                    if abs(distance) <= 0.3:
-                        icon = "🎯"  # Đang chạm
-                        status = "CHẠM"
-                    elif distance > 0:
-                        icon = "🟢"  # Trên EMA
-                        status = "trên"
-                    else:
-                        icon = "🔴"  # Dưới EMA
-                        status = "dưới"
-                    
-                    link = f"https://www.mexc.co/futures/{symbol}"
-                    msg_parts.append(
-                        f"{icon} [{coin_name}]({link}) "
-                        f"`{distance:+.2f}%` {status} EMA200"
-                    )
-                    total_count += 1
+                # Icon dựa trên vị trí
+                if abs(distance) <= 0.3:
+                    icon = "🎯"  # Đang chạm
+                    status = "CHẠM"
+                elif distance > 0:
+                    icon = "🟢"  # Trên EMA
+                    status = "trên"
+                else:
+                    icon = "🔴"  # Dưới EMA
+                    status = "dưới"
                 
-                if len(coins) > 10:
-                    msg_parts.append(f"_...và {len(coins) - 10} coin khác_")
-            
-            if total_count == 0:
-                msg = "ℹ️ Không có coin nào gần EMA 200 trong vùng ±1.5%"
-            else:
-                msg_parts.append(f"\n_Tổng: {total_count} coins (hiển thị top 10/timeframe)_")
-                msg = "\n".join(msg_parts)
+                link = f"https://www.mexc.co/futures/{symbol}"
+                msg_parts.append(
+                    f"{icon} [{coin_name}]({link}) "
+                    f"`{distance:+.2f}%` {status} EMA200"
+                )
+                total_count += 1
             
-            if getattr(update, "effective_message", None):
-                await update.effective_message.reply_text(
-                    msg, 
+            if len(coins) > 10:
+                msg_parts.append(f"_...và {len(coins) - 10} coin khác_")
+        
+        if total_count == 0:
+            msg = "ℹ️ Không có coin nào gần EMA 200 trong vùng ±1.5%"
+        else:
+            msg_parts.append(f"\n_Tổng: {total_count} coins (hiển thị top 10/timeframe)_")
+            msg = "\n".join(msg_parts)
+        
+        if getattr(update, "effective_message", None):
+            await update.effective_message.reply_text(
+                msg, 
+                parse_mode="Markdown",
+                disable_web_page_preview=True
+            )
+        else:
+            try:
+                await context.bot.send_message(
+                    update.effective_chat.id, 
+                    msg,
                     parse_mode="Markdown",
                     disable_web_page_preview=True
                 )
-            else:
-                try:
-                    await context.bot.send_message(
-                        update.effective_chat.id, 
-                        msg,
-                        parse_mode="Markdown",
-                        disable_web_page_preview=True
-                    )
-                except Exception:
-                    print("📊 Không thể gửi kết quả EMA200")
+            except Exception:
+                print("📊 Không thể gửi kết quả EMA200")
     
     except Exception as e:
         print(f"❌ Lỗi EMA200 scan: {e}")
@@ -751,7 +2616,8 @@ async def pumpdump_on(update, context):
     """Bật thông báo pump/dump"""
     chat_id = update.effective_chat.id
     PUMPDUMP_ALERTS_ENABLED[chat_id] = True
-    save_data()
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)
     
     msg = "✅ Đã BẬT thông báo Pump/Dump"
     if getattr(update, "effective_message", None):
@@ -767,7 +2633,8 @@ async def pumpdump_off(update, context):
     """Tắt thông báo pump/dump"""
     chat_id = update.effective_chat.id
     PUMPDUMP_ALERTS_ENABLED[chat_id] = False
-    save_data()
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)
     
     msg = "🔕 Đã TẮT thông báo Pump/Dump"
     if getattr(update, "effective_message", None):
@@ -783,7 +2650,8 @@ async def ema_on(update, context):
     """Bật thông báo EMA 200"""
     chat_id = update.effective_chat.id
     EMA_ALERTS_ENABLED[chat_id] = True
-    save_data()
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)
     
     msg = "✅ Đã BẬT thông báo EMA 200"
     if getattr(update, "effective_message", None):
@@ -799,7 +2667,8 @@ async def ema_off(update, context):
     """Tắt thông báo EMA 200"""
     chat_id = update.effective_chat.id
     EMA_ALERTS_ENABLED[chat_id] = False
-    save_data()
+    ALERT_ROUTER.update_chat(chat_id)
+    DATA_STORE.save_chat(chat_id)
     
     msg = "🔕 Đã TẮT thông báo EMA 200"
     if getattr(update, "effective_message", None):
@@ -814,35 +2683,563 @@ async def ema_off(update, context):
 
 
 
-async def mutelist(update, context):
-    chat_id = update.effective_chat.id
+async def mutelist(update, context):
+    chat_id = update.effective_chat.id
+    
+    if chat_id not in MUTED_COINS or not MUTED_COINS[chat_id]:
+        if getattr(update, "effective_message", None):
+            await update.effective_message.reply_text("ℹ️ Chưa có coin nào bị mute")
+        else:
+            try:
+                await context.bot.send_message(chat_id, "ℹ️ Chưa có coin nào bị mute")
+            except Exception:
+                print("ℹ️ Không có coin mute (không thể gửi message)")
+        return
+    
+    coins = [sym.replace("_USDT", "") for sym in MUTED_COINS[chat_id]]
+    msg = "🔇 *DANH SÁCH COIN ĐÃ MUTE*\n\n"
+    msg += "\n".join([f"• `{coin}`" for coin in sorted(coins)])
+    msg += f"\n\n_Tổng: {len(coins)} coin_"
+    
+    if getattr(update, "effective_message", None):
+        await update.effective_message.reply_text(msg, parse_mode="Markdown")
+    else:
+        try:
+            await context.bot.send_message(chat_id, msg, parse_mode="Markdown")
+        except Exception:
+            print("ℹ️ Không thể gửi danh sách mute (no message object)")
+
+
+@admin_only
+async def status(update, context):
+    """Trạng thái nội bộ của bot (admin)"""
+    limiter = REST_LIMITER.stats()
+    warmup = warmup_progress()
+    eta = f", ETA `{warmup['eta']:.0f}s`" if warmup["eta"] is not None else ""
+    lines = [
+        "🩺 *TRẠNG THÁI BOT*\n",
+        f"🌐 REST: `{limiter['rate']:.1f}` req/s, hàng chờ `{limiter['queue_depth']}`, "
+        f"đang chạy `{limiter['in_flight']}`, 429: `{limiter['throttled']}`",
+        f"📊 Warm-up EMA: `{warmup['done']}/{warmup['total']}` "
+        f"({'đang chạy' if warmup['running'] else 'xong'}, lỗi `{warmup['failed']}`){eta}",
+    ]
+    ticks, alerts, tg = TICK_QUEUE.stats(), ALERT_QUEUE.stats(), TELEGRAM_SCHEDULER.stats()
+    lines.append(
+        f"📥 Tick queue: `{ticks['depth']}` chờ, gom `{ticks['coalesced']}`, drop `{ticks['dropped']}`"
+    )
+    lines.append(
+        f"📤 Alert queue: `{alerts['depth']}` chờ, đã gửi `{alerts['sent']}`, drop `{alerts['dropped']}`"
+    )
+    routes = ALERT_ROUTER.stats()
+    lines.append(
+        f"🧭 Routing: pump `{routes['pump']['moderate']}/{routes['pump']['strong']}/{routes['pump']['extreme']}` chat "
+        f"(3-5%/5-10%/≥10%), EMA `{routes['ema']}` chat, mute `{routes['muted_symbols']}` coin"
+    )
+    db = DATA_STORE.stats()
+    lines.append(f"💾 SQLite: `{db['commits']}` commit, `{db['rows']}` thay đổi, chờ ghi `{db['pending']}`")
+    co = ALERT_COALESCER.stats()
+    lines.append(
+        f"🧺 Gom alert ({ALERT_COALESCE_WINDOW:g}s): `{co['alerts']}` alert → `{co['messages']}` tin "
+        f"trong `{co['flushes']}` lần, đang chờ `{co['pending']}`"
+    )
+    latency = (
+        f", latency p50 `{tg['latency_p50']:.1f}s` p99 `{tg['latency_p99']:.1f}s`"
+        if tg["latency_p50"] is not None else ""
+    )
+    lines.append(
+        f"✉️ Telegram: `{tg['queue_depth']}` chờ ({tg['chats_pending']} chat), `{tg['rate']:.0f}` tin/s, "
+        f"gửi `{tg['sent']}`, thử lại `{tg['retried']}`, lỗi `{tg['failed']}`, drop `{tg['dropped']}`{latency}"
+    )
+    now = time.monotonic()
+    for shard in WS_SHARD_LIST:
+        st = shard.stats(now)
+        icon = "🟢" if st["connected"] and (st["idle"] or 0) < WS_STALE_TIMEOUT else "🔴"
+        idle = f"{st['idle']:.0f}s" if st["idle"] is not None else "-"
+        lines.append(
+            f"{icon} Shard {st['shard']}: `{st['symbols']}` coin, `{st['rate']:.0f}` msg/s, "
+            f"lag `{st['lag']:.2f}s`, idle `{idle}`, reconnect `{st['reconnects']}`"
+        )
+    if WS_TICKER_MODE == "all":
+        age = TICKER_STREAM.age(now)
+        icon = "🟢" if age is not None and age < WS_TICKERS_STALE_TIMEOUT else "🔴"
+        shard = TICKER_STREAM.shard if TICKER_STREAM.shard is not None else "-"
+        last = f"{age:.0f}s" if age is not None else "-"
+        lines.append(
+            f"{icon} push.tickers: shard `{shard}`, frame gần nhất `{last}` trước, "
+            f"chuyển shard `{TICKER_STREAM.moves}` lần"
+        )
+    msg = "\n".join(lines)
+    
+    if getattr(update, "effective_message", None):
+        await update.effective_message.reply_text(msg, parse_mode="Markdown")
+    else:
+        try:
+            await context.bot.send_message(update.effective_chat.id, msg, parse_mode="Markdown")
+        except Exception:
+            print(msg)
+
+@admin_only
+async def profile(update, context):
+    """CPU profile N giây (mặc định 30) - kết quả gửi vào chat khi xong"""
+    global PROFILER_RUNNING
+    chat_id = update.effective_chat.id
+    try:
+        seconds = int(context.args[0]) if context.args else 30
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        msg = f"❌ Số giây không hợp lệ (1-{PROFILE_MAX_SECONDS})\n\nVí dụ: /profile 30"
+    elif not hasattr(signal, "setitimer"):
+        msg = "❌ Profiler cần Unix (SIGPROF)"
+    elif PROFILER_RUNNING is not None:
+        msg = "ℹ️ Đang có 1 profile chạy, đợi xong rồi thử lại"
+    else:
+        # Chạy nền để handler trả lời ngay, kết quả gửi sau N giây
+        PROFILER_RUNNING = SamplingProfiler()
+        asyncio.create_task(run_profile(PROFILER_RUNNING, seconds, context.bot, chat_id))
+        msg = f"⏱️ Đang profile CPU {seconds}s..."
+    if getattr(update, "effective_message", None):
+        await update.effective_message.reply_text(msg)
+    else:
+        print(msg)
+
+
+@admin_only
+async def memsnap(update, context):
+    """Top allocation theo tracemalloc (/memsnap off để tắt tracing)"""
+    global MEMORY_SNAPSHOT
+    if context.args and context.args[0].lower() == "off":
+        tracemalloc.stop()
+        MEMORY_SNAPSHOT = None
+        msg = "🔕 Đã tắt tracemalloc"
+    elif not tracemalloc.is_tracing():
+        # Chỉ allocation SAU khi bật mới được theo dõi (tracing làm chậm bot, nhớ /memsnap off)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        msg = "✅ Đã bật tracemalloc - gọi lại /memsnap sau vài phút để xem allocation"
+    else:
+        stats, diff, path = await asyncio.to_thread(take_memory_snapshot)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"🧠 TRACEMALLOC: hiện tại {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB", "", "Top allocation:"]
+        for stat in stats:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:9.1f} KB {stat.count:7d}x  {os.path.basename(frame.filename)}:{frame.lineno}")
+        if diff:
+            lines += ["", "Thay đổi từ lần trước:"]
+            for stat in diff:
+                frame = stat.traceback[0]
+                lines.append(f"{stat.size_diff / 1024:+9.1f} KB  {os.path.basename(frame.filename)}:{frame.lineno}")
+        msg = "```\n" + "\n".join(lines)[:TELEGRAM_MESSAGE_LIMIT - 80] + "\n```\n" + f"💾 `{path}`"
+    if getattr(update, "effective_message", None):
+        await update.effective_message.reply_text(msg, parse_mode="Markdown")
+    else:
+        print(msg)
+
+
+class TickQueue:
+    """
+    Hàng đợi tick giữa receive stage và detection stage - gom theo symbol:
+    chỉ giữ tick mới nhất của mỗi coin, tối đa maxsize coin (coin mới khi đầy → drop)
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.pending = {}  # symbol → ticker mới nhất chưa xử lý
+        self.event = asyncio.Event()
+        self.received = 0
+        self.coalesced = 0  # Tick bị thay bởi tick mới hơn của cùng coin
+        self.dropped = 0  # Tick bị bỏ vì hàng đợi đầy
+
+    def put(self, ticker):
+        symbol = ticker.symbol
+        if not symbol:
+            return
+        self.received += 1
+        pending = self.pending
+        if symbol in pending:
+            self.coalesced += 1
+        elif len(pending) >= self.maxsize:
+            self.dropped += 1
+            return
+        pending[symbol] = ticker
+        self.event.set()
+
+    def put_many(self, tickers):
+        for ticker in tickers:
+            self.put(ticker)
+
+    async def drain(self):
+        """Chờ có tick rồi lấy toàn bộ tick đang chờ"""
+        await self.event.wait()
+        self.event.clear()
+        batch, self.pending = list(self.pending.values()), {}
+        return batch
+
+    def stats(self):
+        return {
+            "depth": len(self.pending),
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
+
+
+def alert_priority(alert):
+    """Mức ưu tiên (ALERT_PRIORITY_*) của 1 alert (send_fn, args) từ detection stage"""
+    send_fn, args = alert
+    if send_fn is send_pump_dump_alert:
+        return ALERT_PRIORITY_EXTREME if abs(args[3]) >= EXTREME_THRESHOLD else ALERT_PRIORITY_PUMP
+    if send_fn is send_ema_alerts:
+        return ALERT_PRIORITY_EMA
+    return ALERT_PRIORITY_INFO
+
+
+class AlertQueue:
+    """
+    Hàng đợi alert giữa detection stage và delivery stage - lấy ra theo mức ưu tiên (cùng mức: FIFO).
+    Đầy → bỏ alert cũ nhất của mức ưu tiên thấp nhất (EMA trước pump/dump, pump/dump thường trước cực mạnh);
+    alert mới thấp hơn mọi alert đang chờ thì bỏ chính nó. Alert bị bỏ đều được log (coin + loại)
+    """
+
+    PRIORITIES = (ALERT_PRIORITY_EXTREME, ALERT_PRIORITY_PUMP, ALERT_PRIORITY_EMA, ALERT_PRIORITY_INFO)
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.queues = {priority: deque() for priority in self.PRIORITIES}
+        self.size = 0
+        self.event = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def put(self, alert):
+        priority = alert_priority(alert)
+        if self.size >= self.maxsize:
+            lowest = max(p for p in self.PRIORITIES if self.queues[p])
+            if priority > lowest:
+                self._drop(alert)
+                return
+            self._drop(self.queues[lowest].popleft())
+            self.size -= 1
+        self.queues[priority].append(alert)
+        self.size += 1
+        self.event.set()
+
+    def _drop(self, alert):
+        # Detection đã đánh dấu alert là đã gửi (SymbolState) → phải để lại dấu vết
+        self.dropped += 1
+        send_fn, args = alert
+        print(f"⚠️ Alert queue đầy ({self.maxsize}) → bỏ alert {send_fn.__name__} {args[0]}")
+
+    async def get(self):
+        while not self.size:
+            self.event.clear()
+            await self.event.wait()
+        self.size -= 1
+        for priority in self.PRIORITIES:
+            if self.queues[priority]:
+                return self.queues[priority].popleft()
+
+    def stats(self):
+        return {
+            "depth": self.size,
+            "sent": self.sent,
+            "dropped": self.dropped,
+        }
+
+
+class TickRecorder:
+    """
+    Ghi frame WebSocket thô (kèm thời điểm nhận) ra file gzip append-only.
+    Mỗi dòng: "<epoch_ms>\t<frame>". Mỗi lần flush ghi thêm 1 gzip member (đọc lại bằng gzip.open bình thường)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.buffer = []
+        self.frames = 0
+
+    def record(self, message):
+        if isinstance(message, bytes):
+            message = message.decode("utf-8", "replace")
+        self.buffer.append(f"{int(time.time() * 1000)}\t{message}\n")
+        self.frames += 1
+
+    def _write(self, lines):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        lines, self.buffer = self.buffer, []
+        try:
+            await asyncio.to_thread(self._write, lines)
+        except Exception as e:
+            print(f"⚠️ Lỗi ghi tick recording: {e}")
+
+    async def run(self):
+        """Task flush buffer định kỳ"""
+        print(f"⏺️ Đang ghi frame WebSocket vào {self.path}")
+        while True:
+            await asyncio.sleep(TICK_RECORD_FLUSH_INTERVAL)
+            await self.flush()
+
+
+def read_tick_recording(path):
+    """Đọc file ghi bởi TickRecorder → yield (epoch_ms, frame). Dòng không có timestamp → epoch_ms = None"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            ts, sep, frame = line.partition("\t")
+            if sep and ts.isdigit():
+                yield int(ts), frame
+            else:
+                yield None, line
+
+
+TICK_RECORDER = TickRecorder(TICK_RECORD_PATH) if TICK_RECORD_PATH else None
+TICK_QUEUE = TickQueue(TICK_QUEUE_MAX)
+ALERT_QUEUE = AlertQueue(ALERT_QUEUE_MAX)
+
+
+async def detection_stage():
+    """Stage 2: lấy tick đã gom → phát hiện EMA / pump / dump → đẩy alert sang delivery"""
+    while True:
+        batch = await TICK_QUEUE.drain()
+        try:
+            start = time.perf_counter()
+            alerts = detect_ticker_batch(batch)
+            DETECT_LATENCY.observe(time.perf_counter() - start)
+            DETECT_TICKERS.inc(amount=len(batch))
+            for alert in alerts:
+                ALERT_QUEUE.put(alert)
+        except Exception as e:
+            print(f"❌ Error in detection stage: {e}")
+        # Nhường event loop cho receive stage giữa các batch
+        await asyncio.sleep(0)
+
+
+async def delivery_stage(context):
+    """Stage 3: gửi alert Telegram - chậm cũng không chặn việc đọc socket"""
+    while True:
+        send_fn, args = await ALERT_QUEUE.get()
+        try:
+            await send_fn(*args, context)
+            ALERT_QUEUE.sent += 1
+        except Exception as e:
+            print(f"❌ Lỗi gửi alert: {e}")
+
+
+class WsShard:
+    """1 kết nối WebSocket phụ trách 1 phần symbols (chia theo shard_for) - reconnect độc lập"""
+
+    def __init__(self, index):
+        self.index = index
+        self.ws = None  # Socket đang mở (None khi đang reconnect)
+        self.messages = 0  # Tổng số message đã nhận
+        self.rate = 0.0  # message/giây (tính bởi watchdog)
+        self.lag = 0.0  # Độ trễ (giây) giữa timestamp server và lúc nhận message gần nhất
+        self.last_message = None  # monotonic time nhận message gần nhất
+        self.reconnects = 0
+        self._last_count = 0
+
+    def symbols(self):
+        return [sym for sym in ALL_SYMBOLS if shard_for(sym) == self.index]
+
+    def stats(self, now):
+        idle = now - self.last_message if self.last_message is not None else None
+        return {
+            "shard": self.index,
+            "connected": self.ws is not None,
+            "symbols": len(self.symbols()),
+            "rate": self.rate,
+            "lag": self.lag,
+            "idle": idle,
+            "reconnects": self.reconnects,
+        }
+
+
+class TickerStream:
+    """
+    Role sub.tickers (WS_TICKER_MODE=all): 1 shard đang mở giữ stream ticker cả market.
+    Shard đó mất kết nối hoặc push.tickers im lặng (sub bị từ chối) → watchdog chuyển role sang shard khác
+    """
+
+    def __init__(self):
+        self.shard = None  # Index shard đang giữ sub.tickers (None = shard kết nối đầu tiên sẽ nhận)
+        self.since = None  # monotonic time gửi sub.tickers gần nhất
+        self.last_push = None  # monotonic time nhận push.tickers gần nhất
+        self.moves = 0
+
+    def claim(self, index, now):
+        self.shard = index
+        self.since = now
+
+    def age(self, now):
+        """Số giây từ push.tickers gần nhất (None = chưa nhận)"""
+        return now - self.last_push if self.last_push is not None else None
+
+    def stale(self, now):
+        # Vừa subscribe thì chờ đủ timeout rồi mới tính là im lặng
+        last = max((t for t in (self.last_push, self.since) if t is not None), default=None)
+        return last is None or now - last > WS_TICKERS_STALE_TIMEOUT
+
+
+TICKER_STREAM = TickerStream()
+
+
+def shard_for(symbol):
+    """Shard cố định cho symbol (hash ổn định → coin mới list vào đúng shard)"""
+    return zlib.crc32(symbol.encode()) % WS_SHARDS
+
+
+async def ws_subscribe_tickers(shard):
+    """Gửi sub.tickers trên socket của shard và giao role ticker stream cho shard đó"""
+    TICKER_STREAM.claim(shard.index, time.monotonic())  # Claim trước khi await → shard khác không sub trùng
+    await shard.ws.send(json.dumps({"method": "sub.tickers", "param": {}}))
+
+
+async def ws_check_ticker_stream(now):
+    """Shard giữ sub.tickers mất kết nối / push.tickers im lặng → subscribe lại trên shard đang mở kế tiếp"""
+    stream = TICKER_STREAM
+    holder = WS_SHARD_LIST[stream.shard] if stream.shard is not None else None
+    if holder is not None and holder.ws is not None and not stream.stale(now):
+        return
+    live = [shard for shard in WS_SHARD_LIST if shard.ws is not None]
+    if not live:
+        stream.shard = None  # Shard kết nối lại đầu tiên sẽ nhận role
+        return
+
+    # Thử shard khác trước (sub có thể bị từ chối trên kết nối cũ); chỉ còn holder sống thì sub lại trên nó
+    start = stream.shard + 1 if stream.shard is not None else 0
+    target = min(live, key=lambda shard: (shard.index - start) % len(WS_SHARD_LIST))
+    if holder is not None and holder.ws is not None and holder is not target:
+        try:
+            await holder.ws.send(json.dumps({"method": "unsub.tickers", "param": {}}))
+        except Exception:
+            pass
+    age = stream.age(now)
+    try:
+        await ws_subscribe_tickers(target)
+    except Exception as e:
+        print(f"⚠️ Lỗi subscribe sub.tickers trên shard {target.index}: {e}")
+        return
+    stream.moves += 1
+    idle = f"{age:.0f}s" if age is not None else "chưa nhận"
+    old = holder.index if holder is not None else "-"
+    print(f"⚠️ push.tickers im lặng ({idle}) → chuyển sub.tickers: shard {old} → {target.index}")
+
+
+async def ws_send_subscriptions(ws, symbols, action="sub"):
+    """Gửi sub/unsub ticker + kline (mọi EMA timeframe) theo từng burst WS_SUB_BURST message"""
+    messages = []
+    for symbol in symbols:
+        if WS_TICKER_MODE != "all":
+            messages.append(json.dumps({"method": f"{action}.ticker", "param": {"symbol": symbol}}))
+        for timeframe in EMA_TIMEFRAMES:
+            messages.append(json.dumps({
+                "method": f"{action}.kline",
+                "param": {"symbol": symbol, "interval": timeframe}
+            }))
+    
+    for i in range(0, len(messages), WS_SUB_BURST):
+        # Gửi liền cả burst rồi mới nghỉ - không chờ 5ms sau mỗi message
+        for msg in messages[i:i+WS_SUB_BURST]:
+            await ws.send(msg)
+        if i + WS_SUB_BURST < len(messages):
+            await asyncio.sleep(WS_SUB_BURST_DELAY)
+    return len(messages)
+
+
+def drop_symbol_state(symbol):
+    """Xoá toàn bộ state của coin đã delist"""
+    SYMBOL_STATES.pop(symbol, None)
+    CANDLE_STORE.remove(symbol)
+    for timeframe in EMA_TIMEFRAMES:
+        WARMUP_DONE.discard((symbol, timeframe))
+
+
+async def apply_universe(symbols):
+    """
+    Cập nhật ALL_SYMBOLS tại chỗ (không restart bot):
+    - coin mới: subscribe trên socket đang mở + warm-up EMA chạy nền
+    - coin delist: unsubscribe + xoá state
+    State pump/dump của các coin còn lại được giữ nguyên.
+    """
+    global ALL_SYMBOLS
+    if not symbols:
+        return [], []
+    
+    current, new = set(ALL_SYMBOLS), set(symbols)
+    added = [sym for sym in symbols if sym not in current]
+    removed = [sym for sym in ALL_SYMBOLS if sym not in new]
+    if not added and not removed:
+        return added, removed
+    
+    ALL_SYMBOLS = list(symbols)
+    for sym in removed:
+        drop_symbol_state(sym)
+    print(f"🔄 Cập nhật universe: +{len(added)} coin, -{len(removed)} coin (tổng {len(ALL_SYMBOLS)})")
+    
+    # Shard đang mở → sub/unsub ngay; shard đang reconnect sẽ dùng ALL_SYMBOLS mới khi connect lại
+    for shard in WS_SHARD_LIST:
+        ws = shard.ws
+        if ws is None:
+            continue
+        try:
+            await ws_send_subscriptions(ws, [sym for sym in added if shard_for(sym) == shard.index], "sub")
+            await ws_send_subscriptions(ws, [sym for sym in removed if shard_for(sym) == shard.index], "unsub")
+        except Exception as e:
+            print(f"⚠️ Lỗi cập nhật subscription shard {shard.index}: {e}")
+    
+    if added:
+        asyncio.create_task(init_candle_buffers(get_http_session(), added))
+    return added, removed
+
+
+async def job_refresh_universe(context):
+    """Job cập nhật danh sách coin (lên lịch đúng giờ coin mới list)"""
+    try:
+        symbols = await get_all_symbols(get_http_session())
+        await apply_universe(symbols)
+    except Exception as e:
+        print(f"❌ Lỗi cập nhật universe: {e}")
+
+
+async def handle_ws_message(shard, message, context):
+    """Receive stage: decode 1 message WebSocket - ping/pong, ghi kline vào buffer, đẩy ticker vào TICK_QUEUE"""
+    channel, ts, payload = decode_ws_frame(message)
+    WS_FRAMES.inc(channel or "other")
     
-    if chat_id not in MUTED_COINS or not MUTED_COINS[chat_id]:
-        if getattr(update, "effective_message", None):
-            await update.effective_message.reply_text("ℹ️ Chưa có coin nào bị mute")
-        else:
-            try:
-                await context.bot.send_message(chat_id, "ℹ️ Chưa có coin nào bị mute")
-            except Exception:
-                print("ℹ️ Không có coin mute (không thể gửi message)")
-        return
+    # Độ trễ server → bot (ts tính bằng ms)
+    if ts:
+        shard.lag = time.time() - ts / 1000
     
-    coins = [sym.replace("_USDT", "") for sym in MUTED_COINS[chat_id]]
-    msg = "🔇 *DANH SÁCH COIN ĐÃ MUTE*\n\n"
-    msg += "\n".join([f"• `{coin}`" for coin in sorted(coins)])
-    msg += f"\n\n_Tổng: {len(coins)} coin_"
+    # Ticker data → hàng đợi detection (receive stage không chờ detect/gửi alert)
+    if channel == "push.tickers":
+        TICKER_STREAM.last_push = time.monotonic()
+        TICK_QUEUE.put_many(payload)
     
-    if getattr(update, "effective_message", None):
-        await update.effective_message.reply_text(msg, parse_mode="Markdown")
-    else:
-        try:
-            await context.bot.send_message(chat_id, msg, parse_mode="Markdown")
-        except Exception:
-            print("ℹ️ Không thể gửi danh sách mute (no message object)")
+    elif channel == "push.ticker":
+        TICK_QUEUE.put(payload)
+    
+    # Xử lý kline data - UPDATE BUFFER
+    elif channel == "push.kline":
+        if payload is not None:
+            update_candle_buffer(payload.symbol, payload.interval, payload.close, payload.time)
+    
+    # Xử lý ping/pong
+    elif "ping" in payload:
+        await shard.ws.send(json.dumps({"pong": payload["ping"]}))
 
 
-async def websocket_stream(context):
-    """WebSocket stream để nhận giá realtime từ MEXC Futures"""
+async def websocket_shard(shard, context):
+    """WebSocket stream của 1 shard - chỉ subscribe các symbol thuộc shard này"""
     reconnect_delay = 5
     
     while True:
@@ -854,253 +3251,259 @@ async def websocket_stream(context):
                 ping_timeout=10,   # Timeout cho pong response
                 close_timeout=10
             ) as ws:
-                print(f"✅ Kết nối WebSocket thành công")
-                
-                # Subscribe tất cả ticker streams - MEXC Futures format
-                for symbol in ALL_SYMBOLS:
-                    # MEXC Futures WebSocket format: sub.ticker
-                    sub_msg = {
-                        "method": "sub.ticker",
-                        "param": {
-                            "symbol": symbol
-                        }
-                    }
-                    await ws.send(json.dumps(sub_msg))
-                    await asyncio.sleep(0.005)  # 5ms delay giữa subscriptions
+                shard.ws = ws
+                shard.last_message = time.monotonic()
                 
-                print(f"✅ Đã subscribe {len(ALL_SYMBOLS)} coin qua WebSocket")
-                
-                # Subscribe kline cho EMA (chỉ coins có buffer)
-                if CANDLE_BUFFERS:
-                    print(f"📊 Subscribing kline streams...")
-                    kline_count = 0
-                    for symbol in CANDLE_BUFFERS.keys():
-                        for timeframe in EMA_TIMEFRAMES:
-                            await ws.send(json.dumps({
-                                "method": "sub.kline",
-                                "param": {"symbol": symbol, "interval": timeframe}
-                            }))
-                            kline_count += 1
-                            await asyncio.sleep(0.005)
-                    print(f"✅ Subscribed {kline_count} kline streams")
-
+                # Subscribe ticker + kline (EMA) - buffer được seed dần bởi warm-up
+                symbols = shard.symbols()
+                sub_count = await ws_send_subscriptions(ws, symbols)
+                if WS_TICKER_MODE == "all" and TICKER_STREAM.shard in (None, shard.index):
+                    # Ticker cả market qua 1 stream duy nhất - shard đang giữ role (hoặc shard kết nối đầu tiên)
+                    await ws_subscribe_tickers(shard)
+                    sub_count += 1
+                print(f"✅ Shard {shard.index}: subscribe {len(symbols)} coin ({sub_count} streams)")
                 
                 # Reset reconnect delay sau khi connect thành công
                 reconnect_delay = 5
                 
                 # Lắng nghe messages
                 async for message in ws:
+                    shard.messages += 1
+                    shard.last_message = time.monotonic()
+                    if TICK_RECORDER:
+                        TICK_RECORDER.record(message)
                     try:
-                        data = json.loads(message)
-                        
-                        # Xử lý ping/pong
-                        if "ping" in data:
-                            await ws.send(json.dumps({"pong": data["ping"]}))
-                            continue
-                        
-                        # Xử lý ticker data
-                        if "channel" in data and data.get("channel") == "push.ticker":
-                            if "data" in data:
-                                await process_ticker(data["data"], context)
-                        
-                        # Xử lý kline data - UPDATE BUFFER
-                        elif "channel" in data and data.get("channel") == "push.kline":
-                            if "data" in data:
-                                kline = data["data"]
-                                sym = kline.get("symbol")
-                                interval = kline.get("interval")
-                                close = kline.get("c")
-                                timestamp = kline.get("t")
-                                if sym and interval and close and timestamp:
-                                    update_candle_buffer(sym, interval, close, timestamp)
-
-                            
-                    except json.JSONDecodeError:
+                        await handle_ws_message(shard, message, context)
+                    except JSON_DECODE_ERRORS:
                         continue
                     except Exception as e:
-                        print(f"❌ Error processing message: {e}")
+                        print(f"❌ Error processing message (shard {shard.index}): {e}")
                         continue
+            
+            shard.ws = None
+            print(f"⚠️ Shard {shard.index}: kết nối bị đóng, reconnect...")
                         
         except Exception as e:
-            print(f"❌ WebSocket error: {e}")
+            shard.ws = None
+            print(f"❌ WebSocket error (shard {shard.index}): {e}")
             print(f"🔄 Reconnecting in {reconnect_delay}s...")
             await asyncio.sleep(reconnect_delay)
             
             # Exponential backoff: 5s -> 10s -> 20s -> max 60s
             reconnect_delay = min(reconnect_delay * 2, 60)
+        
+        shard.reconnects += 1
 
 
-async def process_ticker(ticker_data, context):
-    """Xử lý ticker data từ WebSocket và phát hiện pump/dump - DUAL BASE PRICE"""
-    symbol = ticker_data.get("symbol")
-    if not symbol:
-        return
-    
-    try:
-        current_price = float(ticker_data.get("lastPrice", 0))
-        volume = float(ticker_data.get("volume24", 0))
-        
-        if current_price == 0 or volume < MIN_VOL_THRESHOLD:
-            return
-        
-        now = datetime.now()
-        
-        # Lưu giá hiện tại
-        LAST_PRICES[symbol] = {
-            "price": current_price,
-            "time": now
-        }
-        
-        # REALTIME EMA CHECK
-        await check_ema_proximity_realtime(symbol, current_price, context)
+async def ws_watchdog():
+    """
+    Tính message rate từng shard; shard im lặng quá WS_STALE_TIMEOUT → đóng để reconnect.
+    WS_TICKER_MODE=all: push.tickers im lặng quá WS_TICKERS_STALE_TIMEOUT → chuyển sub.tickers sang shard khác
+    """
+    while True:
+        await asyncio.sleep(WS_WATCHDOG_INTERVAL)
+        now = time.monotonic()
+        for shard in WS_SHARD_LIST:
+            shard.rate = (shard.messages - shard._last_count) / WS_WATCHDOG_INTERVAL
+            shard._last_count = shard.messages
+            
+            ws = shard.ws
+            if ws is not None and shard.last_message is not None and now - shard.last_message > WS_STALE_TIMEOUT:
+                print(f"⚠️ Shard {shard.index} im lặng {now - shard.last_message:.0f}s → reconnect")
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
         
-        # Thiết lập base price nếu chưa có
-        if symbol not in BASE_PRICES:
-            BASE_PRICES[symbol] = current_price
-            return
+        if WS_TICKER_MODE == "all":
+            await ws_check_ticker_stream(now)
 
-        
-        # Tính % thay đổi từ BASE_PRICE (dynamic - chỉ reset sau alert)
-        base_price = BASE_PRICES[symbol]
-        price_change = (current_price - base_price) / base_price * 100
-        abs_change = abs(price_change)
-        
-        # Track max change trong đợt pump/dump
-        if symbol not in MAX_CHANGES:
-            MAX_CHANGES[symbol] = {"max_pct": 0, "time": now}
-        
-        # Cập nhật max change nếu vượt qua
-        if abs_change > abs(MAX_CHANGES[symbol]["max_pct"]):
-            MAX_CHANGES[symbol] = {"max_pct": price_change, "time": now}
-            LAST_SIGNIFICANT_CHANGE[symbol] = now
-        
-        # Kiểm tra xem có nên reset base price không
-        # Reset nếu: giá quay về gần base (< 1.5%) HOẶC đã qua 3 phút không có biến động mạnh
-        should_reset_base = False
-        if abs_change < 1.5:  # Giá đã quay về gần base price
-            should_reset_base = True
-        elif symbol in LAST_SIGNIFICANT_CHANGE:
-            time_since_last = (now - LAST_SIGNIFICANT_CHANGE[symbol]).total_seconds()
-            if time_since_last > 50:  # 50 giây không có biến động mạnh
-                should_reset_base = True
-        
-        if should_reset_base and symbol in MAX_CHANGES:
-            BASE_PRICES[symbol] = current_price
-            MAX_CHANGES[symbol] = {"max_pct": 0, "time": now}
-        
-        # Kiểm tra ngưỡng và alert ngay khi vượt
-        should_alert = False
-        if (price_change >= PUMP_THRESHOLD or price_change <= DUMP_THRESHOLD):
-            last_alert = ALERTED_SYMBOLS.get(symbol)
-            last_max = MAX_CHANGES[symbol].get("last_alerted_pct")
-            # Báo ngay lần đầu vượt ngưỡng
-            if last_alert is None:
-                should_alert = True
-            else:
-                # Nếu đã báo rồi, chỉ báo lại khi tăng thêm >=1.5%
-                if last_max is None:
-                    last_max = 0.0
-                if abs_change >= abs(last_max) + 1.5:
-                    should_alert = True
-            if should_alert:
-                ALERTED_SYMBOLS[symbol] = now
-                MAX_CHANGES[symbol]["last_alerted_pct"] = price_change
-
-        if should_alert and SUBSCRIBERS:
-            # Dùng BASE_PRICE và hiển thị % thay đổi TỔNG
-            msg = fmt_alert(symbol, base_price, current_price, price_change)
-            if price_change >= PUMP_THRESHOLD:
-                print(f"🚀 PUMP: {symbol} +{price_change:.2f}% (max: +{MAX_CHANGES[symbol]['max_pct']:.2f}%)")
-            else:
-                print(f"💥 DUMP: {symbol} {price_change:.2f}% (max: {MAX_CHANGES[symbol]['max_pct']:.2f}%)")
 
-            # Gửi alert
-            tasks = []
-            
-            # Nếu có CHANNEL_ID → gửi vào channel
-            if CHANNEL_ID:
-                tasks.append(
-                    context.bot.send_message(
-                        CHANNEL_ID,
-                        msg,
-                        parse_mode="Markdown",
-                        disable_web_page_preview=True
-                    )
-                )
-            
-            # Gửi cho subscribers cá nhân (nếu có)
-            for chat in SUBSCRIBERS:
-                # Kiểm tra xem user có bật pump/dump alerts không
-                pumpdump_enabled = PUMPDUMP_ALERTS_ENABLED.get(chat, True)  # Mặc định: bật
-                if not pumpdump_enabled:
-                    continue
-                
-                # Kiểm tra coin có bị mute không
-                if chat in MUTED_COINS and symbol in MUTED_COINS[chat]:
-                    continue
-                
-                mode = ALERT_MODE.get(chat, 1)  # Mặc định mode 1
-                abs_change = abs(price_change)
+async def websocket_stream(context):
+    """WebSocket ingest realtime từ MEXC Futures: WS_SHARDS kết nối (receive) → detection → delivery"""
+    WS_SHARD_LIST[:] = [WsShard(i) for i in range(WS_SHARDS)]
+    print(f"🌐 WebSocket: {WS_SHARDS} shard cho {len(ALL_SYMBOLS)} coin")
+    
+    tasks = [asyncio.create_task(websocket_shard(shard, context)) for shard in WS_SHARD_LIST]
+    tasks.append(asyncio.create_task(ws_watchdog()))
+    tasks.append(asyncio.create_task(detection_stage()))
+    tasks += [asyncio.create_task(delivery_stage(context)) for _ in range(DELIVERY_WORKERS)]
+    if TICK_RECORDER:
+        tasks.append(asyncio.create_task(TICK_RECORDER.run()))
+    await asyncio.gather(*tasks)
+
+
+class SymbolState:
+    """State pump/dump của 1 coin - mọi mốc thời gian là time.monotonic() (None = chưa có)"""
+    __slots__ = (
+        "last_price", "last_time",  # Giá ticker gần nhất
+        "base_price",  # Dynamic reset: chỉ reset sau khi alert / giá quay về gần base
+        "max_pct", "max_time",  # Max % change trong đợt pump/dump
+        "last_alerted_pct",  # % lúc alert gần nhất trong đợt (None = chưa alert đợt này)
+        "alerted_at",  # Lần alert gần nhất - tránh spam alert
+        "last_significant",  # Lần cuối có biến động mạnh
+    )
 
+    def __init__(self, price, now):
+        self.last_price = price
+        self.last_time = now
+        self.base_price = price
+        self.max_pct = 0.0
+        self.max_time = now
+        self.last_alerted_pct = None
+        self.alerted_at = None
+        self.last_significant = None
+
+    def reset_base(self, price, now):
+        """Bắt đầu đợt mới: base = giá hiện tại, xoá max change"""
+        self.base_price = price
+        self.max_pct = 0.0
+        self.max_time = now
+        self.last_alerted_pct = None
+
+
+def detect_pump_dump(symbol, current_price, now):
+    """
+    Cập nhật state của symbol với giá mới - DUAL BASE PRICE (đồng bộ, không await, không cấp phát).
+    now: time.monotonic(). Returns: (base_price, price_change) nếu cần alert, ngược lại None
+    """
+    state = SYMBOL_STATES.get(symbol)
+    
+    # Thiết lập base price nếu chưa có
+    if state is None:
+        SYMBOL_STATES[symbol] = SymbolState(current_price, now)
+        return None
+    
+    # Lưu giá hiện tại
+    state.last_price = current_price
+    state.last_time = now
+    
+    # Tính % thay đổi từ BASE_PRICE (dynamic - chỉ reset sau alert)
+    base_price = state.base_price
+    price_change = (current_price - base_price) / base_price * 100
+    abs_change = abs(price_change)
+    
+    # Cập nhật max change nếu vượt qua
+    if abs_change > abs(state.max_pct):
+        state.max_pct = price_change
+        state.max_time = now
+        state.last_alerted_pct = None
+        state.last_significant = now
+    
+    # Kiểm tra xem có nên reset base price không
+    # Reset nếu: giá quay về gần base (< 1.5%) HOẶC đã qua 50 giây không có biến động mạnh
+    if abs_change < 1.5:  # Giá đã quay về gần base price
+        state.reset_base(current_price, now)
+    elif state.last_significant is not None and now - state.last_significant > 50:
+        state.reset_base(current_price, now)
+    
+    # Kiểm tra ngưỡng và alert ngay khi vượt
+    if price_change >= PUMP_THRESHOLD or price_change <= DUMP_THRESHOLD:
+        # Báo ngay lần đầu vượt ngưỡng; đã báo rồi thì chỉ báo lại khi tăng thêm >=1.5%
+        last_max = state.last_alerted_pct or 0.0
+        if state.alerted_at is None or abs_change >= abs(last_max) + 1.5:
+            state.alerted_at = now
+            state.last_alerted_pct = price_change
+            return base_price, price_change
+    return None
+
+
+def pump_dump_recipients(symbol, abs_change):
+    """Chat nhận alert pump/dump của symbol (channel + subscriber theo toggle / mute / ALERT_MODE)"""
+    return ALERT_ROUTER.recipients("pump", severity_band(abs_change), symbol)
+
+
+async def send_pump_dump_alert(symbol, base_price, current_price, price_change, now, context):
+    """Gửi alert pump/dump tới channel + subscribers (qua TELEGRAM_SCHEDULER)"""
+    if not SUBSCRIBERS:
+        return
+    
+    state = SYMBOL_STATES.get(symbol)
+    max_pct = state.max_pct if state else price_change
+    if price_change >= PUMP_THRESHOLD:
+        print(f"🚀 PUMP: {symbol} +{price_change:.2f}% (max: +{max_pct:.2f}%)")
+    else:
+        print(f"💥 DUMP: {symbol} {price_change:.2f}% (max: {max_pct:.2f}%)")
 
-                # Mode 1: Báo tất cả (3-5% + ≥10%)
-                # Mode 2: Chỉ báo 3-5%
-                # Mode 3: Chỉ báo ≥10%
-                
-                if mode == 2:
-                    # Mode 2: Chỉ 3-5%, bỏ qua ≥10%
-                    if abs_change > MODERATE_MAX:
-                        continue
-                elif mode == 3:
-                    # Mode 3: Chỉ ≥10%
-                    if abs_change < EXTREME_THRESHOLD:
-                        continue
-                # Mode 1: Không filter, báo tất cả
+    abs_change = abs(price_change)
+    
+    if ALERT_COALESCE_WINDOW > 0:
+        # Gom vào cửa sổ coalescing - lọc theo từng chat lúc flush (không ai nhận → không gom, không reset base)
+        sent = bool(pump_dump_recipients(symbol, abs_change))
+        if sent:
+            ALERT_COALESCER.add_pump(context.bot, symbol, base_price, current_price, price_change)
+    else:
+        # Dùng BASE_PRICE và hiển thị % thay đổi TỔNG
+        msg = fmt_alert(symbol, base_price, current_price, price_change)
+        priority = ALERT_PRIORITY_EXTREME if abs_change >= EXTREME_THRESHOLD else ALERT_PRIORITY_PUMP
+        recipients = pump_dump_recipients(symbol, abs_change)
+        for chat in recipients:
+            TELEGRAM_SCHEDULER.submit(
+                context.bot, chat, msg, priority, parse_mode="Markdown", disable_web_page_preview=True
+            )
+        sent = bool(recipients)
+    
+    # Nếu đây là alert cực mạnh (>= EXTREME_THRESHOLD) -> reset base ngay lập tức
+    if sent and abs_change >= EXTREME_THRESHOLD and state:
+        state.reset_base(current_price, now)
+        print(f"🔁 Reset base price for {symbol} after extreme alert ({abs_change:.2f}%)")
 
-                tasks.append(
-                    context.bot.send_message(
-                        chat,
-                        msg,
-                        parse_mode="Markdown",
-                        disable_web_page_preview=True
-                    )
-                )
 
-            if tasks:
-                try:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    # Nếu đây là alert cực mạnh (>= EXTREME_THRESHOLD) -> reset base ngay lập tức
-                    try:
-                        if abs_change >= EXTREME_THRESHOLD:
-                            BASE_PRICES[symbol] = current_price
-                            MAX_CHANGES[symbol] = {"max_pct": 0, "time": now}
-                            print(f"🔁 Reset base price for {symbol} after extreme alert ({abs_change:.2f}%)")
-                    except Exception:
-                        pass
-                except Exception as e:
-                    print(f"❌ Lỗi gửi tin nhắn: {e}")
-            
-    except Exception as e:
-        print(f"❌ Error processing ticker for {symbol}: {e}")
+def detect_ticker_batch(tickers):
+    """
+    Phát hiện alert cho 1 batch Ticker (cả market hoặc tick đã gom) - vectorized, đồng bộ:
+    ghi giá + check EMA 200 cho cả batch bằng numpy, pump/dump từng coin đủ volume.
+    Returns: [(send_fn, args), ...] - alert cần gửi (send_fn(*args, context))
+    """
+    symbols = [t.symbol for t in tickers if t.symbol]
+    if not symbols:
+        return []
+    if len(symbols) != len(tickers):
+        tickers = [t for t in tickers if t.symbol]
+    
+    prices = np.fromiter((t.price for t in tickers), dtype=np.float64, count=len(tickers))
+    volumes = np.fromiter((t.volume for t in tickers), dtype=np.float64, count=len(tickers))
+    valid = prices > 0
+    active = valid & (volumes >= MIN_VOL_THRESHOLD)
+    
+    # Cache giá cho /ema200 (mọi coin), chỉ đánh dấu check EMA cho coin đủ volume
+    CANDLE_STORE.set_prices(symbols, prices, valid, active)
+    
+    alerts = []
+    # REALTIME EMA CHECK: 1 lần quét vectorized cho cả batch (batch mode: để loop định kỳ check)
+    if EMA_CHECK_MODE != "batch":
+        for symbol, hits in scan_ema_proximity_batch(time.monotonic()).items():
+            alerts.append((send_ema_alerts, (symbol, hits)))
+    
+    now = time.monotonic()
+    for i in np.flatnonzero(active).tolist():
+        symbol, current_price = symbols[i], float(prices[i])
+        try:
+            alert = detect_pump_dump(symbol, current_price, now)
+        except Exception as e:
+            print(f"❌ Error processing ticker for {symbol}: {e}")
+            continue
+        if alert:
+            base_price, price_change = alert
+            alerts.append((send_pump_dump_alert, (symbol, base_price, current_price, price_change, now)))
+    return alerts
 
 
 async def reset_base_prices(context):
     """Job backup reset base prices mỗi 5 phút"""
-    global BASE_PRICES
+    now = time.monotonic()
     
     # Cập nhật base prices từ last prices (chỉ cho coin không có alert gần đây)
-    for symbol, data in LAST_PRICES.items():
+    for state in SYMBOL_STATES.values():
         # Chỉ reset nếu không có alert trong 5 phút qua
-        if symbol not in ALERTED_SYMBOLS or \
-           (datetime.now() - ALERTED_SYMBOLS[symbol]).seconds > 300:
-            BASE_PRICES[symbol] = data["price"]
+        if state.alerted_at is None or now - state.alerted_at > 300:
+            state.base_price = state.last_price
     
-    print(f"🔄 Backup reset {len(BASE_PRICES)} base prices")
+    print(f"🔄 Backup reset {len(SYMBOL_STATES)} base prices")
 
 
 async def calc_movers(session, interval, symbols):
-    """Tính % thay đổi giá cho danh sách symbols - BATCH để tránh rate limit"""
-    import asyncio
+    """Tính % thay đổi giá cho danh sách symbols"""
     
     async def get_single_mover(sym):
         """Lấy dữ liệu cho 1 coin - so sánh giá HIỆN TẠI vs candle cuối (bao gồm HIGH/LOW để bắt râu)"""
@@ -1143,28 +3546,12 @@ async def calc_movers(session, interval, symbols):
         except Exception as e:
             return None
     
-    # CHIA NHỎ THÀNH BATCH để tránh 429 Too Many Requests
-    BATCH_SIZE = 50  # Quét 50 coins/lần
-    BATCH_DELAY_MIN = 0.6  # Random delay 0.6-1.0s giữa các batch
-    BATCH_DELAY_MAX = 1.0
-    
-    all_movers = []
-    for i in range(0, len(symbols), BATCH_SIZE):
-        batch = symbols[i:i+BATCH_SIZE]
-        tasks = [get_single_mover(sym) for sym in batch]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        # Lọc bỏ None và exceptions
-        movers = [r for r in results if r is not None and not isinstance(r, Exception)]
-        all_movers.extend(movers)
-        
-        # Random delay giữa các batch (trừ batch cuối)
-        if i + BATCH_SIZE < len(symbols):
-            import random
-            delay = random.uniform(BATCH_DELAY_MIN, BATCH_DELAY_MAX)
-            await asyncio.sleep(delay)
+    # REST_LIMITER điều tiết tốc độ chung → gửi tất cả cùng lúc, không cần batch/sleep
+    tasks = [get_single_mover(sym) for sym in symbols]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
     
-    return all_movers
+    # Lọc bỏ None và exceptions
+    return [r for r in results if r is not None and not isinstance(r, Exception)]
 
 
 async def timelist(update, context):
@@ -1178,66 +3565,57 @@ async def timelist(update, context):
             print("⏳ Timelist requested (no message object)")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            # Gọi API calendar
-            timestamp = int(datetime.now().timestamp() * 1000)
-            url = f"https://www.mexc.co/api/operation/new_coin_calendar?timestamp={timestamp}"
+        session = get_http_session()
+        # Gọi API calendar (qua REST_LIMITER)
+        coins = await get_new_coin_calendar(session)
+        if not coins:
+            raise Exception("Không tìm thấy dữ liệu listing")
             
-            async with session.get(url, timeout=15) as r:
-                if r.status != 200:
-                    raise Exception(f"HTTP {r.status}")
-                
-                data = await r.json()
-                coins = data.get('data', {}).get('newCoins', [])
-                
-                if not coins:
-                    raise Exception("Không tìm thấy dữ liệu listing")
+        vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+        now = datetime.now(vn_tz)
+        one_week_later = now + timedelta(days=7)
+            
+        msg = "📅 *LỊCH COIN SẮP LIST (1 TUẦN)*\n\n"
+        count = 0
+            
+        for coin in coins:
+            symbol = coin.get('vcoinName')
+            full_name = coin.get('vcoinNameFull', symbol)
+            timestamp_ms = coin.get('firstOpenTime')
                 
-                vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-                now = datetime.now(vn_tz)
-                one_week_later = now + timedelta(days=7)
+            if not timestamp_ms:
+                continue
                 
-                msg = "📅 *LỊCH COIN SẮP LIST (1 TUẦN)*\n\n"
-                count = 0
+            # Convert timestamp to datetime - API trả UTC, convert sang VN
+            dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
+            dt = dt_utc.astimezone(vn_tz)
                 
-                for coin in coins:
-                    symbol = coin.get('vcoinName')
-                    full_name = coin.get('vcoinNameFull', symbol)
-                    timestamp_ms = coin.get('firstOpenTime')
-                    
-                    if not timestamp_ms:
-                        continue
-                    
-                    # Convert timestamp to datetime - API trả UTC, convert sang VN
-                    dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
-                    dt = dt_utc.astimezone(vn_tz)
+            # Chỉ hiển thị coin list trong 1 tuần tới
+            if now <= dt <= one_week_later:
+                weekdays = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
+                weekday = weekdays[dt.weekday()]
+                date_str = dt.strftime("%d/%m/%Y %H:%M")
                     
-                    # Chỉ hiển thị coin list trong 1 tuần tới
-                    if now <= dt <= one_week_later:
-                        weekdays = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
-                        weekday = weekdays[dt.weekday()]
-                        date_str = dt.strftime("%d/%m/%Y %H:%M")
-                        
-                        msg += f"🆕 `{symbol}` ({full_name})\n"
-                        msg += f"   ⏰ {weekday}, {date_str}\n\n"
-                        count += 1
-                
-                if count == 0:
-                    if getattr(update, "effective_message", None):
-                        await update.effective_message.reply_text("📅 Chưa có coin nào sắp list trong tuần tới")
-                    else:
-                        try:
-                            await context.bot.send_message(update.effective_chat.id, "📅 Chưa có coin nào sắp list trong tuần tới")
-                        except Exception:
-                            print("📅 Không thể gửi thông báo timelist")
-                else:
-                    if getattr(update, "effective_message", None):
-                        await update.effective_message.reply_text(msg, parse_mode="Markdown")
-                    else:
-                        try:
-                            await context.bot.send_message(update.effective_chat.id, msg, parse_mode="Markdown")
-                        except Exception:
-                            print("📅 Không thể gửi danh sách timelist")
+                msg += f"🆕 `{symbol}` ({full_name})\n"
+                msg += f"   ⏰ {weekday}, {date_str}\n\n"
+                count += 1
+            
+        if count == 0:
+            if getattr(update, "effective_message", None):
+                await update.effective_message.reply_text("📅 Chưa có coin nào sắp list trong tuần tới")
+            else:
+                try:
+                    await context.bot.send_message(update.effective_chat.id, "📅 Chưa có coin nào sắp list trong tuần tới")
+                except Exception:
+                    print("📅 Không thể gửi thông báo timelist")
+        else:
+            if getattr(update, "effective_message", None):
+                await update.effective_message.reply_text(msg, parse_mode="Markdown")
+            else:
+                try:
+                    await context.bot.send_message(update.effective_chat.id, msg, parse_mode="Markdown")
+                except Exception:
+                    print("📅 Không thể gửi danh sách timelist")
     
     except Exception as e:
         print(f"❌ Lỗi scrape Futures listing: {e}")
@@ -1266,66 +3644,57 @@ async def coinlist(update, context):
             print("⏳ Coinlist requested (no message object)")
     
     try:
-        async with aiohttp.ClientSession() as session:
-            # Gọi API calendar
-            timestamp = int(datetime.now().timestamp() * 1000)
-            url = f"https://www.mexc.co/api/operation/new_coin_calendar?timestamp={timestamp}"
+        session = get_http_session()
+        # Gọi API calendar (qua REST_LIMITER)
+        coins = await get_new_coin_calendar(session)
+        if not coins:
+            raise Exception("Không tìm thấy dữ liệu listing")
             
-            async with session.get(url, timeout=15) as r:
-                if r.status != 200:
-                    raise Exception(f"HTTP {r.status}")
-                
-                data = await r.json()
-                coins = data.get('data', {}).get('newCoins', [])
-                
-                if not coins:
-                    raise Exception("Không tìm thấy dữ liệu listing")
+        vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+        now = datetime.now(vn_tz)
+        one_week_ago = now - timedelta(days=7)
+            
+        msg = "📋 *COIN ĐÃ LIST (1 TUẦN QUA)*\n\n"
+        count = 0
+            
+        for coin in coins:
+            symbol = coin.get('vcoinName')
+            full_name = coin.get('vcoinNameFull', symbol)
+            timestamp_ms = coin.get('firstOpenTime')
                 
-                vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-                now = datetime.now(vn_tz)
-                one_week_ago = now - timedelta(days=7)
+            if not timestamp_ms:
+                continue
                 
-                msg = "📋 *COIN ĐÃ LIST (1 TUẦN QUA)*\n\n"
-                count = 0
+            # Convert timestamp to datetime - API trả UTC, convert sang VN
+            dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
+            dt = dt_utc.astimezone(vn_tz)
                 
-                for coin in coins:
-                    symbol = coin.get('vcoinName')
-                    full_name = coin.get('vcoinNameFull', symbol)
-                    timestamp_ms = coin.get('firstOpenTime')
-                    
-                    if not timestamp_ms:
-                        continue
-                    
-                    # Convert timestamp to datetime - API trả UTC, convert sang VN
-                    dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
-                    dt = dt_utc.astimezone(vn_tz)
+            # Chỉ hiển thị coin list trong 1 tuần qua
+            if one_week_ago <= dt <= now:
+                weekdays = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
+                weekday = weekdays[dt.weekday()]
+                date_str = dt.strftime("%d/%m/%Y %H:%M")
                     
-                    # Chỉ hiển thị coin list trong 1 tuần qua
-                    if one_week_ago <= dt <= now:
-                        weekdays = ["Thứ Hai", "Thứ Ba", "Thứ Tư", "Thứ Năm", "Thứ Sáu", "Thứ Bảy", "Chủ Nhật"]
-                        weekday = weekdays[dt.weekday()]
-                        date_str = dt.strftime("%d/%m/%Y %H:%M")
-                        
-                        msg += f"✅ `{symbol}` ({full_name})\n"
-                        msg += f"   ⏰ {weekday}, {date_str}\n\n"
-                        count += 1
-                
-                if count == 0:
-                    if getattr(update, "effective_message", None):
-                        await update.effective_message.reply_text("📋 Không có coin nào list trong tuần qua")
-                    else:
-                        try:
-                            await context.bot.send_message(update.effective_chat.id, "📋 Không có coin nào list trong tuần qua")
-                        except Exception:
-                            print("📋 Không thể gửi coinlist (no message)")
-                else:
-                    if getattr(update, "effective_message", None):
-                        await update.effective_message.reply_text(msg, parse_mode="Markdown")
-                    else:
-                        try:
-                            await context.bot.send_message(update.effective_chat.id, msg, parse_mode="Markdown")
-                        except Exception:
-                            print("📋 Không thể gửi danh sách coinlist")
+                msg += f"✅ `{symbol}` ({full_name})\n"
+                msg += f"   ⏰ {weekday}, {date_str}\n\n"
+                count += 1
+            
+        if count == 0:
+            if getattr(update, "effective_message", None):
+                await update.effective_message.reply_text("📋 Không có coin nào list trong tuần qua")
+            else:
+                try:
+                    await context.bot.send_message(update.effective_chat.id, "📋 Không có coin nào list trong tuần qua")
+                except Exception:
+                    print("📋 Không thể gửi coinlist (no message)")
+        else:
+            if getattr(update, "effective_message", None):
+                await update.effective_message.reply_text(msg, parse_mode="Markdown")
+            else:
+                try:
+                    await context.bot.send_message(update.effective_chat.id, msg, parse_mode="Markdown")
+                except Exception:
+                    print("📋 Không thể gửi danh sách coinlist")
     
     except Exception as e:
         print(f"❌ Lỗi scrape Futures listing: {e}")
@@ -1351,15 +3720,15 @@ async def job_scan_pumps_dumps(context):
     
     print("🔍 Đang quét tất cả coin...")
     
-    async with aiohttp.ClientSession() as session:
-        # Lấy danh sách tất cả symbols
-        global ALL_SYMBOLS
-        if not ALL_SYMBOLS:
-            ALL_SYMBOLS = await get_all_symbols(session)
-            print(f"✅ Tìm thấy {len(ALL_SYMBOLS)} coin")
-        
-        # Tính movers cho tất cả coin
-        movers = await calc_movers(session, "Min1", ALL_SYMBOLS)
+    session = get_http_session()
+    # Lấy danh sách tất cả symbols
+    global ALL_SYMBOLS
+    if not ALL_SYMBOLS:
+        ALL_SYMBOLS = await get_all_symbols(session)
+        print(f"✅ Tìm thấy {len(ALL_SYMBOLS)} coin")
+    
+    # Tính movers cho tất cả coin
+    movers = await calc_movers(session, "Min1", ALL_SYMBOLS)
     
     if not movers:
         return
@@ -1390,33 +3759,36 @@ async def job_scan_pumps_dumps(context):
             text += f"\n\n... và {len(alerts) - 10} coin khác"
         
         for chat in SUBSCRIBERS:
-            try:
-                await context.bot.send_message(
-                    chat, 
-                    text, 
-                    parse_mode="Markdown",
-                    disable_web_page_preview=True  # Tắt preview link
-                )
-            except Exception as e:
-                print(f"❌ Lỗi gửi tin nhắn: {e}")
+            TELEGRAM_SCHEDULER.submit(
+                context.bot,
+                chat,
+                text,
+                ALERT_PRIORITY_PUMP,
+                parse_mode="Markdown",
+                disable_web_page_preview=True  # Tắt preview link
+            )
 
 
 async def job_new_listing(context):
     """Job phát hiện coin mới list bằng cách so sánh danh sách"""
+    session = get_http_session()
+    try:
+        symbols = await get_all_symbols(session)
+    except:
+        return
+    
+    # Sub/unsub coin mới/delist trên socket đang mở (kể cả khi chưa có subscriber)
+    await apply_universe(symbols)
+    
     if not SUBSCRIBERS:
         return
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            symbols = await get_all_symbols(session)
-        except:
-            return
     
     global KNOWN_SYMBOLS
     
     # Lần đầu chạy: lưu danh sách hiện tại
     if not KNOWN_SYMBOLS:
         KNOWN_SYMBOLS = set(symbols)
+        DATA_STORE.save_symbols(KNOWN_SYMBOLS)
         print(f"✅ Đã lưu {len(KNOWN_SYMBOLS)} coin ban đầu")
         return
     
@@ -1430,240 +3802,122 @@ async def job_new_listing(context):
             coin = sym.replace("_USDT", "")
             alerts.append(f"🆕 *COIN MỚI LIST:* `{coin}`")
             print(f"🆕 NEW LISTING: {sym}")
+        
+        DATA_STORE.save_symbols(new_coins)  # Lưu danh sách coin mới
+        
+        # Gửi thông báo
+        text = "\n".join(alerts)
+        
+        # Gửi vào channel nếu có
+        if CHANNEL_ID:
+            TELEGRAM_SCHEDULER.submit(context.bot, CHANNEL_ID, text, ALERT_PRIORITY_INFO, parse_mode="Markdown")
+        
+        # Gửi cho subscribers cá nhân
+        for chat in SUBSCRIBERS:
+            TELEGRAM_SCHEDULER.submit(context.bot, chat, text, ALERT_PRIORITY_INFO, parse_mode="Markdown")
 
 
 async def job_ema200_scan(context):
     """Job quét EMA 200 mỗi 5 phút và gửi alert khi có coin mới vào vùng proximity"""
     try:
-        async with aiohttp.ClientSession() as session:
-            # Detect coins near EMA 200
-            results = await detect_ema200_proximity(session, ALL_SYMBOLS)
-            
-            # Track coins đã alert để tránh spam
-            global EMA200_ALERTED
-            now = datetime.now()
-            
-            new_alerts = []  # [(timeframe, symbol, ema200, current_price, distance), ...]
+        session = get_http_session()
+        # Detect coins near EMA 200
+        results = await detect_ema200_proximity(session, ALL_SYMBOLS)
+        
+        # Track coins đã alert để tránh spam (dùng chung cooldown với realtime check)
+        now = time.monotonic()
+        
+        new_alerts = []  # [(timeframe, symbol, ema200, current_price, distance), ...]
+        
+        for timeframe in EMA_TIMEFRAMES:
+            coins = results[timeframe]
             
-            for timeframe in EMA_TIMEFRAMES:
-                coins = results[timeframe]
-                
-                for symbol, ema200, current_price, distance in coins:
-                    # Kiểm tra xem đã alert coin này ở timeframe này chưa
-                    if symbol not in EMA200_ALERTED:
-                        EMA200_ALERTED[symbol] = {}
-                    
-                    last_alert = EMA200_ALERTED[symbol].get(timeframe)
-                    
-                    # Chỉ alert nếu:
-                    # 1. Chưa từng alert coin này ở timeframe này, HOẶC
-                    # 2. Đã qua 30 phút kể từ lần alert cuối
-                    should_alert = False
-                    if last_alert is None:
-                        should_alert = True
-                    else:
-                        time_since_alert = (now - last_alert).total_seconds()
-                        if time_since_alert > 1800:  # 30 phút
-                            should_alert = True
-                    
-                    if should_alert:
-                        new_alerts.append((timeframe, symbol, ema200, current_price, distance))
-                        EMA200_ALERTED[symbol][timeframe] = now
+            for symbol, ema200, current_price, distance in coins:
+                # Chỉ alert nếu chưa từng alert coin này ở timeframe này, HOẶC đã qua 30 phút
+                row = CANDLE_STORE.row(symbol)
+                if CANDLE_STORE.ema_cooldown_ok(row, timeframe, now):
+                    new_alerts.append((timeframe, symbol, ema200, current_price, distance))
+                    CANDLE_STORE.ema_alerted[timeframe][row] = now
+        
+        # Nếu có alert mới, gửi thông báo
+        if new_alerts and (CHANNEL_ID or SUBSCRIBERS):
+            # Chia theo chat (bỏ coin đã mute), format 1 lần cho mỗi bộ alert
+            # (nhóm theo timeframe, tách tin nếu quá 4096 ký tự)
+            recipients = ema_items_per_chat([
+                (symbol, tf, distance) for tf, symbol, ema200, current_price, distance in new_alerts
+            ])
+            rendered = {}
             
-            # Nếu có alert mới, gửi thông báo
-            if new_alerts and (CHANNEL_ID or SUBSCRIBERS):
-                # Group alerts theo timeframe
-                alerts_by_tf = {}
-                for tf, symbol, ema200, current_price, distance in new_alerts:
-                    if tf not in alerts_by_tf:
-                        alerts_by_tf[tf] = []
-                    alerts_by_tf[tf].append((symbol, ema200, current_price, distance))
-                
-                # Format message
-                msg_parts = ["🎯 *EMA 200 ALERT*\n"]
-                
-                for timeframe in EMA_TIMEFRAMES:
-                    if timeframe not in alerts_by_tf:
-                        continue
-                    
-                    tf_label = EMA_TIMEFRAME_LABELS[timeframe]
-                    msg_parts.append(f"\n🕐 *{tf_label}*")
-                    
-                    for symbol, ema200, current_price, distance in alerts_by_tf[timeframe]:
-                        coin_name = symbol.replace("_USDT", "")
-                        
-                        # Icon và status
-                        if abs(distance) <= 0.3:
-                            icon = "🎯"
-                            status = "CHẠM"
-                        elif distance > 0:
-                            icon = "🟢"
-                            status = "trên"
-                        else:
-                            icon = "🔴"
-                            status = "dưới"
-                        
-                        link = f"https://www.mexc.co/futures/{symbol}"
-                        msg_parts.append(
-                            f"{icon} [{coin_name}]({link}) {status} EMA200 `{distance:+.2f}%`"
-                        )
-                
-                msg = "\n".join(msg_parts)
-                
-                # Gửi alert
-                tasks = []
-                
-                if CHANNEL_ID:
-                    tasks.append(
-                        context.bot.send_message(
-                            CHANNEL_ID,
-                            msg,
-                            parse_mode="Markdown",
-                            disable_web_page_preview=True
-                        )
-                    )
-                
-                for chat in SUBSCRIBERS:
-                    # Kiểm tra xem user có bật EMA alerts không
-                    ema_enabled = EMA_ALERTS_ENABLED.get(chat, True)  # Mặc định: bật
-                    if not ema_enabled:
-                        continue
-                    
-                    tasks.append(
-                        context.bot.send_message(
-                            chat,
-                            msg,
-                            parse_mode="Markdown",
-                            disable_web_page_preview=True
-                        )
+            # Gửi alert
+            for chat, items in recipients.items():
+                key = tuple(items)
+                if key not in rendered:
+                    rendered[key] = split_message(fmt_ema_alerts(items), header="🎯 *EMA 200 ALERT*\n\n")
+                for msg in rendered[key]:
+                    TELEGRAM_SCHEDULER.submit(
+                        context.bot,
+                        chat,
+                        msg,
+                        ALERT_PRIORITY_EMA,
+                        parse_mode="Markdown",
+                        disable_web_page_preview=True
                     )
-
-                
-                if tasks:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    print(f"✅ Sent EMA 200 alerts for {len(new_alerts)} coins")
+            
+            if recipients:
+                print(f"✅ Queued EMA 200 alerts for {len(new_alerts)} coins")
     
     except Exception as e:
         print(f"❌ Error in job_ema200_scan: {e}")
 
-        
-        save_data()  # Lưu danh sách coin mới
-        
-        # Gửi thông báo
-        text = "\n".join(alerts)
-        
-        # Gửi vào channel nếu có
-        if CHANNEL_ID:
-            try:
-                await context.bot.send_message(CHANNEL_ID, text, parse_mode="Markdown")
-            except Exception as e:
-                print(f"❌ Lỗi gửi thông báo coin mới vào channel: {e}")
-        
-        # Gửi cho subscribers cá nhân
-        for chat in SUBSCRIBERS:
-            try:
-                await context.bot.send_message(chat, text, parse_mode="Markdown")
-            except Exception as e:
-                print(f"❌ Lỗi gửi thông báo coin mới: {e}")
-
 
-async def job_schedule_restarts(context):
-    """Job lên lịch restart bot khi có coin mới list"""
-    async with aiohttp.ClientSession() as session:
-        try:
-            # Gọi API calendar để lấy lịch listing
-            timestamp = int(datetime.now().timestamp() * 1000)
-            url = f"https://www.mexc.co/api/operation/new_coin_calendar?timestamp={timestamp}"
+async def job_schedule_listing_refresh(context):
+    """Job lên lịch cập nhật universe (không restart) khi có coin mới list"""
+    session = get_http_session()
+    try:
+        # Gọi API calendar (qua REST_LIMITER)
+        coins = await get_new_coin_calendar(session)
+        if not coins:
+            return
             
-            async with session.get(url, timeout=15) as r:
-                if r.status != 200:
-                    return
-                
-                data = await r.json()
-                coins = data.get('data', {}).get('newCoins', [])
-                
-                if not coins:
-                    return
+        vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
+        now = datetime.now(vn_tz)
+        next_24h = now + timedelta(hours=24)
+            
+        for coin in coins:
+            timestamp_ms = coin.get('firstOpenTime')
+            if not timestamp_ms:
+                continue
                 
-                vn_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-                now = datetime.now(vn_tz)
-                next_24h = now + timedelta(hours=24)
+            # Convert timestamp sang giờ VN
+            dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
+            list_time = dt_utc.astimezone(vn_tz)
                 
-                for coin in coins:
-                    timestamp_ms = coin.get('firstOpenTime')
-                    if not timestamp_ms:
-                        continue
+            # Chỉ schedule cho coin list trong 24h tới
+            if now <= list_time <= next_24h:
+                # Tránh schedule trùng
+                if timestamp_ms in SCHEDULED_REFRESHES:
+                    continue
                     
-                    # Convert timestamp sang giờ VN
-                    dt_utc = datetime.fromtimestamp(timestamp_ms / 1000, tz=pytz.UTC)
-                    list_time = dt_utc.astimezone(vn_tz)
+                SCHEDULED_REFRESHES.add(timestamp_ms)
                     
-                    # Chỉ schedule cho coin list trong 24h tới
-                    if now <= list_time <= next_24h:
-                        # Tránh schedule trùng
-                        if timestamp_ms in SCHEDULED_RESTARTS:
-                            continue
-                        
-                        SCHEDULED_RESTARTS.add(timestamp_ms)
+                # Tính thời gian chờ
+                wait_seconds = (list_time - now).total_seconds()
+                wait_seconds_plus_1h = wait_seconds + 3600  # +1 tiếng
+                    
+                if wait_seconds > 0:
+                    coin_name = coin.get('vcoinName', 'Unknown')
+                    print(f"📅 Đã lên lịch cập nhật universe cho {coin_name}:")
+                    print(f"   - Lần 1: {list_time.strftime('%d/%m %H:%M')} ({wait_seconds/60:.0f} phút)")
+                    print(f"   - Lần 2: {(list_time + timedelta(hours=1)).strftime('%d/%m %H:%M')} (sau 1h)")
                         
-                        # Tính thời gian chờ
-                        wait_seconds = (list_time - now).total_seconds()
-                        wait_seconds_plus_1h = wait_seconds + 3600  # +1 tiếng
+                    # Lần 1 (đúng giờ list)
+                    context.job_queue.run_once(job_refresh_universe, wait_seconds)
                         
-                        if wait_seconds > 0:
-                            coin_name = coin.get('vcoinName', 'Unknown')
-                            print(f"📅 Đã lên lịch restart cho {coin_name}:")
-                            print(f"   - Restart 1: {list_time.strftime('%d/%m %H:%M')} ({wait_seconds/60:.0f} phút)")
-                            print(f"   - Restart 2: {(list_time + timedelta(hours=1)).strftime('%d/%m %H:%M')} (sau 1h)")
-                            
-                            # Schedule restart lần 1 (đúng giờ list)
-                            context.job_queue.run_once(
-                                restart_bot,
-                                wait_seconds,
-                                data={"reason": f"Coin mới list: {coin_name}"}
-                            )
-                            
-                            # Schedule restart lần 2 (sau 1 tiếng)
-                            context.job_queue.run_once(
-                                restart_bot,
-                                wait_seconds_plus_1h,
-                                data={"reason": f"Restart lần 2 sau khi {coin_name} list"}
-                            )
-        
-        except Exception as e:
-            print(f"❌ Lỗi schedule restart: {e}")
-
-
-async def restart_bot(context):
-    """Restart bot để load coin mới"""
-    reason = context.job.data.get("reason", "Scheduled restart")
-    
-    print(f"🔄 BOT ĐANG RESTART: {reason}")
-    
-    # Gửi thông báo cho channel và users
-    msg = f"🔄 *Bot đang khởi động lại*\n\n_{reason}_"
-    
-    # Gửi vào channel
-    if CHANNEL_ID:
-        try:
-            await context.bot.send_message(CHANNEL_ID, msg, parse_mode="Markdown")
-        except:
-            pass
-    
-    # Gửi cho subscribers
-    for chat in SUBSCRIBERS:
-        try:
-            await context.bot.send_message(chat, msg, parse_mode="Markdown")
-        except:
-            pass
-    
-    # Đợi 2 giây để gửi hết tin nhắn
-    await asyncio.sleep(2)
+                    # Lần 2 (sau 1 tiếng - phòng khi contract mở trễ)
+                    context.job_queue.run_once(job_refresh_universe, wait_seconds_plus_1h)
     
-    # Restart bot bằng cách stop application
-    print("🔄 Stopping application for restart...")
-    await context.application.stop()
-    await context.application.shutdown()
+    except Exception as e:
+        print(f"❌ Lỗi schedule cập nhật universe: {e}")
 
 
 # ================== MAIN ==================
@@ -1671,6 +3925,10 @@ async def post_init(app):
     """Set bot commands menu"""
     from telegram import BotCommand
     
+    # HTTP client dùng chung cho mọi REST call
+    get_http_session()
+    await start_metrics_server()
+    
     # Kiểm tra bot token hoạt động (retry với delay dài hơn)
     for conn_attempt in range(5):
         try:
@@ -1717,6 +3975,17 @@ async def post_init(app):
                 print("⚠️ Skip set commands, bot vẫn hoạt động bình thường")
 
 
+async def post_shutdown(app):
+    """Dọn dẹp khi bot dừng"""
+    if TICK_RECORDER:
+        await TICK_RECORDER.flush()
+    await save_candle_cache()
+    await close_http_session()
+    await stop_metrics_server()
+    await DATA_STORE.flush()
+    DATA_STORE.close()
+
+
 def main():
     # Tăng timeout cho Telegram API (Railway có thể chậm)
     from telegram.request import HTTPXRequest
@@ -1728,7 +3997,7 @@ def main():
         pool_timeout=60.0
     )
     
-    app = ApplicationBuilder().token(BOT_TOKEN).request(request).post_init(post_init).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).request(request).post_init(post_init).post_shutdown(post_shutdown).build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("subscribe", subscribe))
@@ -1747,6 +4016,9 @@ def main():
     app.add_handler(CommandHandler("ema200", ema200))
     app.add_handler(CommandHandler("timelist", timelist))
     app.add_handler(CommandHandler("coinlist", coinlist))
+    app.add_handler(CommandHandler("status", status))
+    app.add_handler(CommandHandler("profile", profile))
+    app.add_handler(CommandHandler("memsnap", memsnap))
 
 
     jq = app.job_queue
@@ -1758,12 +4030,18 @@ def main():
         # Tải dữ liệu đã lưu (subscribers, modes, muted coins)
         load_data()
         
-        async with aiohttp.ClientSession() as session:
-            ALL_SYMBOLS = await get_all_symbols(session)
-            print(f"✅ Tìm thấy {len(ALL_SYMBOLS)} coin")
+        session = get_http_session()
+        ALL_SYMBOLS = await get_all_symbols(session)
+        print(f"✅ Tìm thấy {len(ALL_SYMBOLS)} coin")
         
-        # Khởi động WebSocket stream
+        # Nạp candle cache từ lần chạy trước (nếu có)
+        await load_candle_cache()
+        
+        # Khởi động WebSocket stream + warm-up EMA chạy nền
         asyncio.create_task(websocket_stream(context))
+        asyncio.create_task(init_candle_buffers(session))
+        if EMA_CHECK_MODE == "batch":
+            asyncio.create_task(ema_proximity_batch_loop(context))
     
     # Chạy init ngay khi khởi động
     jq.run_once(init_websocket, 5)
@@ -1777,8 +4055,11 @@ def main():
     # Quét EMA 200 mỗi 5 phút
     jq.run_repeating(job_ema200_scan, 300, first=90)
     
-    # Schedule restart cho coin mới list (chạy mỗi 30 phút để cập nhật lịch)
-    jq.run_repeating(job_schedule_restarts, 1800, first=60)
+    # Lưu candle cache định kỳ
+    jq.run_repeating(job_save_candle_cache, CANDLE_CACHE_INTERVAL, first=CANDLE_CACHE_INTERVAL)
+    
+    # Schedule cập nhật universe cho coin mới list (chạy mỗi 30 phút để cập nhật lịch)
+    jq.run_repeating(job_schedule_listing_refresh, 1800, first=60)
 
 
     print("🔥 Bot quét MEXC Futures...")
@@ -1786,7 +4067,7 @@ def main():
     print(f"📊 Ngưỡng dump: <= {DUMP_THRESHOLD}%")
     print(f"💰 Volume tối thiểu: {MIN_VOL_THRESHOLD:,}")
     print("🌐 WebSocket: Realtime price streaming")
-    print("📅 Auto-restart khi có coin mới list")
+    print("📅 Tự cập nhật coin mới list (không restart)")
     
     # Chạy với graceful shutdown và auto-restart
     while True:
@@ -1795,7 +4076,6 @@ def main():
             app.run_polling(drop_pending_updates=True)
             # Nếu run_polling kết thúc bình thường (restart) → restart lại
             print("🔄 Bot stopped, restarting in 3 seconds...")
-            import time
             time.sleep(3)
         except KeyboardInterrupt:
             print("🛑 Bot đang tắt...")
@@ -1803,7 +4083,6 @@ def main():
         except Exception as e:
             print(f"❌ Bot error: {e}")
             print("🔄 Restarting in 5 seconds...")
-            import time
             time.sleep(5)
 
 
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Cho phép import mexc_futures_bot từ thư mục gốc repo
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import mexc_futures_bot as bot  # noqa: E402
+
+
+class FakeBot:
+    """Ghi (monotonic, chat, text) lúc gửi; failures: text → list lỗi raise ở các lần gửi tiếp theo"""
+
+    def __init__(self, failures=None, delay=0.0):
+        self.sent = []
+        self.failures = failures or {}
+        self.delay = delay
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.delay)
+        errors = self.failures.get(text)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((time.monotonic(), chat_id, text))
+
+
+class FakeScheduler:
+    """Thay TELEGRAM_SCHEDULER: ghi (chat, text) thay vì gửi"""
+
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, bot_, chat_id, text, priority=None, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class FakeContext:
+    """context của handler / job Telegram: chỉ dùng .bot"""
+
+    def __init__(self, bot_=None):
+        self.bot = bot_
+
+
+@pytest.fixture
+def fake_bot():
+    """Factory FakeBot(failures=None, delay=0.0)"""
+    return FakeBot
+
+
+@pytest.fixture
+def fake_scheduler(monkeypatch):
+    fake = FakeScheduler()
+    monkeypatch.setattr(bot, "TELEGRAM_SCHEDULER", fake)
+    return fake
+
+
+@pytest.fixture
+def fake_context():
+    return FakeContext()
+
+
+@pytest.fixture
+def chat_settings(monkeypatch):
+    """Cài đặt chat rỗng (không channel, không subscriber, mode / mute / toggle mặc định) - test tự điền"""
+    monkeypatch.setattr(bot, "CHANNEL_ID", None)
+    for name in ("SUBSCRIBERS", "ALERT_MODE", "MUTED_COINS", "PUMPDUMP_ALERTS_ENABLED", "EMA_ALERTS_ENABLED"):
+        monkeypatch.setattr(bot, name, type(getattr(bot, name))())
+    monkeypatch.setattr(bot, "ALERT_ROUTER", bot.AlertRouter())
+    return bot
@@ -0,0 +1,104 @@
+"""AlertCoalescer: alert trong 1 cửa sổ gộp thành 1 tin cho mỗi chat, chỉ gồm alert chat đó nhận (mode / mute / toggle)"""
+import pytest
+
+import mexc_futures_bot as bot
+
+
+@pytest.fixture
+def chats(chat_settings):
+    bot.SUBSCRIBERS.update({1, 2})
+    bot.ALERT_ROUTER.rebuild()
+
+
+def messages_for(fake, chat):
+    return [text for c, text in fake.sent if c == chat]
+
+
+def text_for(fake, chat):
+    return "\n".join(messages_for(fake, chat))
+
+
+def test_pumps_coalesced_into_one_message_per_chat(chats, fake_scheduler):
+    coalescer = bot.AlertCoalescer(2, auto_flush=False)
+    coalescer.add_pump(None, "A_USDT", 1.0, 1.04, 4.0)
+    coalescer.add_pump(None, "B_USDT", 1.0, 0.88, -12.0)
+    coalescer.add_pump(None, "A_USDT", 1.0, 1.05, 5.0)  # Alert mới hơn của cùng coin thay alert cũ
+    coalescer.flush()
+
+    for chat in (1, 2):
+        [msg] = messages_for(fake_scheduler, chat)
+        assert msg.startswith("📊 *2 COIN BIẾN ĐỘNG*")
+        assert msg.index("[B]") < msg.index("[A]")  # |%| giảm dần
+        assert "+5.00%" in msg and "+4.00%" not in msg
+    assert coalescer.pumps == {} and coalescer.emas == {}
+
+
+def test_pump_and_ema_in_same_window(chats, fake_scheduler):
+    coalescer = bot.AlertCoalescer(2, auto_flush=False)
+    coalescer.add_pump(None, "A_USDT", 1.0, 1.04, 4.0)
+    coalescer.add_ema(None, "C_USDT", [("Min5", 1.0, 0.2), ("Min15", 1.0, -0.4)])
+    coalescer.flush()
+
+    pump, ema = messages_for(fake_scheduler, 1)
+    assert "[A]" in pump
+    assert ema.startswith("🎯 *EMA 200 ALERT*") and ema.count("[C]") == 2
+
+
+def test_alert_mode_filters_per_chat(chats, fake_scheduler):
+    bot.ALERT_MODE[2] = 3  # Chỉ nhận ≥10%
+    bot.ALERT_ROUTER.update_chat(2)
+    coalescer = bot.AlertCoalescer(2, auto_flush=False)
+    coalescer.add_pump(None, "A_USDT", 1.0, 1.04, 4.0)
+    coalescer.add_pump(None, "B_USDT", 1.0, 0.88, -12.0)
+    coalescer.flush()
+
+    [msg] = messages_for(fake_scheduler, 2)
+    assert "[B]" in msg and "[A]" not in msg
+
+
+
+def test_muted_chat_gets_no_ema_block_for_symbol(chats, fake_scheduler):
+    bot.MUTED_COINS[2] = {"X_USDT"}
+    bot.ALERT_ROUTER.rebuild()
+    coalescer = bot.AlertCoalescer(2, auto_flush=False)
+    coalescer.add_ema(None, "X_USDT", [("Min5", 1.0, 0.2), ("Min15", 1.0, -0.4)])
+    coalescer.add_ema(None, "Y_USDT", [("Min5", 1.0, 0.1)])
+    coalescer.flush()
+
+    assert "[X]" in text_for(fake_scheduler, 1)
+    assert "[Y]" in text_for(fake_scheduler, 1)
+    assert "[X]" not in text_for(fake_scheduler, 2)
+    assert "[Y]" in text_for(fake_scheduler, 2)
+
+
+def test_chat_with_only_muted_ema_gets_nothing(chats, fake_scheduler):
+    bot.MUTED_COINS[2] = {"X_USDT"}
+    bot.ALERT_ROUTER.rebuild()
+    coalescer = bot.AlertCoalescer(2, auto_flush=False)
+    coalescer.add_ema(None, "X_USDT", [("Min5", 1.0, 0.2)])
+    coalescer.flush()
+
+    assert [chat for chat, _ in fake_scheduler.sent] == [1]
+
+def test_split_keeps_blocks_within_limit():
+    header = "🎯 *EMA 200 ALERT*\n\n"
+    blocks = [f"🕐 *M{i}*\n" + "🟢 line\n" * 40 for i in range(30)]
+    messages = bot.split_message(blocks, header=header)
+    assert len(messages) > 1
+    for msg in messages:
+        assert msg.startswith(header)
+        assert bot.telegram_len(msg) <= bot.TELEGRAM_MESSAGE_LIMIT
+    body = "\n\n".join(msg[len(header):] for msg in messages)
+    assert body == "\n\n".join(blocks)  # Không mất / cắt ngang block nào
+
+
+@pytest.mark.parametrize("prefix", ["", "x"])  # Lệch 1 unit → giới hạn rơi giữa surrogate pair
+def test_split_long_emoji_line_within_utf16_limit(prefix):
+    header = "🎯 *EMA 200 ALERT*\n\n"
+    line = prefix + "🚀" * 3000  # 1 dòng, 6000+ UTF-16 unit
+    messages = bot.split_message(["ok", line], header=header)
+    assert messages
+    for msg in messages:
+        assert msg.startswith(header)
+        assert bot.telegram_len(msg) <= bot.TELEGRAM_MESSAGE_LIMIT
+        msg.encode("utf-8")  # Không còn nửa surrogate pair
@@ -0,0 +1,104 @@
+"""AlertRouter phải khớp filter duyệt SUBSCRIBERS cũ: ALERT_MODE 1/2/3 × toggle × mute, luôn gồm CHANNEL_ID"""
+import random
+
+import pytest
+
+import mexc_futures_bot as bot
+
+CHATS = range(1, 9)
+SYMBOLS = ["A_USDT", "B_USDT", "C_USDT"]
+CHANGES = [3.0, bot.MODERATE_MAX, bot.MODERATE_MAX + 0.01, bot.EXTREME_THRESHOLD - 0.01, bot.EXTREME_THRESHOLD, 25.0]
+
+
+def baseline_pump(symbol, abs_change):
+    """Filter pump/dump bản gốc (trước AlertRouter)"""
+    recipients = [bot.CHANNEL_ID] if bot.CHANNEL_ID else []
+    for chat in bot.SUBSCRIBERS:
+        if not bot.PUMPDUMP_ALERTS_ENABLED.get(chat, True):
+            continue
+        if chat in bot.MUTED_COINS and symbol in bot.MUTED_COINS[chat]:
+            continue
+        mode = bot.ALERT_MODE.get(chat, 1)
+        if mode == 2 and abs_change > bot.MODERATE_MAX:
+            continue
+        if mode == 3 and abs_change < bot.EXTREME_THRESHOLD:
+            continue
+        recipients.append(chat)
+    return recipients
+
+
+def baseline_ema(symbol):
+    """Filter EMA bản gốc + bỏ coin đã mute"""
+    recipients = [bot.CHANNEL_ID] if bot.CHANNEL_ID else []
+    for chat in bot.SUBSCRIBERS:
+        if not bot.EMA_ALERTS_ENABLED.get(chat, True):
+            continue
+        if chat in bot.MUTED_COINS and symbol in bot.MUTED_COINS[chat]:
+            continue
+        recipients.append(chat)
+    return recipients
+
+
+def assert_parity(router):
+    for symbol in SYMBOLS:
+        for change in CHANGES:
+            got = router.recipients("pump", bot.severity_band(change), symbol)
+            want = baseline_pump(symbol, change)
+            if bot.CHANNEL_ID:
+                assert got[0] == bot.CHANNEL_ID  # Channel luôn nhận, đứng đầu
+            assert sorted(map(str, got)) == sorted(map(str, want)), (symbol, change)
+        got = router.recipients("ema", symbol=symbol)
+        want = baseline_ema(symbol)
+        if bot.CHANNEL_ID:
+            assert got[0] == bot.CHANNEL_ID
+        assert sorted(map(str, got)) == sorted(map(str, want)), symbol
+
+
+def random_change(rnd, router):
+    """1 thay đổi setting như các command handler: sửa global rồi báo router"""
+    chat = rnd.choice(CHATS)
+    action = rnd.randrange(6)
+    if action == 0:
+        bot.SUBSCRIBERS.add(chat)
+    elif action == 1:
+        bot.SUBSCRIBERS.discard(chat)
+    elif action == 2:
+        bot.ALERT_MODE[chat] = rnd.choice([1, 2, 3])
+    elif action == 3:
+        bot.PUMPDUMP_ALERTS_ENABLED[chat] = rnd.random() < 0.5
+    elif action == 4:
+        bot.EMA_ALERTS_ENABLED[chat] = rnd.random() < 0.5
+    if action <= 4:
+        router.update_chat(chat)
+        return
+    symbol = rnd.choice(SYMBOLS)
+    muted = bot.MUTED_COINS.setdefault(chat, set())
+    if symbol in muted:
+        muted.remove(symbol)
+        router.unmute(chat, symbol)
+    else:
+        muted.add(symbol)
+        router.mute(chat, symbol)
+
+
+@pytest.mark.parametrize("channel", [None, "@alerts"])
+@pytest.mark.parametrize("seed", range(3))
+def test_router_matches_baseline_filter(chat_settings, monkeypatch, channel, seed):
+    monkeypatch.setattr(bot, "CHANNEL_ID", channel)
+    rnd = random.Random(seed)
+    router = bot.ALERT_ROUTER
+    for _ in range(1000):
+        random_change(rnd, router)
+        assert_parity(router)
+
+    # Dựng lại từ global (như sau load_data) → cùng kết quả
+    router.rebuild()
+    assert_parity(router)
+
+
+def test_channel_included_without_subscribers(chat_settings, monkeypatch):
+    monkeypatch.setattr(bot, "CHANNEL_ID", "@alerts")
+    bot.ALERT_ROUTER.rebuild()
+    for band in bot.SEVERITY_BANDS:
+        assert bot.ALERT_ROUTER.recipients("pump", band, "A_USDT") == ["@alerts"]
+    assert bot.ALERT_ROUTER.recipients("ema", symbol="A_USDT") == ["@alerts"]
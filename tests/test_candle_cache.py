@@ -0,0 +1,80 @@
+"""Candle cache: lấp gap sau khi load phải cho EMA giống seed toàn bộ (kể cả khi kline stream chạy trước), bỏ coin ngoài universe"""
+import asyncio
+import time
+
+import pytest
+
+import mexc_futures_bot as bot
+
+TF = "Min1"
+STEP = bot.EMA_TIMEFRAME_SECONDS[TF]
+N = 600
+
+
+@pytest.fixture
+def history(monkeypatch):
+    now = int(time.time()) // STEP * STEP
+    times = [now - (N - 1 - i) * STEP for i in range(N)]
+    closes = [100 + ((i * 37) % 23 - 11) * 0.05 + i * 0.001 for i in range(N)]
+
+    async def fake_kline_closes(session, symbol, interval="Min5", start=None):
+        await asyncio.sleep(0.01)
+        if start:
+            i = times.index(start)
+            return times[i:], closes[i:]
+        return times, closes
+
+    async def fake_tickers(session):
+        return {}
+
+    monkeypatch.setattr(bot, "get_kline_closes", fake_kline_closes)
+    monkeypatch.setattr(bot, "get_all_tickers", fake_tickers)
+    monkeypatch.setattr(bot, "EMA_TIMEFRAMES", [TF])
+    bot.WARMUP_DONE.clear()
+    return times, closes
+
+
+def load_stale_cache(monkeypatch, times, closes):
+    """Cache lưu lúc candle 400 còn đang chạy (close chưa chốt)"""
+    source = bot.CandleStore([TF])
+    source.seed("X_USDT", TF, times[:401], closes[:400] + [closes[400] * 1.01])
+    store = bot.CandleStore([TF])
+    store.import_timeframe(TF, source.export_timeframe(TF))
+    monkeypatch.setattr(bot, "CANDLE_STORE", store)
+    return store
+
+
+@pytest.mark.parametrize("stream_before, stream_during", [(False, False), (True, False), (False, True)])
+def test_gap_fill_matches_full_seed(monkeypatch, history, stream_before, stream_during):
+    times, closes = history
+    store = load_stale_cache(monkeypatch, times, closes)
+
+    async def run():
+        if stream_before:
+            bot.update_candle_buffer("X_USDT", TF, closes[-1], times[-1])
+        task = asyncio.create_task(bot.init_candle_buffers(None, ["X_USDT"]))
+        if stream_during:
+            await asyncio.sleep(0.005)  # Worker đang chờ REST lấy gap
+            bot.update_candle_buffer("X_USDT", TF, closes[-1], times[-1])
+        await task
+
+    asyncio.run(run())
+    assert store.get_ema("X_USDT", TF) == pytest.approx(bot.calculate_ema(closes[:-1], bot.EMA_PERIOD), rel=1e-12)
+    assert int(store.count[TF][store.index["X_USDT"]]) == N - 1
+
+
+def test_cache_skips_symbols_outside_universe(monkeypatch, tmp_path):
+    source = bot.CandleStore([TF])
+    times = [i * STEP for i in range(bot.EMA_PERIOD + 1)]
+    for symbol in ("X_USDT", "DELISTED_USDT"):
+        source.seed(symbol, TF, times, [100.0] * len(times))
+    monkeypatch.setattr(bot, "EMA_TIMEFRAMES", [TF])
+    monkeypatch.setattr(bot, "CANDLE_CACHE_DIR", str(tmp_path))
+    bot._write_candle_cache({TF: source.export_timeframe(TF)})
+
+    store = bot.CandleStore([TF])
+    monkeypatch.setattr(bot, "CANDLE_STORE", store)
+    monkeypatch.setattr(bot, "ALL_SYMBOLS", ["X_USDT"])
+    assert asyncio.run(bot.load_candle_cache()) == 1
+    assert store.get_ema("X_USDT", TF) == pytest.approx(100.0)
+    assert "DELISTED_USDT" not in store.index
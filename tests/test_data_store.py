@@ -0,0 +1,117 @@
+"""DataStore: ghi xuống SQLite rồi đọc lại đúng; thay đổi trong lúc đang commit / commit lỗi không bị mất"""
+import asyncio
+import pickle
+import time
+
+import pytest
+
+import mexc_futures_bot as bot
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "DATA_FLUSH_INTERVAL", 0.05)
+    data_store = bot.DataStore(str(tmp_path / "bot.db"))
+    data_store.open()
+    yield data_store
+    data_store.close()
+
+
+def test_round_trip_after_reopen(store, chat_settings):
+    bot.SUBSCRIBERS.update({1, 2})
+    bot.ALERT_MODE[1] = 3
+    bot.EMA_ALERTS_ENABLED[2] = False
+    for chat in (1, 2):
+        store.save_chat(chat)
+    store.save_mute(1, "BTC_USDT", True)
+    store.save_mute(1, "ETH_USDT", True)
+    store.save_mute(1, "ETH_USDT", False)  # Unmute trước khi commit → chỉ còn BTC
+    store.save_symbols({"A_USDT", "B_USDT"})
+    store.close()  # Ngoài event loop: mỗi save đã ghi ngay, close() flush phần còn lại
+
+    reopened = bot.DataStore(store.path)
+    reopened.open()
+    try:
+        subscribers, alert_mode, muted, known, pumpdump, ema = reopened.load()
+    finally:
+        reopened.close()
+    assert subscribers == {1, 2}
+    assert alert_mode == {1: 3}
+    assert muted == {1: {"BTC_USDT"}}
+    assert known == {"A_USDT", "B_USDT"}
+    assert pumpdump == {}
+    assert ema == {2: False}
+
+
+def test_migrate_pickle(store, tmp_path):
+    path = tmp_path / "bot_data.pkl"
+    data = {
+        "subscribers": {1},
+        "alert_mode": {1: 2, 5: 3},
+        "muted_coins": {1: {"BTC_USDT"}},
+        "known_symbols": {"A_USDT"},
+        "pumpdump_alerts_enabled": {1: False},
+        "ema_alerts_enabled": {},
+    }
+    path.write_bytes(pickle.dumps(data))
+    assert store.is_empty()
+
+    store.migrate_pickle(str(path))
+    assert not path.exists() and (tmp_path / "bot_data.pkl.migrated").exists()
+    assert store.load() == ({1}, {1: 2, 5: 3}, {1: {"BTC_USDT"}}, {"A_USDT"}, {1: False}, {})
+
+
+def known_symbols(data_store):
+    return data_store.load()[3]
+
+
+def test_save_during_commit_is_flushed(store, monkeypatch):
+    commit = store._commit
+
+    def slow_commit(batch):
+        time.sleep(0.1)
+        commit(batch)
+    monkeypatch.setattr(store, "_commit", slow_commit)
+
+    async def run():
+        store.save_symbols({"A_USDT"})
+        await asyncio.sleep(0.08)  # Commit của A đang chạy trong thread
+        store.save_symbols({"B_USDT"})
+        await asyncio.sleep(0.4)
+    asyncio.run(run())
+
+    assert store.pending() == 0
+    assert known_symbols(store) == {"A_USDT", "B_USDT"}
+
+
+def test_failed_commit_is_retried(store, monkeypatch):
+    commit = store._commit
+    calls = []
+
+    def flaky_commit(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise bot.sqlite3.OperationalError("database is locked")
+        commit(batch)
+    monkeypatch.setattr(store, "_commit", flaky_commit)
+
+    async def run():
+        store.save_mute(1, "BTC_USDT", True)
+        store.save_symbols({"A_USDT"})
+        await asyncio.sleep(0.3)
+    asyncio.run(run())
+
+    assert len(calls) == 2
+    assert store.pending() == 0
+    assert known_symbols(store) == {"A_USDT"}
+    assert store.load()[2] == {1: {"BTC_USDT"}}
+
+
+def test_restore_keeps_newer_changes(store):
+    store.mutes[(1, "BTC_USDT")] = True
+    store.symbols.add("A_USDT")
+    batch = store._take()
+    store.mutes[(1, "BTC_USDT")] = False  # Unmute trong lúc batch cũ đang commit
+    store._restore(batch)
+    assert store.mutes == {(1, "BTC_USDT"): False}
+    assert store.symbols == {"A_USDT"}
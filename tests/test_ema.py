@@ -0,0 +1,105 @@
+"""EMA incremental của CandleStore phải khớp calculate_ema trên cùng chuỗi close"""
+import numpy as np
+import pytest
+
+import mexc_futures_bot as bot
+
+TF = "Min5"
+STEP = bot.EMA_TIMEFRAME_SECONDS[TF]
+PERIOD = bot.EMA_PERIOD
+
+
+def random_closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return (100 + np.cumsum(rng.normal(0, 0.5, n))).tolist()
+
+
+def candle_times(n, start=1_700_000_000):
+    start = start // STEP * STEP
+    return [start + i * STEP for i in range(n)]
+
+
+def stream(store, symbol, times, closes):
+    """Đẩy candle qua update() như kline stream (mỗi candle mới → commit candle trước)"""
+    for candle_time, close in zip(times, closes):
+        store.update(symbol, TF, float(close), int(candle_time))
+
+
+def test_rest_seeded_then_stream():
+    closes = random_closes(700)
+    times = candle_times(700)
+    store = bot.CandleStore([TF], capacity=2)
+    # REST: 301 candle (300 đã đóng + 1 đang chạy), sau đó stream tiếp
+    store.seed("A_USDT", TF, times[:301], closes[:301])
+    assert store.get_ema("A_USDT", TF) == pytest.approx(bot.calculate_ema(closes[:300], PERIOD))
+
+    stream(store, "A_USDT", times[300:], closes[300:])
+    # Candle cuối vẫn đang chạy → EMA đã commit = tất cả trừ candle cuối
+    assert store.get_ema("A_USDT", TF) == pytest.approx(bot.calculate_ema(closes[:-1], PERIOD), rel=1e-12)
+    assert store.get_live_ema("A_USDT", TF) == pytest.approx(bot.calculate_ema(closes, PERIOD), rel=1e-12)
+
+
+def test_stream_only_sma_initialised():
+    closes = random_closes(450, seed=1)
+    times = candle_times(450)
+    store = bot.CandleStore([TF], capacity=2)
+
+    # Chưa đủ PERIOD candle đã đóng → chưa có EMA
+    stream(store, "B_USDT", times[:PERIOD], closes[:PERIOD])
+    assert store.get_ema("B_USDT", TF) is None
+
+    # Candle thứ PERIOD đóng → EMA khởi tạo bằng SMA như calculate_ema
+    stream(store, "B_USDT", times[PERIOD:PERIOD + 1], closes[PERIOD:PERIOD + 1])
+    assert store.get_ema("B_USDT", TF) == pytest.approx(bot.calculate_ema(closes[:PERIOD], PERIOD), rel=1e-12)
+
+    stream(store, "B_USDT", times[PERIOD + 1:], closes[PERIOD + 1:])
+    assert store.get_ema("B_USDT", TF) == pytest.approx(bot.calculate_ema(closes[:-1], PERIOD), rel=1e-12)
+
+
+def test_ring_buffer_wraps_past_period():
+    n = PERIOD * 2 + 37
+    closes = random_closes(n, seed=2)
+    times = candle_times(n)
+    store = bot.CandleStore([TF], capacity=2)
+    store.seed("C_USDT", TF, times[:PERIOD + 51], closes[:PERIOD + 51])
+    stream(store, "C_USDT", times[PERIOD + 50:], closes[PERIOD + 50:])
+
+    committed = closes[:-1]
+    assert int(store.count[TF][store.index["C_USDT"]]) == len(committed)
+    np.testing.assert_allclose(store.window("C_USDT", TF), committed[-PERIOD:])
+    assert store.get_ema("C_USDT", TF) == pytest.approx(bot.calculate_ema(committed, PERIOD), rel=1e-12)
+
+
+def test_rows_independent_after_grow_and_remove():
+    store = bot.CandleStore([TF], capacity=1)
+    series = {f"S{i}_USDT": random_closes(260, seed=10 + i) for i in range(5)}
+    times = candle_times(260)
+    for symbol, closes in series.items():
+        stream(store, symbol, times, closes)
+    store.remove("S1_USDT")
+    for symbol, closes in series.items():
+        if symbol == "S1_USDT":
+            assert store.get_ema(symbol, TF) is None
+            continue
+        assert store.get_ema(symbol, TF) == pytest.approx(bot.calculate_ema(closes[:-1], PERIOD), rel=1e-12)
+
+
+def test_closes_view_is_read_only_view():
+    store = bot.CandleStore([TF], capacity=4)
+    stream(store, "V_USDT", candle_times(10), random_closes(10, seed=3))
+    view = store.closes_view(TF)
+    assert view.shape == (1, PERIOD)
+    assert np.shares_memory(view, store.closes[TF])  # zero-copy
+    with pytest.raises(ValueError):
+        view[0, 0] = 1.0
+
+    # Ghi vào store hiện ra ngay trong view đã lấy
+    stream(store, "V_USDT", candle_times(12)[10:], [1.0, 2.0])
+    assert view[0, 10] == 1.0
+
+
+def test_nbytes_counts_every_row_array():
+    store = bot.CandleStore([TF, "Min15"], capacity=4)
+    arrays = [v for v in vars(store).values() if isinstance(v, np.ndarray)]
+    arrays += [a for v in vars(store).values() if isinstance(v, dict) for a in v.values() if isinstance(a, np.ndarray)]
+    assert store.nbytes() == sum(a.nbytes for a in arrays)
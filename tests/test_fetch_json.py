@@ -0,0 +1,93 @@
+"""fetch_json: 4xx không thử lại, lỗi mạng / 5xx thử lại có backoff, 429 cuối cùng tính là lỗi"""
+import asyncio
+
+import aiohttp
+import pytest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL as YarlURL
+
+import mexc_futures_bot as bot
+
+URL = f"{bot.FUTURES_BASE}/api/v1/contract/kline/X_USDT"
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.headers = {"Retry-After": "0"} if status == 429 else {}
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            info = aiohttp.RequestInfo(YarlURL(URL), "GET", CIMultiDictProxy(CIMultiDict()), YarlURL(URL))
+            raise aiohttp.ClientResponseError(info, (), status=self.status, message="fake")
+
+    async def json(self):
+        return {"data": {"ok": True}}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return FakeResponse(response)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    monkeypatch.setattr(bot, "REST_LIMITER", bot.RateLimiter(1000, 1000, 1000, 10))
+    monkeypatch.setattr(bot, "REST_ERRORS", bot.MetricCounter("test_errors", "", ("endpoint",)))
+    bot.METRICS.remove(bot.REST_ERRORS)
+    calls = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args):
+        if delay >= bot.REST_RETRY_BACKOFF:  # Bỏ qua sleep ngắn của REST_LIMITER chờ token
+            calls.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(bot.asyncio, "sleep", fake_sleep)
+    return calls
+
+
+def errors():
+    return bot.REST_ERRORS.values.get((bot.rest_endpoint(URL),), 0)
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_client_error_not_retried(sleeps, status):
+    session = FakeSession([status, 200])
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(bot.fetch_json(session, URL))
+    assert session.calls == 1
+    assert errors() == 1
+    assert not sleeps
+
+
+@pytest.mark.parametrize("failure", [503, aiohttp.ClientConnectionError("reset")])
+def test_transient_error_retried_with_backoff(sleeps, failure):
+    session = FakeSession([failure, failure, 200])
+    assert asyncio.run(bot.fetch_json(session, URL)) == {"ok": True}
+    assert session.calls == 3
+    assert errors() == 2
+    assert sleeps == [bot.REST_RETRY_BACKOFF, bot.REST_RETRY_BACKOFF * 2]
+
+
+def test_final_429_counts_as_error(sleeps):
+    session = FakeSession([429, 429, 429])
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(bot.fetch_json(session, URL))
+    assert session.calls == 3
+    assert errors() == 1
+    assert bot.REST_LIMITER.throttled == 3
@@ -0,0 +1,62 @@
+"""Render /metrics đúng Prometheus text format: counter, histogram (bucket cộng dồn, _sum, _count), escape label"""
+import asyncio
+
+import pytest
+
+import mexc_futures_bot as bot
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setattr(bot, "METRICS", [])
+    return bot.METRICS
+
+
+def test_counter_and_label_escaping(metrics):
+    counter = bot.MetricCounter("t_requests_total", "Requests", ("endpoint",))
+    counter.inc("/a")
+    counter.inc("/a", amount=2)
+    counter.inc('say "hi"\\now\nnext')
+    lines = bot.render_metrics().splitlines()
+
+    assert lines[:2] == ["# HELP t_requests_total Requests", "# TYPE t_requests_total counter"]
+    assert 't_requests_total{endpoint="/a"} 3' in lines
+    assert 't_requests_total{endpoint="say \\"hi\\"\\\\now\\nnext"} 1' in lines
+
+
+def test_histogram_buckets_sum_count(metrics):
+    hist = bot.MetricHistogram("t_latency_seconds", "Latency", ("shard",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, 0)
+    lines = bot.render_metrics().splitlines()
+
+    assert "# TYPE t_latency_seconds histogram" in lines
+    assert [line for line in lines if line.startswith("t_latency_seconds")] == [
+        't_latency_seconds_bucket{shard="0",le="0.1"} 2',  # le là cận trên (bao gồm)
+        't_latency_seconds_bucket{shard="0",le="1.0"} 3',
+        't_latency_seconds_bucket{shard="0",le="+Inf"} 4',
+        't_latency_seconds_sum{shard="0"} 3.650000',
+        't_latency_seconds_count{shard="0"} 4',
+    ]
+
+
+def test_unlabelled_histogram(metrics):
+    bot.MetricHistogram("t_lag_seconds", "Lag", buckets=(1.0,)).observe(0.5)
+    lines = bot.render_metrics().splitlines()
+    assert 't_lag_seconds_bucket{le="1.0"} 1' in lines
+    assert "t_lag_seconds_sum 0.500000" in lines
+    assert "t_lag_seconds_count 1" in lines
+
+
+def test_handle_metrics_content_type(metrics):
+    response = asyncio.run(bot.handle_metrics(None))
+    assert response.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+
+def test_tickers_age_gauge(monkeypatch):
+    monkeypatch.setattr(bot, "TICKER_STREAM", bot.TickerStream())
+    assert "mexc_ws_tickers_age_seconds NaN" in bot.render_metrics().splitlines()  # Chưa nhận push.tickers
+
+    bot.TICKER_STREAM.last_push = bot.time.monotonic() - 20
+    [line] = [line for line in bot.render_metrics().splitlines() if line.startswith("mexc_ws_tickers_age_seconds ")]
+    assert float(line.split()[1]) == pytest.approx(20, abs=1)
@@ -0,0 +1,66 @@
+"""TickQueue gom tick theo coin (giữ tick mới nhất), AlertQueue có giới hạn và bỏ alert ưu tiên thấp trước"""
+import asyncio
+
+import mexc_futures_bot as bot
+
+
+def tick(symbol, price):
+    return bot.Ticker(symbol, price, 1e9)
+
+
+def drain(queue):
+    return asyncio.run(queue.drain())
+
+
+def test_tick_queue_keeps_latest_per_symbol():
+    queue = bot.TickQueue(10)
+    queue.put_many([tick("A_USDT", 1.0), tick("B_USDT", 2.0), tick("A_USDT", 1.5)])
+    batch = drain(queue)
+    assert [(t.symbol, t.price) for t in batch] == [("A_USDT", 1.5), ("B_USDT", 2.0)]
+    assert queue.stats() == {"depth": 0, "received": 3, "coalesced": 1, "dropped": 0}
+
+
+def test_tick_queue_full_drops_new_symbols_only():
+    queue = bot.TickQueue(2)
+    queue.put_many([tick("A_USDT", 1.0), tick("B_USDT", 2.0), tick("C_USDT", 3.0), tick("A_USDT", 1.1)])
+    batch = drain(queue)
+    assert [(t.symbol, t.price) for t in batch] == [("A_USDT", 1.1), ("B_USDT", 2.0)]
+    assert queue.stats()["dropped"] == 1
+
+
+def pump(symbol, change):
+    return (bot.send_pump_dump_alert, (symbol, 1.0, 1 + change / 100, change, 0.0))
+
+
+def ema(symbol):
+    return (bot.send_ema_alerts, (symbol, [("Min5", 1.0, 0.1)]))
+
+
+def take(queue):
+    async def run():
+        return [(await queue.get())[1][0] for _ in range(queue.stats()["depth"])]
+    return asyncio.run(run())
+
+
+def test_alert_queue_full_evicts_lowest_priority(capsys):
+    queue = bot.AlertQueue(3)
+    for alert in (ema("E1_USDT"), pump("P1_USDT", 4.0), ema("E2_USDT")):
+        queue.put(alert)
+    queue.put(pump("X1_USDT", 12.0))  # Đầy → bỏ EMA cũ nhất, không phải pump
+    queue.put(pump("P2_USDT", -4.0))  # Bỏ EMA còn lại
+
+    assert take(queue) == ["X1_USDT", "P1_USDT", "P2_USDT"]  # Lấy theo ưu tiên, cùng mức FIFO
+    assert queue.stats()["dropped"] == 2
+    out = capsys.readouterr().out
+    assert "send_ema_alerts E1_USDT" in out and "send_ema_alerts E2_USDT" in out
+
+
+def test_alert_queue_full_drops_new_lower_priority_alert(capsys):
+    queue = bot.AlertQueue(2)
+    queue.put(pump("X1_USDT", 15.0))
+    queue.put(pump("X2_USDT", -11.0))
+    queue.put(ema("E1_USDT"))
+
+    assert take(queue) == ["X1_USDT", "X2_USDT"]
+    assert queue.stats()["dropped"] == 1
+    assert "send_ema_alerts E1_USDT" in capsys.readouterr().out
@@ -0,0 +1,38 @@
+"""Alert pump/dump cực mạnh chỉ reset base price khi có chat nhận alert"""
+import asyncio
+
+import pytest
+
+import mexc_futures_bot as bot
+
+
+@pytest.fixture
+def state(chat_settings, monkeypatch):
+    bot.SUBSCRIBERS.add(1)
+    bot.ALERT_MODE[1] = 2  # Chỉ nhận 3-5%
+    bot.ALERT_ROUTER.rebuild()
+    monkeypatch.setattr(bot, "ALERT_COALESCER", bot.AlertCoalescer(2, auto_flush=False))
+    monkeypatch.setattr(bot, "SYMBOL_STATES", {"X_USDT": bot.SymbolState(1.0, 0.0)})
+    return bot.SYMBOL_STATES["X_USDT"]
+
+
+def send(change, context):
+    asyncio.run(bot.send_pump_dump_alert("X_USDT", 1.0, 1 + change / 100, change, 5.0, context))
+
+
+@pytest.mark.parametrize("window", [0, 2])
+def test_suppressed_extreme_alert_keeps_base(state, fake_scheduler, fake_context, monkeypatch, window):
+    monkeypatch.setattr(bot, "ALERT_COALESCE_WINDOW", window)
+    send(12.0, fake_context)  # Mode 2 bỏ qua ≥10%
+    assert state.base_price == 1.0
+    assert not bot.ALERT_COALESCER.pumps
+    assert not fake_scheduler.sent
+
+
+def test_delivered_extreme_alert_resets_base(state, fake_context, monkeypatch):
+    monkeypatch.setattr(bot, "ALERT_COALESCE_WINDOW", 2)
+    bot.ALERT_MODE[1] = 1
+    bot.ALERT_ROUTER.update_chat(1)
+    send(12.0, fake_context)
+    assert state.base_price == pytest.approx(1.12)
+    assert "X_USDT" in bot.ALERT_COALESCER.pumps
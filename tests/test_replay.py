@@ -0,0 +1,23 @@
+"""Replay fixture ghi sẵn qua detection engine phải ra đúng alert golden"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+FIXTURES = os.path.join(ROOT, "benchmarks", "fixtures")
+
+
+def test_replay_matches_golden():
+    # Chạy process riêng: replay thay time / TELEGRAM_SCHEDULER / ALERT_COALESCER của module bot
+    env = dict(os.environ, ALERT_COALESCE_WINDOW="2", EMA_CHECK_MODE="realtime")
+    result = subprocess.run(
+        [
+            sys.executable, os.path.join(ROOT, "benchmarks", "replay.py"),
+            os.path.join(FIXTURES, "replay_ticks.jsonl.gz"),
+            "--candle-cache", os.path.join(FIXTURES, "candle_cache"),
+            "--golden", os.path.join(FIXTURES, "replay_golden.json"),
+        ],
+        env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Khớp golden" in result.stdout
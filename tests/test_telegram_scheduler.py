@@ -0,0 +1,103 @@
+"""TelegramScheduler: thứ tự ưu tiên, giãn cách từng chat, RetryAfter / lỗi mạng không làm kẹt hàng đợi chat"""
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import NetworkError, RetryAfter
+
+import mexc_futures_bot as bot
+
+CHAT_INTERVAL = 0.2
+GROUP_INTERVAL = 0.3
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(bot, "TELEGRAM_CHAT_INTERVAL", CHAT_INTERVAL)
+    monkeypatch.setattr(bot, "TELEGRAM_GROUP_INTERVAL", GROUP_INTERVAL)
+    return bot.TelegramScheduler(bot.RateLimiter(1000, 1000, 1000, 16), 100)
+
+
+def run(scheduler, scenario, duration):
+    async def main():
+        await scenario()
+        await asyncio.sleep(duration)
+        scheduler._task.cancel()
+    asyncio.run(main())
+
+
+def texts(fake):
+    return [text for _, _, text in fake.sent]
+
+
+def test_priority_order(scheduler, fake_bot):
+    fake = fake_bot()
+
+    async def scenario():
+        scheduler.submit(fake, 1, "info", bot.ALERT_PRIORITY_INFO)
+        scheduler.submit(fake, 2, "ema", bot.ALERT_PRIORITY_EMA)
+        scheduler.submit(fake, 3, "pump", bot.ALERT_PRIORITY_PUMP)
+        scheduler.submit(fake, 4, "extreme", bot.ALERT_PRIORITY_EXTREME)
+        scheduler.submit(fake, 5, "pump2", bot.ALERT_PRIORITY_PUMP)
+
+    run(scheduler, scenario, 0.1)
+    assert texts(fake) == ["extreme", "pump", "pump2", "ema", "info"]
+
+
+@pytest.mark.parametrize("chat, interval", [(42, CHAT_INTERVAL), (-100123, GROUP_INTERVAL)])
+def test_per_chat_spacing(scheduler, fake_bot, chat, interval):
+    fake = fake_bot()
+
+    async def scenario():
+        for i in range(3):
+            scheduler.submit(fake, chat, f"m{i}")
+        scheduler.submit(fake, 7, "other")
+
+    run(scheduler, scenario, 2 * interval + 0.15)
+    assert texts(fake)[:2] == ["m0", "other"]  # Chat khác không phải chờ giãn cách của chat này
+    times = [t for t, c, _ in fake.sent if c == chat]
+    assert len(times) == 3
+    assert all(b - a >= interval - 0.01 for a, b in zip(times, times[1:]))
+
+
+def test_retry_after(scheduler, fake_bot):
+    fake = fake_bot({"m": [RetryAfter(timedelta(seconds=0.3))]})
+    start = time.monotonic()
+
+    async def scenario():
+        scheduler.submit(fake, 42, "m")
+
+    run(scheduler, scenario, 0.6)
+    assert texts(fake) == ["m"]
+    assert fake.sent[0][0] - start >= 0.3 - 0.01
+    assert (scheduler.sent, scheduler.retried, scheduler.failed, scheduler.size) == (1, 1, 0, 0)
+
+
+@pytest.mark.parametrize("error, wait", [(RetryAfter(timedelta(seconds=0.3)), 0.3), (NetworkError("reset"), 1.0)])
+def test_retry_while_another_message_is_queued(scheduler, fake_bot, error, wait):
+    """Tin EMA đang gửi thì lỗi, trong lúc đó tin pump đã xếp hàng cùng chat → cả 2 vẫn phải được gửi"""
+    fake = fake_bot({"ema": [error]}, delay=0.05)
+
+    async def scenario():
+        scheduler.submit(fake, 42, "ema", bot.ALERT_PRIORITY_EMA)
+        await asyncio.sleep(0.02)  # "ema" đang gửi
+        scheduler.submit(fake, 42, "pump", bot.ALERT_PRIORITY_PUMP)
+
+    run(scheduler, scenario, wait + CHAT_INTERVAL + 0.3)
+    assert texts(fake) == ["pump", "ema"]
+    assert scheduler.size == 0 and not scheduler.pending
+
+
+def test_send_tasks_referenced_until_done(scheduler, fake_bot):
+    fake = fake_bot(delay=0.1)
+    in_flight = []
+
+    async def scenario():
+        scheduler.submit(fake, 42, "m")
+        await asyncio.sleep(0.02)
+        in_flight.append(len(scheduler._sending))
+
+    run(scheduler, scenario, 0.2)
+    assert in_flight == [1]
+    assert texts(fake) == ["m"] and not scheduler._sending
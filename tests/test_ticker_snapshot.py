@@ -0,0 +1,44 @@
+"""Snapshot ticker lỗi: log 1 lần, cache lỗi trong backoff thay vì mọi caller gọi lại API + in lỗi"""
+import asyncio
+
+import pytest
+
+import mexc_futures_bot as bot
+
+
+@pytest.fixture
+def api(monkeypatch):
+    calls = []
+    responses = []
+
+    async def fake_fetch_json(session, url, params=None, retry=3):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(bot, "fetch_json", fake_fetch_json)
+    return calls, responses
+
+
+def test_failure_logged_once_and_cached(api, monkeypatch, capsys):
+    calls, responses = api
+    responses += [RuntimeError("boom"), [{"symbol": "X_USDT", "lastPrice": "1.5"}]]
+    snapshot = bot.TickerSnapshot(ttl=0, error_backoff=0.2)
+    monkeypatch.setattr(bot, "TICKER_SNAPSHOT", snapshot)
+
+    async def run():
+        first = await asyncio.gather(*(bot.get_all_tickers(None) for _ in range(5)))
+        again = await bot.get_all_tickers(None)  # Còn trong backoff → không gọi API
+        await asyncio.sleep(0.25)
+        recovered = await bot.get_ticker(None, "X_USDT")
+        return first, again, recovered
+
+    first, again, recovered = asyncio.run(run())
+    assert first == [{}] * 5 and again == {}
+    assert recovered == 1.5
+    assert len(calls) == 2
+    assert capsys.readouterr().out.count("Error getting ticker snapshot") == 1
+    assert snapshot.error is None
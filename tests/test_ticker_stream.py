@@ -0,0 +1,58 @@
+"""Role sub.tickers chuyển sang shard đang mở khi shard giữ role chết hoặc push.tickers im lặng"""
+import asyncio
+import json
+
+import pytest
+
+import mexc_futures_bot as bot
+
+
+class FakeWs:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message)["method"])
+
+
+@pytest.fixture
+def shards(monkeypatch):
+    shards = [bot.WsShard(i) for i in range(3)]
+    for shard in shards:
+        shard.ws = FakeWs()
+    monkeypatch.setattr(bot, "WS_SHARD_LIST", shards)
+    monkeypatch.setattr(bot, "TICKER_STREAM", bot.TickerStream())
+    asyncio.run(bot.ws_subscribe_tickers(shards[0]))
+    return shards
+
+
+def check(now):
+    asyncio.run(bot.ws_check_ticker_stream(bot.TICKER_STREAM.since + now))
+
+
+def test_fresh_stream_stays(shards):
+    bot.TICKER_STREAM.last_push = bot.TICKER_STREAM.since + 10
+    check(bot.WS_TICKERS_STALE_TIMEOUT + 5)
+    assert bot.TICKER_STREAM.shard == 0 and bot.TICKER_STREAM.moves == 0
+    assert [shard.ws.sent for shard in shards] == [["sub.tickers"], [], []]
+
+
+def test_silent_stream_moves_to_next_shard(shards):
+    check(bot.WS_TICKERS_STALE_TIMEOUT + 1)  # Sub bị từ chối: chưa từng có push.tickers
+    assert bot.TICKER_STREAM.shard == 1 and bot.TICKER_STREAM.moves == 1
+    assert [shard.ws.sent for shard in shards] == [["sub.tickers", "unsub.tickers"], ["sub.tickers"], []]
+
+
+def test_dead_holder_moves_to_live_shard(shards):
+    shards[0].ws = None
+    shards[1].ws = None
+    check(1)  # Chưa quá timeout nhưng shard giữ role đã mất kết nối
+    assert bot.TICKER_STREAM.shard == 2
+    assert shards[2].ws.sent == ["sub.tickers"]
+
+
+def test_no_live_shard_releases_role(shards):
+    for shard in shards:
+        shard.ws = None
+    check(bot.WS_TICKERS_STALE_TIMEOUT + 1)
+    assert bot.TICKER_STREAM.shard is None
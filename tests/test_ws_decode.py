@@ -0,0 +1,46 @@
+"""decode_ws_frame: 1 lần parse JSON → Ticker / [Ticker] / Kline theo channel; item push.tickers lỗi chỉ bỏ item đó"""
+import json
+
+import mexc_futures_bot as bot
+
+
+def test_tickers_frame():
+    channel, ts, payload = bot.decode_ws_frame(json.dumps({"channel": "push.tickers", "ts": 1, "data": [
+        {"symbol": "A_USDT", "lastPrice": 1.5, "volume24": 100},
+        {"symbol": "B_USDT", "lastPrice": "3.25"},
+    ]}))
+    assert (channel, ts) == ("push.tickers", 1)
+    assert [(t.symbol, t.price, t.volume) for t in payload] == [("A_USDT", 1.5, 100.0), ("B_USDT", 3.25, 0.0)]
+
+
+def test_ticker_and_kline_frames():
+    _, _, ticker = bot.decode_ws_frame(json.dumps(
+        {"channel": "push.ticker", "data": {"symbol": "A_USDT", "lastPrice": "2", "volume24": "5"}}
+    ))
+    assert (ticker.symbol, ticker.price, ticker.volume) == ("A_USDT", 2.0, 5.0)
+
+    _, _, kline = bot.decode_ws_frame(json.dumps(
+        {"channel": "push.kline", "data": {"symbol": "A_USDT", "interval": "Min5", "c": "2.5", "t": 1700000100}}
+    ))
+    assert (kline.symbol, kline.interval, kline.close, kline.time) == ("A_USDT", "Min5", 2.5, 1700000100)
+    _, _, empty = bot.decode_ws_frame(json.dumps({"channel": "push.kline", "data": {"symbol": "A_USDT"}}))
+    assert empty is None
+
+
+def test_other_channel_returns_raw_dict():
+    channel, _, payload = bot.decode_ws_frame(json.dumps({"channel": "rs.sub.tickers", "data": "success"}))
+    assert channel == "rs.sub.tickers" and payload["data"] == "success"
+
+
+def test_bad_ticker_item_skipped():
+    before = bot.WS_BAD_TICKERS.values.get((), 0)
+    channel, ts, payload = bot.decode_ws_frame(json.dumps({"channel": "push.tickers", "ts": 1, "data": [
+        {"symbol": "A_USDT", "lastPrice": 1.5, "volume24": 100},
+        {"symbol": "B_USDT", "lastPrice": "n/a", "volume24": 100},
+        {"symbol": "C_USDT", "lastPrice": "2", "volume24": {"x": 1}},
+        "garbage",
+        {"symbol": "D_USDT", "lastPrice": "3.25"},
+    ]}))
+    assert (channel, ts) == ("push.tickers", 1)
+    assert [(t.symbol, t.price, t.volume) for t in payload] == [("A_USDT", 1.5, 100.0), ("D_USDT", 3.25, 0.0)]
+    assert bot.WS_BAD_TICKERS.values[()] - before == 3